@@ -2,18 +2,45 @@
 STAAR Test Prep - Flask Backend API with Multi-User Authentication
 Handles user registration, login, progress tracking, and scoring
 """
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_from_directory, Response, stream_with_context, abort, g
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 import os
+import io
+import copy
+import gzip
+import hashlib
+import hmac
+import mimetypes
+import re
+import sys
+import csv
 import json
+import time
+import threading
+import queue
+import heapq
+import bisect
+from collections import deque, namedtuple
 from datetime import datetime, timedelta
 import random
 import uuid
+import cProfile
+import marshal
+import pstats
 import bcrypt
+import brotli
 import jwt
 from functools import wraps
+from concurrent.futures import ThreadPoolExecutor
 from azure.cosmos import CosmosClient, PartitionKey, exceptions as cosmos_exceptions
+from azure.cosmos.documents import ConnectionPolicy, RetryOptions
+from azure.core import MatchConditions
+from azure.core.exceptions import ServiceRequestError, ServiceResponseError
+from azure.core.pipeline.transport import RequestsTransport
 from azure.identity import DefaultAzureCredential
+import requests
+from user_record import UserRecord
 
 # Determine static folder path (works in both development and production)
 if os.path.exists('../frontend/build'):
@@ -26,24 +53,566 @@ else:
 app = Flask(__name__, static_folder=static_folder, static_url_path='')
 CORS(app)
 
+# Static asset cache: the frontend build is loaded into memory at startup with
+# precompressed gzip/brotli variants (set STATIC_CACHE=false while developing)
+STATIC_CACHE_ENABLED = os.getenv("STATIC_CACHE", "true").lower() != "false"
+STATIC_CACHE_MAX_FILE_BYTES = int(os.getenv("STATIC_CACHE_MAX_FILE_BYTES", 5 * 1024 * 1024))
+STATIC_COMPRESS_MIN_BYTES = 1024
+STATIC_COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "application/xml",
+                             "application/manifest+json", "image/svg+xml")
+STATIC_ETAG_SUFFIXES = {"br": "-br", "gzip": "-gz"}  # per-encoding ETags
+# Content-hashed build output, e.g. main.3f2a1b9c.js or 453.8ab2c1d0.chunk.css
+HASHED_ASSET_PATTERN = re.compile(r'\.[0-9a-f]{8,}\.(?:chunk\.)?[a-z0-9]+$')
+static_assets = {}  # relative path -> cached asset
+static_files = set()  # every file in the build, including ones too large to cache
+
+# Game randomness (mystery boxes, question selection) goes through one RNG so a
+# seed (RNG_SEED) makes runs reproducible. Ids stay uuid4 even when seeded, as
+# the seed is written to capture logs; only replays switch to seeded ids.
+RNG_SEED = os.getenv("RNG_SEED")
+rng = random.Random()
+_id_rng = None
+
+# Traffic capture (opt-in): API requests are appended to an NDJSON log that
+# tools/replay.py can drive back through the app. Passwords in request bodies
+# and rosters are replaced by redacted:<length>:<hmac> markers keyed per capture
+# session (equal passwords get equal markers), but the log still holds every
+# other request field, so only enable this outside production. Each process
+# (e.g. each gunicorn worker) writes its own session, tagged on every line,
+# as its seq numbers and RNG seed only order and replay its own requests.
+CAPTURE_TRAFFIC_PATH = os.getenv("CAPTURE_TRAFFIC_PATH")
+CAPTURE_EXCLUDED_PATHS = ("/api/events", "/api/health")
+CAPTURE_REDACTED_FIELDS = ("password", "new_password", "current_password")
+TOKEN_QUERY_PATTERN = re.compile(r'((?:^|&)token=)[^&]*')
+_capture_file = None
+_capture_key = None
+_capture_session = None
+_capture_lock = threading.Lock()
+_capture_seq = 0
+
+# Request profiling (opt-in): an admin sends "X-Profile: 1", or a fraction of
+# API requests is sampled (PROFILE_SAMPLE_RATE). One request is profiled at a
+# time per process; recent profiles are kept in memory for /api/admin/profiles.
+# Under gevent workers, other greenlets that run meanwhile show up in it too.
+PROFILE_HEADER = "X-Profile"
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+PROFILE_MAX_STORED = int(os.getenv("PROFILE_MAX_STORED", 50))
+PROFILE_TOP_FUNCTIONS = 30
+PROFILE_CATEGORIES = ("cosmos", "bcrypt", "jwt", "json")
+PROFILE_EXCLUDED_PATHS = ("/api/events",)  # streamed for minutes; nothing useful to profile
+profiles = deque(maxlen=PROFILE_MAX_STORED)
+_profiler_lock = threading.Lock()
+_profile_state = threading.local()  # per-thread category timings while profiling
+
 # JWT Configuration
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "staar-quest-secret-key-change-in-production")
 JWT_ALGORITHM = "HS256"
 JWT_EXPIRATION_HOURS = 24 * 7  # 1 week
 
+# Password hashing: the bcrypt work factor is calibrated at startup so that one
+# hash takes about BCRYPT_TARGET_MS on this host, never below the library default
+# of 12 (BCRYPT_COST pins it instead). Logins transparently rehash passwords stored
+# at a lower cost, never a higher one, so a slower host can't weaken hashes;
+# BCRYPT_REHASH_TOLERANCE > 0 lets hashes lag the target by that many rounds.
+BCRYPT_TARGET_MS = float(os.getenv("BCRYPT_TARGET_MS", 250))
+BCRYPT_COST = os.getenv("BCRYPT_COST")
+BCRYPT_MIN_COST = 12
+BCRYPT_MAX_COST = 16
+BCRYPT_REHASH_TOLERANCE = int(os.getenv("BCRYPT_REHASH_TOLERANCE", 0))
+bcrypt_cost = BCRYPT_MIN_COST  # set by init_bcrypt() at startup
+
+# Bulk import configuration (bcrypt releases the GIL, so threads hash in parallel;
+# under gevent the hashing runs on its native thread pool, see run_native).
+# Imported passwords are hashed at BULK_IMPORT_BCRYPT_COST (never above the login
+# cost): at the calibrated cost a class roster would take minutes on a small host.
+# The first login rehashes them at the full cost (see password_needs_rehash).
+BULK_IMPORT_WORKERS = int(os.getenv("BULK_IMPORT_WORKERS", os.cpu_count() or 4))
+BULK_IMPORT_BCRYPT_COST = max(4, int(os.getenv("BULK_IMPORT_BCRYPT_COST", 8)))  # 4 is bcrypt's minimum
+BULK_IMPORT_BATCH_SIZE = int(os.getenv("BULK_IMPORT_BATCH_SIZE", 200))
+
+# Streaming export configuration
+EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", 500))
+EXPORT_CHUNK_BYTES = 64 * 1024
+EXPORT_DATASETS = {
+    "users": {
+        "since_field": "created_at",
+        "csv_fields": ["username", "user_id", "is_admin", "created_at"]
+    },
+    "progress": {
+        "since_field": "last_played",
+        "csv_fields": ["user_id", "username", "total_points", "current_level", "streak_days",
+                       "longest_streak", "questions_answered", "correct_answers", "last_played", "created_at"]
+    },
+    "audit-logs": {
+        "since_field": "timestamp",
+        "csv_fields": ["id", "admin_user_id", "action", "target_user", "details", "timestamp"]
+    },
+    "progress-events": {
+        "since_field": "ts",
+        "csv_fields": ["user_id", "seq", "type", "ts", "points"]
+    }
+}
+EXPORT_EXCLUDED_FIELDS = {"password_hash", "_rid", "_self", "_etag", "_attachments", "_ts"}
+FIELD_NAME_PATTERN = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+ADMIN_LIST_FIELDS = ("user_id", "username", "current_level", "total_points", "created_at")
+
 # In-memory storage (fallback if Cosmos DB not configured)
-users_data = {}
+users_data = {}  # user_id -> UserRecord (compact form of the progress dict)
 auth_users_data = {}  # Store authentication records
+USER_SEARCH_MAX_LIMIT = 200  # page size cap for /api/admin/users/search
 audit_logs = []  # Store admin actions
-questions_data = None
+
+# Event-sourced progress (opt-in): each change to a progress record is appended
+# as a small immutable event instead of rewriting the whole document. Current
+# state is the latest snapshot (the users record, tagged with event_seq) plus
+# the events after it; every PROGRESS_SNAPSHOT_EVERY events the state is folded
+# back into the snapshot. Bulk readers (exports, admin lists, leaderboard
+# seeding) fold each page's pending events in with one query, and the
+# leaderboard feed follows the events container instead of the snapshots. The
+# daily rollover still picks candidates from snapshots (see DailyScheduler).
+# Without Cosmos only unfolded events stay on the hot per-user lists, so reads
+# cost O(pending); the folded history moves to PROGRESS_EVENT_DIR segments, or
+# to an in-memory archive that only the progress-events export reads.
+PROGRESS_EVENT_LOG = os.getenv("PROGRESS_EVENT_LOG", "false").lower() == "true"
+PROGRESS_SNAPSHOT_EVERY = int(os.getenv("PROGRESS_SNAPSHOT_EVERY", 20))
+# A TTL makes Cosmos expire events, so the daily pass first snapshots users
+# whose pending events are within PROGRESS_COMPACT_MARGIN_DAYS of expiring;
+# without the scheduler (or with a TTL inside the margin) the TTL is ignored.
+PROGRESS_EVENT_TTL_DAYS = int(os.getenv("PROGRESS_EVENT_TTL_DAYS", 0))  # 0 keeps the full history
+PROGRESS_COMPACT_MARGIN_DAYS = 2  # survives one missed daily pass
+PROGRESS_EVENT_DIR = os.getenv("PROGRESS_EVENT_DIR")  # in-memory mode: NDJSON segment files
+PROGRESS_SEGMENT_BYTES = 64 * 1024 * 1024
+PROGRESS_SYSTEM_FIELDS = {"_rid", "_self", "_etag", "_attachments", "_ts", "_lsn", "event_seq"}
+progress_events = {}  # in-memory: user_id -> events not yet folded into the snapshot
+progress_event_history = {}  # in-memory without PROGRESS_EVENT_DIR: user_id -> folded events
+PROGRESS_FOLD_CHUNK = 100  # users per pending-events query when folding a page of snapshots
+progress_segments = None  # ProgressEventSegments when PROGRESS_EVENT_DIR is set
+
+# Question bank: writes build new copies of the per-subject lists, the id map
+# and the index and rebind them (copy-on-write), so readers always see a
+# consistent snapshot without locking. Edits land in QUESTIONS_FILE and in the
+# memory of the worker that made them; other workers pick them up on restart.
+# The inverted index maps search tokens to frozensets of question ids.
+QUESTIONS_FILE = os.getenv("QUESTIONS_FILE", os.path.join(os.path.dirname(__file__), 'data', 'questions.json'))
+QUESTION_SUBJECTS = ("math", "reading")
+QUESTION_LEVELS = range(1, 6)
+QUESTION_SEARCH_MAX_LIMIT = 200
+SEARCH_TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+QUESTION_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+# The bank and its indexes are published together: writers build a new
+# QuestionBank and rebind question_bank in one assignment, so a reader that
+# takes question_bank once sees a single consistent bank
+QuestionBank = namedtuple('QuestionBank', [
+    'data',      # subject -> list of questions (None until loaded)
+    'by_level',  # subject -> {level: [questions]}
+    'by_id',     # question id -> (subject, question)
+    'index',     # token -> frozenset of question ids
+])
+question_bank = QuestionBank(None, {}, {}, {})
+_questions_lock = threading.Lock()
+
+# Windowed leaderboards: each view keeps a precomputed top-k, fed from
+# per-user time-bucketed point counters stored on the user record. The
+# all-time view also serves the default /api/leaderboard, so its entries carry
+# these progress record fields under their original names and include players
+# who haven't scored yet while the view has room.
+LEADERBOARD_TOP_K = int(os.getenv("LEADERBOARD_TOP_K", 50))
+LEADERBOARD_RECORD_FIELDS = ("user_id", "username", "total_points", "current_level", "streak_days",
+                             "longest_streak", "questions_answered", "correct_answers")
+LEADERBOARD_WINDOWS = ("all", "weekly", "daily")
+LEADERBOARD_SUBJECTS = ("math", "reading")
+leaderboard_views = {}  # bucket key -> {"entries": [...], "expires_at": epoch or None}
+_leaderboard_lock = threading.Lock()
+
+# With Cosmos, every view is materialized off the request path from the users
+# container's change feed by one leased processor across all workers. Without
+# the feed, requests update the view documents directly, and updates that lose
+# RECORD_UPDATE_RETRIES ETag races in a row are dropped (counted in /api/health)
+LEADERBOARD_CHANGE_FEED = os.getenv("LEADERBOARD_CHANGE_FEED", "true").lower() != "false"
+LEADERBOARD_FEED_POLL_SECONDS = float(os.getenv("LEADERBOARD_FEED_POLL_SECONDS", 1.0))
+LEADERBOARD_FEED_BATCH_SIZE = 500
+LEADERBOARD_FEED_LEASE_SECONDS = 15
+LEADERBOARD_FEED_LEASE_ID = "lease:leaderboard-feed"
+leaderboard_feed = None  # LeaderboardFeedProcessor when running against Cosmos
+leaderboard_dropped_updates = 0
+
+# Daily rollover: the day's challenge template is built once, and a background
+# pass (one leased worker with Cosmos) runs in throttled batches after
+# DAILY_ROLLOVER_HOUR UTC (the default 8 is ~2-3am in Texas). It gives players
+# active in the last DAILY_ROLLOVER_ACTIVE_DAYS days their new challenges and
+# resets broken streaks. Requests then only compare the stored challenge date
+# with today's, falling back to a lazy rollover for users the pass skipped.
+DAILY_SCHEDULER = os.getenv("DAILY_SCHEDULER", "true").lower() != "false"
+DAILY_ROLLOVER_HOUR = int(os.getenv("DAILY_ROLLOVER_HOUR", 8))
+DAILY_ROLLOVER_ACTIVE_DAYS = int(os.getenv("DAILY_ROLLOVER_ACTIVE_DAYS", 7))
+DAILY_ROLLOVER_BATCH_SIZE = int(os.getenv("DAILY_ROLLOVER_BATCH_SIZE", 200))
+DAILY_ROLLOVER_BATCH_PAUSE_SECONDS = float(os.getenv("DAILY_ROLLOVER_BATCH_PAUSE_SECONDS", 0.5))
+DAILY_SCHEDULER_POLL_SECONDS = 60
+DAILY_ROLLOVER_LEASE_SECONDS = 60
+DAILY_ROLLOVER_LEASE_ID = "lease:daily-rollover"
+challenge_day = None  # today's challenge template and date strings (current_challenge_day)
+_challenge_day_lock = threading.Lock()
+daily_scheduler = None  # DailyScheduler, unless DAILY_SCHEDULER=false
+
+# Server-sent events: an in-process pub/sub bus, optionally fanned out across
+# workers through Redis when EVENT_BUS_REDIS_URL is set (requires `redis`).
+# Without Redis, workers that don't run the leaderboard feed poll the view
+# documents their own clients watch. The Dockerfile serves with gevent
+# workers, where an idle stream is a parked greenlet blocked on its queue
+# rather than an OS thread, so SSE_MAX_CLIENTS (per worker) only has to stay
+# below gunicorn's --worker-connections. Under gthread workers each stream
+# would hold a thread instead, so keep the cap well below --threads there.
+# Browsers pass a
+# short-lived events-only token (POST /api/events/token) as ?token=, never
+# the session JWT, since query strings end up in access logs.
+SSE_HEARTBEAT_SECONDS = int(os.getenv("SSE_HEARTBEAT_SECONDS", 15))
+SSE_MAX_CLIENTS = int(os.getenv("SSE_MAX_CLIENTS", 500))
+SSE_QUEUE_SIZE = 100
+SSE_TOKEN_SECONDS = 60
+EVENT_BUS_REDIS_URL = os.getenv("EVENT_BUS_REDIS_URL")
+EVENT_BUS_REDIS_CHANNEL = "staar-events"
+
+# Concurrency control: records are guarded by striped locks keyed on user_id
+# (or username for auth records) so threaded workers can serve requests
+# concurrently without losing read-modify-write updates.
+LOCK_STRIPES = int(os.getenv("LOCK_STRIPES", 64))
+RECORD_UPDATE_RETRIES = 5
+_lock_stripes = [threading.RLock() for _ in range(LOCK_STRIPES)]
 
 # Cosmos DB (optional)
+COSMOS_POOL_SIZE = int(os.getenv("COSMOS_POOL_SIZE", 32))
+
+# Indexing policies: write RU grows with the number of indexed terms, so the
+# hot progress container indexes only the paths queried (leaderboards,
+# admin list, search, exports) instead of every badge and daily challenge.
+# Add a path here before querying on it. Existing containers are migrated at
+# startup unless COSMOS_APPLY_INDEXING_POLICY=false (along with the default
+# TTLs, e.g. a changed PROGRESS_EVENT_TTL_DAYS); Cosmos re-indexes online.
+COSMOS_APPLY_INDEXING_POLICY = os.getenv("COSMOS_APPLY_INDEXING_POLICY", "true").lower() != "false"
+COSMOS_INDEXING_POLICIES = {
+    "progress": {
+        "indexingMode": "consistent",
+        "includedPaths": [{"path": f"/{field}/?"} for field in
+                          ("user_id", "username", "total_points", "current_level", "created_at", "last_played")],
+        "excludedPaths": [{"path": "/*"}]
+    },
+    "auth_users": {
+        "indexingMode": "consistent",
+        "includedPaths": [{"path": "/*"}],
+        "excludedPaths": [{"path": "/password_hash/?"}]
+    },
+    "audit_logs": {
+        "indexingMode": "consistent",
+        "includedPaths": [{"path": "/*"}],
+        "excludedPaths": [{"path": "/details/*"}]
+    },
+    # Point reads only (views and the change feed lease)
+    "leaderboards": {
+        "indexingMode": "consistent",
+        "includedPaths": [],
+        "excludedPaths": [{"path": "/*"}]
+    },
+    # Replay reads "user_id = @user_id AND seq > @seq ORDER BY seq"
+    "progress_events": {
+        "indexingMode": "consistent",
+        "includedPaths": [{"path": "/user_id/?"}, {"path": "/seq/?"}, {"path": "/ts/?"}],
+        "excludedPaths": [{"path": "/*"}],
+        "compositeIndexes": [[{"path": "/user_id", "order": "ascending"}, {"path": "/seq", "order": "ascending"}]]
+    },
+}
+_cosmos_init_lock = threading.Lock()
 cosmos_client = None
 cosmos_container = None
 cosmos_users_container = None
 cosmos_audit_container = None
+cosmos_leaderboard_container = None
+cosmos_events_container = None
 cosmos_enabled = False
 
+# Cosmos resilience: the SDK's own throttle retries are kept minimal so that
+# cosmos_call owns retry-after aware backoff, deadlines and load shedding.
+COSMOS_MAX_RETRIES = int(os.getenv("COSMOS_MAX_RETRIES", 4))
+COSMOS_BACKOFF_BASE_MS = int(os.getenv("COSMOS_BACKOFF_BASE_MS", 50))
+COSMOS_BACKOFF_MAX_MS = int(os.getenv("COSMOS_BACKOFF_MAX_MS", 2000))
+COSMOS_DEADLINE_MS = int(os.getenv("COSMOS_DEADLINE_MS", 3000))
+COSMOS_MIN_ATTEMPT_MS = 25  # an attempt with less budget left than this is not started
+COSMOS_BREAKER_THRESHOLD = int(os.getenv("COSMOS_BREAKER_THRESHOLD", 5))
+COSMOS_BREAKER_COOLDOWN_S = float(os.getenv("COSMOS_BREAKER_COOLDOWN_S", 10))
+COSMOS_TRANSIENT_STATUS_CODES = {408, 429, 449, 500, 503}
+# Transient failures after which a write may already have been applied
+COSMOS_AMBIGUOUS_STATUS_CODES = {408, 500, 503}
+
+
+def profile_category(category):
+    """Attribute time spent in the decorated function to ``category`` when the
+    current thread is serving a profiled request (a no-op otherwise)"""
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            timings = getattr(_profile_state, 'timings', None)
+            if timings is None:
+                return f(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                timing = timings[category]
+                timing['ms'] += (time.perf_counter() - started) * 1000
+                timing['calls'] += 1
+        return decorated
+    return decorator
+
+
+class ProfiledJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider with request/response (de)serialization timed for profiles"""
+
+    dumps = profile_category('json')(DefaultJSONProvider.dumps)
+    loads = profile_category('json')(DefaultJSONProvider.loads)
+
+
+app.json = ProfiledJSONProvider(app)
+
+
+class RecordConflictError(Exception):
+    """Raised when a record keeps changing underneath a read-modify-write"""
+
+
+class CosmosUnavailableError(Exception):
+    """Raised when Cosmos DB is throttling or failing and the request should be shed"""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with a single half-open probe"""
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return 'half-open'
+        return 'open'
+
+    def retry_after(self):
+        """Seconds until the breaker will let a probe through"""
+        if self.opened_at is None:
+            return 0
+        return max(1, int(self.cooldown - (time.monotonic() - self.opened_at) + 0.999))
+
+    def allow(self):
+        """Return True if a call may proceed"""
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+
+cosmos_breaker = CircuitBreaker(COSMOS_BREAKER_THRESHOLD, COSMOS_BREAKER_COOLDOWN_S)
+
+
+def _retry_delay_ms(exc, attempt):
+    """Honour x-ms-retry-after-ms when present, else exponential backoff with full jitter"""
+    headers = getattr(exc, 'headers', None) or {}
+    retry_after = headers.get('x-ms-retry-after-ms')
+    if retry_after:
+        try:
+            return min(float(retry_after), COSMOS_BACKOFF_MAX_MS)
+        except ValueError:
+            pass
+    return random.uniform(0, min(COSMOS_BACKOFF_MAX_MS, COSMOS_BACKOFF_BASE_MS * (2 ** attempt)))
+
+
+@profile_category('cosmos')
+def cosmos_call(operation, fn, *args, deadline_ms=None, **kwargs):
+    """Run a Cosmos operation with retries, a deadline and the circuit breaker
+
+    ``fn`` is called with a ``timeout`` keyword (seconds) holding what is left
+    of the deadline, so a single hung SDK call can't outlive it; wrappers
+    around SDK calls must accept it and pass it on. Transient failures (429
+    throttling, 408/449/5xx, connection errors, client timeouts) are retried
+    until COSMOS_MAX_RETRIES or the deadline is exhausted, then surface as
+    CosmosUnavailableError (served as a 503). Other Cosmos errors, such as
+    not-found or precondition failures, are raised unchanged.
+    """
+    if not cosmos_breaker.allow():
+        raise CosmosUnavailableError(f'Cosmos DB circuit open ({operation})', cosmos_breaker.retry_after())
+
+    deadline = time.monotonic() + (deadline_ms or COSMOS_DEADLINE_MS) / 1000.0
+    min_attempt = COSMOS_MIN_ATTEMPT_MS / 1000.0
+    attempt = 0
+    recorded = False
+    try:
+        while True:
+            try:
+                result = fn(*args, timeout=deadline - time.monotonic(), **kwargs)
+            except cosmos_exceptions.CosmosHttpResponseError as exc:
+                if exc.status_code not in COSMOS_TRANSIENT_STATUS_CODES:
+                    recorded = True
+                    cosmos_breaker.record_success()
+                    raise
+                last_error = exc
+            except (ServiceRequestError, ServiceResponseError, cosmos_exceptions.CosmosClientTimeoutError) as exc:
+                last_error = exc
+            else:
+                recorded = True
+                cosmos_breaker.record_success()
+                return result
+
+            delay = _retry_delay_ms(last_error, attempt) / 1000.0
+            attempt += 1
+            if attempt > COSMOS_MAX_RETRIES or time.monotonic() + delay + min_attempt > deadline:
+                recorded = True
+                cosmos_breaker.record_failure()
+                raise CosmosUnavailableError(
+                    f'Cosmos DB unavailable ({operation}): {last_error}', max(1, int(delay + 0.999))
+                ) from last_error
+            time.sleep(delay)
+    finally:
+        if not recorded:
+            # Anything else (a bug in fn, an interrupted sleep) still has to
+            # release a half-open probe, or the breaker would never close again
+            cosmos_breaker.record_failure()
+
+
+def cosmos_create(operation, container, body, partition_key):
+    """create_item through cosmos_call, safe to retry
+
+    A create whose response was lost (timeout, dropped connection, 5xx) may
+    still have been applied, so its retry can fail with 409. In that case the
+    stored item is read back: if it is the one we sent, the create succeeded;
+    otherwise the 409 is a genuine conflict and is raised as usual.
+    """
+    maybe_applied = False
+
+    def create(timeout):
+        nonlocal maybe_applied
+        try:
+            return container.create_item(body, timeout=timeout)
+        except cosmos_exceptions.CosmosHttpResponseError as exc:
+            if exc.status_code == 409 and maybe_applied:
+                stored = container.read_item(item=body['id'], partition_key=partition_key, timeout=timeout)
+                if _without_system_fields(stored) == _without_system_fields(body):
+                    return stored
+            elif exc.status_code in COSMOS_AMBIGUOUS_STATUS_CODES:
+                maybe_applied = True
+            raise
+        except (ServiceResponseError, cosmos_exceptions.CosmosClientTimeoutError):
+            maybe_applied = True
+            raise
+
+    return cosmos_call(operation, create)
+
+
+def _without_system_fields(item):
+    return {key: value for key, value in item.items() if not key.startswith('_')}
+
+
+def cosmos_query(operation, container, deadline_ms=None, **query_kwargs):
+    """Run a query through cosmos_call and return all results as a list"""
+    query_kwargs.setdefault('enable_cross_partition_query', True)
+    return cosmos_call(operation, lambda timeout: list(container.query_items(timeout=timeout, **query_kwargs)),
+                       deadline_ms=deadline_ms)
+
+
+def iter_cosmos_query(operation, container, page_size=None, **query_kwargs):
+    """Lazily yield query results, fetching (and retrying) one page at a time
+
+    The SDK applies the timeout given to query_items to every page fetch, so
+    each page gets a full COSMOS_DEADLINE_MS budget of its own.
+    """
+    query_kwargs.setdefault('enable_cross_partition_query', True)
+    pages = cosmos_call(operation, lambda timeout: container.query_items(
+        max_item_count=page_size, timeout=timeout, **query_kwargs).by_page())
+    end = object()
+
+    def fetch_page(timeout):
+        page = next(pages, end)
+        return page if page is end else list(page)
+
+    while True:
+        page = cosmos_call(operation, fetch_page)
+        if page is end:
+            return
+        yield from page
+
+
+def user_lock(key):
+    """Return the lock stripe guarding records for ``key`` (a user_id or username)"""
+    return _lock_stripes[hash(key) % LOCK_STRIPES]
+
+
+def seed_rng(seed):
+    """Seed the game RNG, for reproducible runs"""
+    rng.seed(seed)
+
+
+def seed_ids(seed):
+    """Draw new ids from their own seeded RNG (tools/replay.py only; served ids must stay unguessable)"""
+    global _id_rng
+    _id_rng = random.Random(seed)
+
+
+def new_id():
+    """Generate a UUID4 string, drawn from the id RNG when a replay has seeded one"""
+    if _id_rng is not None:
+        return str(uuid.UUID(int=_id_rng.getrandbits(128), version=4))
+    return str(uuid.uuid4())
+
+
+def reset_memory_stores():
+    """Clear every in-memory store (used by tools/replay.py between runs)"""
+    users_data.clear()
+    auth_users_data.clear()
+    username_index.clear()
+    audit_logs.clear()
+    progress_events.clear()
+    progress_event_history.clear()
+    with _leaderboard_lock:
+        leaderboard_views.clear()
+
+
+def start_capture(path):
+    """Open the traffic capture log, recording the RNG seed needed to replay it"""
+    global _capture_file, _capture_key, _capture_session
+    seed = int(RNG_SEED) if RNG_SEED else random.SystemRandom().randrange(2 ** 32)
+    seed_rng(seed)
+    _capture_key = os.urandom(32)  # never written out, so markers can't be brute-forced
+    _capture_session = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"  # not new_id(): capture must not perturb ids
+    _capture_file = open(path, 'a', buffering=1, encoding='utf-8')
+    _capture_file.write(json.dumps({
+        "type": "capture_start", "session": _capture_session, "seed": seed,
+        "started_at": datetime.utcnow().isoformat()
+    }) + "\n")
+    print(f"✓ Capturing API traffic to {path} (seed {seed})")
+
 
 def init_cosmos():
     """Initialize Cosmos DB if configured via environment variables."""
@@ -53,30 +622,87 @@ def init_cosmos():
     if not endpoint:
         return
 
+    with _cosmos_init_lock:
+        if cosmos_enabled:
+            return
+        _connect_cosmos(endpoint)
+
+
+def _connect_cosmos(endpoint):
+    """Create the Cosmos client and containers (called under _cosmos_init_lock)"""
+    global cosmos_client, cosmos_container, cosmos_users_container, cosmos_audit_container, cosmos_enabled
+    global cosmos_leaderboard_container, cosmos_events_container
+
     database_name = os.getenv("COSMOS_DATABASE", "staar")
     container_name = os.getenv("COSMOS_CONTAINER", "users")
     key = os.getenv("COSMOS_KEY")
 
+    # CosmosClient is thread-safe; size its connection pool for threaded workers
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=COSMOS_POOL_SIZE, pool_maxsize=COSMOS_POOL_SIZE)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    # Leave throttling and connection retries to cosmos_call, so the SDK's own
+    # don't stack on top of them (a retry_total of 0 alone falls back to the
+    # SDK default of 9 throttle retries, hence the explicit RetryOptions)
+    connection_policy = ConnectionPolicy()
+    connection_policy.RetryOptions = RetryOptions(max_retry_attempt_count=0)
+    client_options = {
+        'transport': RequestsTransport(session=session, session_owner=False),
+        'connection_policy': connection_policy,
+        'retry_total': 0
+    }
+
     try:
-        if key:
-            cosmos_client = CosmosClient(endpoint, key)
+        if endpoint == 'local':
+            from local_cosmos import LocalCosmosClient, FaultInjector
+            cosmos_client = LocalCosmosClient(faults=FaultInjector.from_env())
+        elif key:
+            cosmos_client = CosmosClient(endpoint, key, **client_options)
         else:
             credential = DefaultAzureCredential()
-            cosmos_client = CosmosClient(endpoint, credential=credential)
+            cosmos_client = CosmosClient(endpoint, credential=credential, **client_options)
 
         database = cosmos_client.create_database_if_not_exists(database_name)
         cosmos_container = database.create_container_if_not_exists(
             id=container_name,
-            partition_key=PartitionKey(path="/user_id")
+            partition_key=PartitionKey(path="/user_id"),
+            indexing_policy=COSMOS_INDEXING_POLICIES["progress"]
         )
         cosmos_users_container = database.create_container_if_not_exists(
             id="auth_users",
-            partition_key=PartitionKey(path="/username")
+            partition_key=PartitionKey(path="/username"),
+            indexing_policy=COSMOS_INDEXING_POLICIES["auth_users"]
         )
         cosmos_audit_container = database.create_container_if_not_exists(
             id="audit_logs",
-            partition_key=PartitionKey(path="/admin_user_id")
+            partition_key=PartitionKey(path="/admin_user_id"),
+            indexing_policy=COSMOS_INDEXING_POLICIES["audit_logs"]
         )
+        # Precomputed top-k views; default_ttl=-1 enables per-item expiry
+        cosmos_leaderboard_container = database.create_container_if_not_exists(
+            id="leaderboards",
+            partition_key=PartitionKey(path="/id"),
+            indexing_policy=COSMOS_INDEXING_POLICIES["leaderboards"],
+            default_ttl=-1
+        )
+        events_ttl = progress_event_ttl() if PROGRESS_EVENT_LOG else None
+        if PROGRESS_EVENT_LOG:
+            # Append-only answer events, one logical partition per user
+            cosmos_events_container = database.create_container_if_not_exists(
+                id="progress_events",
+                partition_key=PartitionKey(path="/user_id"),
+                indexing_policy=COSMOS_INDEXING_POLICIES["progress_events"],
+                default_ttl=events_ttl
+            )
+        if COSMOS_APPLY_INDEXING_POLICY:
+            migrate_indexing_policies(database, [
+                (cosmos_container, "/user_id", "progress", None),
+                (cosmos_users_container, "/username", "auth_users", None),
+                (cosmos_audit_container, "/admin_user_id", "audit_logs", None),
+                (cosmos_leaderboard_container, "/id", "leaderboards", -1),
+                (cosmos_events_container, "/user_id", "progress_events", events_ttl),
+            ])
         cosmos_enabled = True
         print("✓ Cosmos DB enabled for user persistence")
     except Exception as exc:
@@ -85,37 +711,186 @@ def init_cosmos():
         cosmos_container = None
         cosmos_users_container = None
         cosmos_audit_container = None
+        cosmos_leaderboard_container = None
+        cosmos_events_container = None
         print(f"⚠ Cosmos DB not available, using in-memory storage: {exc}")
 
 
-def hash_password(password):
-    """Hash a password using bcrypt"""
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+def progress_event_ttl():
+    """default_ttl (seconds) for the progress events container, or None to keep every event
 
+    Events may only expire if the daily pass can fold pending ones into a
+    snapshot first (DailyScheduler.compact_expiring); otherwise a user with
+    fewer than PROGRESS_SNAPSHOT_EVERY new events would lose them.
+    """
+    if PROGRESS_EVENT_TTL_DAYS <= 0:
+        return None
+    if not DAILY_SCHEDULER or PROGRESS_EVENT_TTL_DAYS <= PROGRESS_COMPACT_MARGIN_DAYS:
+        print(f"⚠ PROGRESS_EVENT_TTL_DAYS ignored: it needs DAILY_SCHEDULER=true and more than "
+              f"{PROGRESS_COMPACT_MARGIN_DAYS} days, so pending events are snapshotted before they expire")
+        return None
+    return PROGRESS_EVENT_TTL_DAYS * 86400
 
+
+def indexing_policy_signature(policy):
+    """Comparable form of an indexing policy, ignoring what the service adds by itself"""
+    def paths(key):
+        return frozenset(p['path'] for p in policy.get(key) or [] if p['path'] != '/"_etag"/?')
+
+    composites = frozenset(
+        tuple((p['path'], p.get('order', 'ascending').lower()) for p in composite)
+        for composite in policy.get('compositeIndexes') or []
+    )
+    return policy.get('indexingMode', 'consistent').lower(), paths('includedPaths'), paths('excludedPaths'), composites
+
+
+def migrate_indexing_policies(database, containers):
+    """Bring existing containers' indexing policies and default TTLs in line with the configuration
+
+    ``containers`` is a list of (container, partition key path, policy name,
+    default TTL); None containers are skipped. create_container_if_not_exists
+    only applies either on creation, so this is what makes a changed
+    PROGRESS_EVENT_TTL_DAYS take effect. replace_container starts an online
+    index transformation: reads and writes continue, and queries on newly
+    indexed paths may cost more RUs until it completes. A failure (e.g. an
+    identity without control-plane rights) only warns.
+    """
+    for container, partition_key_path, name, default_ttl in containers:
+        if container is None:
+            continue
+        policy = COSMOS_INDEXING_POLICIES[name]
+        try:
+            properties = container.read()
+            policy_changed = (indexing_policy_signature(properties.get('indexingPolicy') or {})
+                              != indexing_policy_signature(policy))
+            ttl_changed = properties.get('defaultTtl') != default_ttl
+            if not policy_changed and not ttl_changed:
+                continue
+            database.replace_container(
+                container, partition_key=PartitionKey(path=partition_key_path),
+                indexing_policy=policy, default_ttl=default_ttl  # None removes the TTL
+            )
+            if policy_changed:
+                print(f"✓ Updated indexing policy of {properties.get('id', name)} (re-indexing in the background)")
+            if ttl_changed:
+                print(f"✓ Updated default TTL of {properties.get('id', name)} to {default_ttl}")
+        except Exception as exc:
+            print(f"⚠ Could not update indexing policy or TTL of {name}: {exc}")
+
+
+def run_native(fn, *args):
+    """Call ``fn`` on a native thread when serving under gevent, else inline
+
+    gevent workers run every request as a greenlet on one OS thread, so a
+    CPU-bound call such as bcrypt would stall all of them (event streams
+    included). bcrypt releases the GIL, so on gevent's thread pool it runs
+    beside the event loop, and bulk imports still hash on several cores.
+    """
+    monkey = sys.modules.get('gevent.monkey')
+    if monkey is not None and monkey.is_module_patched('threading'):
+        return sys.modules['gevent'].get_hub().threadpool.apply(fn, args)
+    return fn(*args)
+
+
+@profile_category('bcrypt')
+def hash_password(password, cost=None):
+    """Hash a password using bcrypt at the calibrated cost"""
+    salt = bcrypt.gensalt(rounds=cost or bcrypt_cost)
+    return run_native(bcrypt.hashpw, password.encode('utf-8'), salt).decode('utf-8')
+
+
+@profile_category('bcrypt')
 def verify_password(password, hashed):
     """Verify a password against its hash"""
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+    return run_native(bcrypt.checkpw, password.encode('utf-8'), hashed.encode('utf-8'))
 
 
-def generate_token(user_id):
-    """Generate JWT token"""
+def bcrypt_hash_cost(hashed):
+    """Work factor of a bcrypt hash ("$2b$12$..." -> 12), or None if unparseable"""
+    try:
+        return int(hashed.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def calibrate_bcrypt_cost(target_ms=BCRYPT_TARGET_MS):
+    """Return (cost, ms per hash at BCRYPT_MIN_COST): the highest cost whose hash
+    time stays within ``target_ms``, never below BCRYPT_MIN_COST
+
+    Each extra round doubles the work, so one timed cost predicts the rest;
+    the fastest of a few samples filters out scheduling noise.
+    """
+    salt = bcrypt.gensalt(rounds=BCRYPT_MIN_COST)
+    samples = []
+    for _ in range(3):
+        started = time.perf_counter()
+        bcrypt.hashpw(b'calibration', salt)
+        samples.append((time.perf_counter() - started) * 1000)
+    base_ms = min(samples)
+    cost = BCRYPT_MIN_COST
+    while cost < BCRYPT_MAX_COST and base_ms * 2 ** (cost + 1 - BCRYPT_MIN_COST) <= target_ms:
+        cost += 1
+    return cost, base_ms
+
+
+def init_bcrypt():
+    """Choose the bcrypt cost for this process"""
+    global bcrypt_cost
+    if BCRYPT_COST:
+        bcrypt_cost = int(BCRYPT_COST)
+        return
+    bcrypt_cost, base_ms = calibrate_bcrypt_cost()
+    print(f"✓ bcrypt cost {bcrypt_cost} (~{base_ms * 2 ** (bcrypt_cost - BCRYPT_MIN_COST):.0f}ms per hash, "
+          f"target {BCRYPT_TARGET_MS:.0f}ms)")
+
+
+def bulk_import_bcrypt_cost():
+    """Cost for hashing imported passwords: BULK_IMPORT_BCRYPT_COST, capped at the login cost"""
+    return min(BULK_IMPORT_BCRYPT_COST, bcrypt_cost)
+
+
+def password_needs_rehash(auth_user):
+    """True if the stored hash's cost is below the current target"""
+    stored = auth_user.get('bcrypt_cost') or bcrypt_hash_cost(auth_user.get('password_hash'))
+    return stored is None or stored < bcrypt_cost - BCRYPT_REHASH_TOLERANCE
+
+
+@profile_category('jwt')
+def generate_token(user_id, scope=None, expires_in=None, is_admin=False):
+    """Generate JWT token
+
+    A ``scope`` restricts the token to the routes that ask for it, e.g.
+    'events' for the short-lived tokens SSE clients put in the URL. The
+    ``admin`` claim is only a hint (see _profile_trigger); admin routes
+    still check the stored record.
+    """
     payload = {
         'user_id': user_id,
-        'exp': datetime.utcnow() + timedelta(hours=JWT_EXPIRATION_HOURS)
+        'exp': datetime.utcnow() + (expires_in or timedelta(hours=JWT_EXPIRATION_HOURS))
     }
+    if scope:
+        payload['scope'] = scope
+    if is_admin:
+        payload['admin'] = True
     return jwt.encode(payload, SECRET_KEY, algorithm=JWT_ALGORITHM)
 
 
-def verify_token(token):
-    """Verify JWT token and return user_id"""
+@profile_category('jwt')
+def decode_token(token, scope=None):
+    """Verify a JWT and return its payload (None unless the token has exactly ``scope``)"""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[JWT_ALGORITHM])
-        return payload.get('user_id')
     except jwt.ExpiredSignatureError:
         return None
     except jwt.InvalidTokenError:
         return None
+    return payload if payload.get('scope') == scope else None
+
+
+def verify_token(token, scope=None):
+    """Verify JWT token and return user_id"""
+    payload = decode_token(token, scope)
+    return payload.get('user_id') if payload else None
 
 
 def token_required(f):
@@ -172,17 +947,15 @@ def admin_required(f):
 def get_auth_user_by_id(user_id):
     """Get authentication record by user_id"""
     if cosmos_enabled and cosmos_users_container:
-        try:
-            items = list(cosmos_users_container.query_items(
-                query="SELECT * FROM c WHERE c.user_id = @user_id",
-                parameters=[{"name": "@user_id", "value": user_id}],
-                enable_cross_partition_query=True
-            ))
-            return items[0] if items else None
-        except Exception:
-            return None
+        # Throttling surfaces as CosmosUnavailableError (503), not a spurious 403
+        items = cosmos_query(
+            'get_auth_user_by_id', cosmos_users_container,
+            query="SELECT * FROM c WHERE c.user_id = @user_id",
+            parameters=[{"name": "@user_id", "value": user_id}]
+        )
+        return items[0] if items else None
     # Fallback to in-memory storage
-    for auth_user in auth_users_data.values():
+    for auth_user in list(auth_users_data.values()):
         if auth_user.get('user_id') == user_id:
             return auth_user
     return None
@@ -191,7 +964,7 @@ def get_auth_user_by_id(user_id):
 def log_admin_action(admin_user_id, action, target_user, details):
     """Log an admin action for audit purposes"""
     log_entry = {
-        "id": str(uuid.uuid4()),
+        "id": new_id(),
         "admin_user_id": admin_user_id,
         "action": action,
         "target_user": target_user,
@@ -199,7 +972,7 @@ def log_admin_action(admin_user_id, action, target_user, details):
         "timestamp": datetime.utcnow().isoformat()
     }
     if cosmos_enabled and cosmos_audit_container:
-        cosmos_audit_container.upsert_item(log_entry)
+        cosmos_call('log_admin_action', cosmos_audit_container.upsert_item, log_entry)
     else:
         audit_logs.append(log_entry)
     return log_entry
@@ -241,61 +1014,829 @@ def get_auth_user(username):
     """Get authentication record for a user"""
     if cosmos_enabled and cosmos_users_container:
         try:
-            return cosmos_users_container.read_item(item=username, partition_key=username)
+            return cosmos_call('get_auth_user', cosmos_users_container.read_item, item=username, partition_key=username)
         except cosmos_exceptions.CosmosResourceNotFoundError:
             return None
     # Fallback to in-memory storage
     return auth_users_data.get(username)
 
 
-def save_auth_user(username, password_hash, user_id, is_admin=False):
-    """Save authentication record"""
-    auth_record = {
+def validate_credentials(username, password):
+    """Validate a new username/password pair, returning an error message or None"""
+    if not username or not password:
+        return 'Username and password are required'
+    if len(username) < 3:
+        return 'Username must be at least 3 characters'
+    if len(password) < 4:
+        return 'Password must be at least 4 characters'
+    return None
+
+
+def build_auth_record(username, password_hash, user_id, is_admin=False):
+    """Create an authentication record"""
+    return {
         "id": username,
         "username": username,
         "password_hash": password_hash,
+        "bcrypt_cost": bcrypt_hash_cost(password_hash),
         "user_id": user_id,
         "is_admin": is_admin,
         "created_at": datetime.utcnow().isoformat()
     }
+
+
+def save_auth_user(username, password_hash, user_id, is_admin=False):
+    """Save a new authentication record
+
+    Raises CosmosResourceExistsError if the username is already taken.
+    """
+    auth_record = build_auth_record(username, password_hash, user_id, is_admin)
     if cosmos_enabled and cosmos_users_container:
-        cosmos_users_container.upsert_item(auth_record)
+        cosmos_create('save_auth_user', cosmos_users_container, auth_record, username)
     else:
         # Fallback to in-memory storage
-        auth_users_data[username] = auth_record
+        with user_lock(username):
+            if username in auth_users_data:
+                raise cosmos_exceptions.CosmosResourceExistsError(status_code=409, message='Username already exists')
+            auth_users_data[username] = auth_record
+            username_index.add(username)
     return auth_record
 
 
+def rehash_password(username, password, old_hash):
+    """Re-hash a verified password at the current cost, unless it was changed meanwhile"""
+    new_hash = hash_password(password)
+    with user_lock(username):
+        auth_user = get_auth_user(username)
+        if not auth_user or auth_user['password_hash'] != old_hash:
+            return
+        auth_user['password_hash'] = new_hash
+        auth_user['bcrypt_cost'] = bcrypt_hash_cost(new_hash)
+        update_auth_user(auth_user)
+
+
+def update_auth_user(auth_user):
+    """Persist changes to an existing authentication record"""
+    if cosmos_enabled and cosmos_users_container:
+        cosmos_call('update_auth_user', cosmos_users_container.upsert_item, auth_user)
+    else:
+        auth_users_data[auth_user['username']] = auth_user
+
+
+class UsernameIndex:
+    """Sorted index of the in-memory usernames, for admin search
+
+    Prefix matches are a bisect into the sorted list. Substring matches scan a
+    newline-joined copy of it with str.find, rebuilt lazily after inserts; at
+    hundreds of thousands of names that is a few milliseconds, without the
+    memory a per-name trigram index would take.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._names = []
+        self._snapshot = None  # (names copy, joined names, start offset of each name)
+
+    def add(self, username):
+        with self._lock:
+            bisect.insort(self._names, username)
+            self._snapshot = None
+
+    def clear(self):
+        with self._lock:
+            self._names = []
+            self._snapshot = None
+
+    def prefix(self, prefix, after=None, limit=50):
+        """Return (names starting with ``prefix`` and sorting after ``after``, more)"""
+        with self._lock:
+            start = bisect.bisect_left(self._names, prefix)
+            if after is not None:
+                start = max(start, bisect.bisect_right(self._names, after))
+            candidates = self._names[start:start + limit + 1]
+        matches = [name for name in candidates if name.startswith(prefix)]
+        return matches[:limit], len(matches) > limit
+
+    def contains(self, fragment, after=None, limit=50):
+        """Return (names containing ``fragment`` and sorting after ``after``, more)"""
+        names, joined, starts = self._get_snapshot()
+        index = bisect.bisect_right(names, after) if after is not None else 0
+        pos = starts[index] if index < len(starts) else len(joined)
+        matches = []
+        while len(matches) <= limit:
+            hit = joined.find(fragment, pos)
+            if hit < 0:
+                break
+            index = bisect.bisect_right(starts, hit) - 1
+            if fragment in names[index]:  # a hit can't span the separator, but be safe
+                matches.append(names[index])
+            pos = starts[index + 1] if index + 1 < len(starts) else len(joined)
+        return matches[:limit], len(matches) > limit
+
+    def _get_snapshot(self):
+        with self._lock:
+            if self._snapshot is None:
+                names = list(self._names)
+                starts, offset = [], 0
+                for name in names:
+                    starts.append(offset)
+                    offset += len(name) + 1
+                self._snapshot = (names, '\n'.join(names), starts)
+            return self._snapshot
+
+
+username_index = UsernameIndex()
+
+
+def search_usernames(query, mode='prefix', after=None, limit=50):
+    """Return (auth summaries, more) for usernames matching ``query``, in username order
+
+    ``mode`` is 'prefix' or 'contains'; ``after`` is the last username of the
+    previous page. In Cosmos the prefix query is a range scan on the username
+    index; CONTAINS has to scan the whole index, so it costs more RUs.
+    """
+    fields = ('username', 'user_id', 'is_admin', 'created_at')
+    if cosmos_enabled and cosmos_users_container:
+        clauses = ["STARTSWITH(c.username, @q)" if mode == 'prefix' else "CONTAINS(c.username, @q)"]
+        parameters = [{"name": "@q", "value": query}, {"name": "@limit", "value": limit + 1}]
+        if after is not None:
+            clauses.append("c.username > @after")
+            parameters.append({"name": "@after", "value": after})
+        items = cosmos_query(
+            'search_users', cosmos_users_container,
+            query=f"SELECT TOP @limit {', '.join('c.' + f for f in fields)} FROM c "
+                  f"WHERE {' AND '.join(clauses)} ORDER BY c.username",
+            parameters=parameters
+        )
+        return items[:limit], len(items) > limit
+    # Fallback to in-memory storage
+    find = username_index.prefix if mode == 'prefix' else username_index.contains
+    names, more = find(query, after, limit)
+    return [{f: auth_users_data[name].get(f) for f in fields} for name in names], more
+
+
 def get_user_record(user_id):
-    """Get user progress record"""
+    """Get user progress record (with the event log on, the snapshot plus later events)"""
+    if PROGRESS_EVENT_LOG:
+        return load_progress_state(user_id)[0]
+    return read_user_snapshot(user_id)
+
+
+def read_user_snapshot(user_id):
+    """Read the stored user progress document"""
     if cosmos_enabled and cosmos_container:
         try:
-            return cosmos_container.read_item(item=user_id, partition_key=user_id)
+            return cosmos_call('get_user_record', cosmos_container.read_item, item=user_id, partition_key=user_id)
         except cosmos_exceptions.CosmosResourceNotFoundError:
             return None
-    return users_data.get(user_id)
+    record = users_data.get(user_id)
+    return record.to_dict() if record else None
 
 
-def save_user_record(user):
-    """Save user progress record"""
+def save_user_record(user, if_unchanged=False):
+    """Save user progress record
+
+    With ``if_unchanged`` the Cosmos write is conditional on the record's
+    ETag, raising CosmosAccessConditionFailedError (or CosmosResourceExistsError
+    for a record that was created concurrently) if another writer got there first.
+    """
     if cosmos_enabled and cosmos_container:
-        cosmos_container.upsert_item(user)
+        if not if_unchanged:
+            cosmos_call('save_user_record', cosmos_container.upsert_item, user)
+        elif user.get('_etag'):
+            cosmos_call(
+                'save_user_record', cosmos_container.replace_item,
+                item=user['id'], body=user, etag=user['_etag'], match_condition=MatchConditions.IfNotModified
+            )
+        else:
+            cosmos_create('save_user_record', cosmos_container, user, user['user_id'])
+    else:
+        users_data[user["user_id"]] = UserRecord.from_dict(user)
+
+
+class ProgressEventSegments:
+    """Append-only NDJSON segment files holding the progress event history
+
+    Segments are never rewritten: a new one is started when the current one
+    reaches PROGRESS_SEGMENT_BYTES, and after a restart.
+    """
+
+    def __init__(self, directory, max_bytes=PROGRESS_SEGMENT_BYTES):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        pattern = re.compile(r'^progress-(\d+)\.ndjson$')
+        numbers = [int(m.group(1)) for m in map(pattern.match, os.listdir(directory)) if m]
+        self._number = max(numbers, default=0)
+        self._file = None
+        self._lock = threading.Lock()
+
+    def append(self, event):
+        line = json.dumps(event) + "\n"
+        with self._lock:
+            if self._file is None or self._file.tell() + len(line) > self.max_bytes:
+                if self._file is not None:
+                    self._file.close()
+                self._number += 1
+                self._file = open(os.path.join(self.directory, f"progress-{self._number:06d}.ndjson"), 'a',
+                                  encoding='utf-8')
+            self._file.write(line)
+            self._file.flush()
+
+
+def progress_changes(before, after):
+    """Top-level differences between two versions of a progress record, as an
+    event payload; lists that only grew (badges) are recorded as appends"""
+    changes = {}
+    for key, value in after.items():
+        if key in PROGRESS_SYSTEM_FIELDS:
+            continue
+        old = before.get(key)
+        if key in before and old == value:
+            continue
+        if isinstance(old, list) and isinstance(value, list) and value[:len(old)] == old:
+            changes.setdefault("append", {})[key] = value[len(old):]
+        else:
+            changes.setdefault("set", {})[key] = value
+    removed = [key for key in before if key not in after and key not in PROGRESS_SYSTEM_FIELDS]
+    if removed:
+        changes["unset"] = removed
+    return changes
+
+
+def apply_progress_event(state, event):
+    """Replay one event onto a progress record in place"""
+    for key, value in event.get("set", {}).items():
+        state[key] = copy.deepcopy(value)
+    for key, values in event.get("append", {}).items():
+        state.setdefault(key, []).extend(copy.deepcopy(values))
+    for key in event.get("unset", ()):
+        state.pop(key, None)
+    state['event_seq'] = event['seq']
+
+
+def load_progress_state(user_id):
+    """Return (state, snapshot_seq): the latest snapshot with the events after it replayed"""
+    if cosmos_enabled and cosmos_events_container:
+        snapshot = read_user_snapshot(user_id)
+        snapshot_seq = snapshot.get('event_seq', 0) if snapshot else 0
+        events = cosmos_query(
+            'load_progress_events', cosmos_events_container,
+            query="SELECT * FROM c WHERE c.user_id = @user_id AND c.seq > @seq ORDER BY c.seq",
+            parameters=[{"name": "@user_id", "value": user_id}, {"name": "@seq", "value": snapshot_seq}],
+            partition_key=user_id
+        )
+    else:
+        # Read the pending list before the snapshot: compaction saves the
+        # snapshot before it prunes the list, so no event can fall in between
+        pending = list(progress_events.get(user_id, ()))
+        snapshot = read_user_snapshot(user_id)
+        snapshot_seq = snapshot.get('event_seq', 0) if snapshot else 0
+        events = [e for e in pending if e['seq'] > snapshot_seq]
+    if not events:
+        return snapshot, snapshot_seq
+
+    state = snapshot or default_user(user_id)
+    for event in events:
+        apply_progress_event(state, event)
+    return state, snapshot_seq
+
+
+def fold_pending_events(rows):
+    """Replay pending events onto a page of snapshot rows in place and return them
+
+    Rows need at least user_id and event_seq. With Cosmos one query per
+    PROGRESS_FOLD_CHUNK rows fetches every row's events after its own
+    snapshot, so bulk readers see current state without a read per user.
+    """
+    if not PROGRESS_EVENT_LOG or not rows:
+        return rows
+    if cosmos_enabled and cosmos_events_container:
+        events = []
+        for start in range(0, len(rows), PROGRESS_FOLD_CHUNK):
+            clauses, parameters = [], []
+            for i, row in enumerate(rows[start:start + PROGRESS_FOLD_CHUNK]):
+                clauses.append(f"(c.user_id = @user{i} AND c.seq > @seq{i})")
+                parameters += [{"name": f"@user{i}", "value": row['user_id']},
+                               {"name": f"@seq{i}", "value": row.get('event_seq') or 0}]
+            events += cosmos_query('fold_progress_events', cosmos_events_container,
+                                   query=f"SELECT * FROM c WHERE {' OR '.join(clauses)}", parameters=parameters)
+    else:
+        events = []
+        for row in rows:
+            pending = list(progress_events.get(row['user_id'], ()))
+            if pending and pending[0]['seq'] > (row.get('event_seq') or 0) + 1:
+                # Compacted (and pruned) since the row was read: start from the new snapshot
+                snapshot = read_user_snapshot(row['user_id']) or {}
+                row.update({key: snapshot[key] for key in row if key in snapshot})
+            events += [e for e in pending if e['seq'] > (row.get('event_seq') or 0)]
+    pending = {}
+    for event in events:
+        pending.setdefault(event['user_id'], []).append(event)
+    for row in rows:
+        for event in sorted(pending.get(row['user_id'], ()), key=lambda e: e['seq']):
+            apply_progress_event(row, event)
+    return rows
+
+
+def iter_folded(rows, page_size):
+    """Yield snapshot rows with their pending events folded in, a page at a time"""
+    page = []
+    for row in rows:
+        page.append(row)
+        if len(page) >= page_size:
+            yield from fold_pending_events(page)
+            page = []
+    yield from fold_pending_events(page)
+
+
+def append_progress_event(user_id, seq, changes, event_type, data=None, points=0):
+    """Append event ``seq`` for a user; raises CosmosResourceExistsError if another writer took it"""
+    event = {
+        "id": f"{user_id}:{seq:010d}",
+        "user_id": user_id,
+        "seq": seq,
+        "type": event_type,
+        "ts": datetime.utcnow().isoformat(),
+        "data": data,
+        "points": points,  # points gained, for leaderboard backfills
+        **changes
+    }
+    if cosmos_enabled and cosmos_events_container:
+        cosmos_create('append_progress_event', cosmos_events_container, event, user_id)
+    else:
+        # Caller holds the user's lock, so sequence numbers can't collide here
+        progress_events.setdefault(user_id, []).append(event)
+        if progress_segments is not None:
+            progress_segments.append(event)
+    return event
+
+
+def compact_progress(user):
+    """Fold the replayed state back into the user's snapshot record"""
+    user_id = user['user_id']
+    try:
+        save_user_record(user, if_unchanged=True)
+    except (cosmos_exceptions.CosmosAccessConditionFailedError,
+            cosmos_exceptions.CosmosResourceExistsError):
+        return  # another worker compacted first; its snapshot is at least as new
+    if not cosmos_enabled:
+        # Only the unfolded tail stays on the hot list; the segment files (or
+        # the in-memory archive) keep the history
+        events = progress_events.get(user_id, [])
+        progress_events[user_id] = [e for e in events if e['seq'] > user['event_seq']]
+        if progress_segments is None:
+            progress_event_history.setdefault(user_id, []).extend(e for e in events if e['seq'] <= user['event_seq'])
+
+
+def _modify_via_events(user_id, mutate, event_type, event_data):
+    """One attempt of modify_user_record with the event log: append the change as an event
+
+    Returns (user, result), or None if another writer took the sequence number.
+    """
+    user, snapshot_seq = load_progress_state(user_id)
+    # A brand-new user's first event carries the whole record, created_at
+    # included, so replaying it onto default_user() restores the original
+    before = copy.deepcopy(user) if user else {}
+    user = user or default_user(user_id)
+    result = mutate(user)
+
+    changes = progress_changes(before, user)
+    if not changes:
+        return user, result
+    seq = user.get('event_seq', 0) + 1
+    points = user.get('total_points', 0) - before.get('total_points', 0)
+    try:
+        append_progress_event(user_id, seq, changes, event_type, event_data, points)
+    except cosmos_exceptions.CosmosResourceExistsError:
+        return None
+    user['event_seq'] = seq
+    if seq - snapshot_seq >= PROGRESS_SNAPSHOT_EVERY:
+        compact_progress(user)
+    return user, result
+
+
+def modify_user_record(user_id, mutate, event_type, event_data=None):
+    """Read-modify-write a user record, returning (user, mutate(user))
+
+    Holds the user's lock stripe for the in-memory store and uses ETag
+    optimistic concurrency for Cosmos, retrying when another worker wins
+    the race. Raises RecordConflictError after RECORD_UPDATE_RETRIES attempts.
+    With PROGRESS_EVENT_LOG the change is appended as an event (described by
+    ``event_type`` and ``event_data``) instead of rewriting the record.
+    """
+    with user_lock(user_id):
+        for _ in range(RECORD_UPDATE_RETRIES):
+            if PROGRESS_EVENT_LOG:
+                outcome = _modify_via_events(user_id, mutate, event_type, event_data)
+                if outcome is not None:
+                    return outcome
+                continue
+            user = get_user_record(user_id) or default_user(user_id)
+            result = mutate(user)
+            try:
+                save_user_record(user, if_unchanged=True)
+            except (cosmos_exceptions.CosmosAccessConditionFailedError,
+                    cosmos_exceptions.CosmosResourceExistsError):
+                continue
+            return user, result
+    raise RecordConflictError(user_id)
+
+
+def create_users_batch(rows):
+    """Create auth and progress records for a batch of (username, password_hash) rows.
+
+    Returns a list of (user_id, message) tuples in the same order as ``rows``:
+    user_id is None when the row failed (message is the error); a message
+    alongside a user_id is a warning for an account that was created.
+    Cosmos writes are issued concurrently; each user lands in its own
+    partition, so a transactional batch cannot span them. If the progress
+    record can't be written the auth record is rolled back, so re-importing
+    the roster retries the row instead of reporting a taken username.
+    """
+    def write_one(row):
+        username, password_hash = row
+        user_id = new_id()
+        auth_record = build_auth_record(username, password_hash, user_id)
+        try:
+            cosmos_create('bulk_import', cosmos_users_container, auth_record, username)
+        except cosmos_exceptions.CosmosResourceExistsError:
+            return None, 'Username already exists'
+        except Exception as exc:
+            return None, str(exc)
+        try:
+            cosmos_call('bulk_import', cosmos_container.upsert_item, default_user(user_id, username))
+        except Exception as exc:
+            try:
+                cosmos_call('bulk_import', cosmos_users_container.delete_item, item=username, partition_key=username)
+            except Exception:
+                return user_id, f'Account created, but its progress record was not saved: {exc}'
+            return None, f'Progress record not saved (account not created): {exc}'
+        return user_id, None
+
+    if cosmos_enabled and cosmos_users_container and cosmos_container:
+        with ThreadPoolExecutor(max_workers=BULK_IMPORT_WORKERS) as executor:
+            return list(executor.map(write_one, rows))
+
+    results = []
+    for username, password_hash in rows:
+        user_id = new_id()
+        try:
+            save_auth_user(username, password_hash, user_id)
+        except cosmos_exceptions.CosmosResourceExistsError:
+            results.append((None, 'Username already exists'))
+            continue
+        save_user_record(default_user(user_id, username))
+        results.append((user_id, None))
+    return results
+
+
+def iter_roster_rows(text, fmt):
+    """Yield (line_number, row_dict_or_None) from a CSV or NDJSON roster"""
+    if fmt == 'csv':
+        reader = csv.DictReader(io.StringIO(text))
+        for row in reader:
+            yield reader.line_num, {(k or '').strip().lower(): (v or '') for k, v in row.items()}
+        return
+
+    for line_no, line in enumerate(io.StringIO(text), start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield line_no, row if isinstance(row, dict) else None
+
+
+def iter_export_records(dataset, fields=None, since=None):
+    """Lazily yield records for an export, page by page, without materializing the store"""
+    since_field = EXPORT_DATASETS[dataset]['since_field']
+    container = {
+        'users': cosmos_users_container,
+        'progress': cosmos_container,
+        'audit-logs': cosmos_audit_container,
+        'progress-events': cosmos_events_container
+    }[dataset]
+
+    fold = dataset == 'progress' and PROGRESS_EVENT_LOG
+    if cosmos_enabled and container:
+        if fold and fields:
+            # Needed to fold pending events and to filter the folded rows
+            fields = list(dict.fromkeys(fields + ['user_id', 'event_seq', since_field]))
+        projection = ', '.join(f'c.{field}' for field in fields) if fields else '*'
+        query = f"SELECT {projection} FROM c"
+        parameters = []
+        if since and not fold:
+            query += f" WHERE c.{since_field} >= @since"
+            parameters.append({"name": "@since", "value": since})
+        records = iter_cosmos_query(
+            f'export_{dataset}', container, page_size=EXPORT_PAGE_SIZE,
+            query=query, parameters=parameters
+        )
+        if not fold:
+            yield from records
+            return
+        # A snapshot's since_field lags its pending events, so filter after folding
+        for record in iter_folded(records, EXPORT_PAGE_SIZE):
+            if not since or (record.get(since_field) or '') >= since:
+                yield record
+        return
+
+    # Snapshot references only, so concurrent writes don't break iteration
+    if dataset == 'users':
+        records = list(auth_users_data.values())
+    elif dataset == 'progress':
+        records = iter_folded((record.to_dict() for record in list(users_data.values())), EXPORT_PAGE_SIZE)
+    elif dataset == 'progress-events':
+        # With PROGRESS_EVENT_DIR only events not yet folded into snapshots; the rest are in the segment files
+        records = [event for user_id in list(progress_events)
+                   for event in list(progress_event_history.get(user_id, ())) + list(progress_events.get(user_id, ()))]
     else:
-        users_data[user["user_id"]] = user
+        records = list(audit_logs)
+    for record in records:
+        if since and (record.get(since_field) or '') < since:
+            continue
+        yield record
+
+
+def iter_export_chunks(records, fmt, fields):
+    """Serialize records as NDJSON or CSV, yielding ~EXPORT_CHUNK_BYTES chunks"""
+    buffer = io.StringIO()
+    writer = None
+    if fmt == 'csv':
+        writer = csv.writer(buffer)
+        writer.writerow(fields)
+
+    for record in records:
+        if fields:
+            row = {field: record.get(field) for field in fields}
+        else:
+            row = {k: v for k, v in record.items() if k not in EXPORT_EXCLUDED_FIELDS}
+        if writer:
+            writer.writerow([
+                json.dumps(value) if isinstance(value, (dict, list)) else ('' if value is None else value)
+                for value in row.values()
+            ])
+        else:
+            buffer.write(json.dumps(row))
+            buffer.write('\n')
+        if buffer.tell() >= EXPORT_CHUNK_BYTES:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def leaderboard_bucket(window, subject=None, now=None):
+    """Return (bucket_key, expires_at) for a leaderboard view at ``now``
+
+    Daily buckets are kept for a day after they close and weekly buckets for
+    a week, so "yesterday" and "last week" remain readable briefly. The
+    all-time bucket only exists per subject and never expires.
+    """
+    now = now or datetime.utcnow()
+    today = now.date()
+    if window == 'daily':
+        period = today.isoformat()
+        closes = datetime.combine(today + timedelta(days=1), datetime.min.time())
+        expires_at = closes + timedelta(days=1)
+    elif window == 'weekly':
+        year, week, weekday = today.isocalendar()
+        period = f"{year}-W{week:02d}"
+        closes = datetime.combine(today + timedelta(days=8 - weekday), datetime.min.time())
+        expires_at = closes + timedelta(days=7)
+    else:
+        period, expires_at = None, None
+
+    key = ':'.join(part for part in (window, period, subject) if part)
+    return key, expires_at
+
+
+def bucket_expires_at(key):
+    """The expires_at leaderboard_bucket() gives ``key`` (None for all-time buckets)"""
+    window, _, rest = key.partition(':')
+    period = rest.split(':')[0]
+    if window == 'daily':
+        return datetime.fromisoformat(period) + timedelta(days=2)
+    if window == 'weekly':
+        year, week = period.split('-W')
+        return datetime.fromisocalendar(int(year), int(week), 1) + timedelta(days=14)
+    return None
+
+
+def period_bucket_keys(subject=None, now=None):
+    """All bucket keys a points gain in ``subject`` counts towards right now"""
+    buckets = [leaderboard_bucket('daily', None, now), leaderboard_bucket('weekly', None, now)]
+    if subject in LEADERBOARD_SUBJECTS:
+        buckets += [leaderboard_bucket(window, subject, now) for window in LEADERBOARD_WINDOWS]
+    return buckets
+
+
+def add_period_points(user, points, subject=None, now=None):
+    """Credit points to the user's current time buckets and drop expired ones"""
+    now = now or datetime.utcnow()
+    live_keys = {key for subj in (None,) + LEADERBOARD_SUBJECTS for key, _ in period_bucket_keys(subj, now)}
+    counters = {k: v for k, v in (user.get('period_points') or {}).items() if k in live_keys}
+    for key, _ in period_bucket_keys(subject, now):
+        counters[key] = counters.get(key, 0) + points
+    user['period_points'] = counters
+
+
+def leaderboard_entry(user, points, key=None):
+    """The projected fields a leaderboard view stores per user"""
+    if key == 'all':
+        return {**{field: user.get(field) for field in LEADERBOARD_RECORD_FIELDS}, "points": points}
+    return {
+        "user_id": user['user_id'],
+        "username": user.get('username'),
+        "points": points,
+        "current_level": user.get('current_level', 1)
+    }
+
+
+def _offer_entry(entries, entry):
+    """Insert or update ``entry`` in a descending top-k list; return True if it changed
+
+    Bucket counters only ever increase, so a user outside the top-k can only
+    enter it through their own update, which keeps the precomputed view exact
+    without ever re-scanning all users.
+    """
+    existing = next((e for e in entries if e['user_id'] == entry['user_id']), None)
+    if existing == entry:
+        return False
+    if existing is None and len(entries) >= LEADERBOARD_TOP_K and entry['points'] <= entries[-1]['points']:
+        return False
+    if existing is not None:
+        entries.remove(existing)
+    entries.append(entry)
+    entries.sort(key=lambda e: e['points'], reverse=True)
+    del entries[LEADERBOARD_TOP_K:]
+    return True
+
+
+def _expire_leaderboard_views(now_ts):
+    """Drop expired in-memory views (caller holds _leaderboard_lock)"""
+    expired = [k for k, v in leaderboard_views.items() if v['expires_at'] and v['expires_at'] <= now_ts]
+    for key in expired:
+        del leaderboard_views[key]
+
+
+def _seed_view_entries(key):
+    """Initial entries for a view that doesn't exist yet
+
+    Only the all-time view has history to seed from; it is built once from
+    the top of the store (get_top_users) and maintained incrementally
+    afterwards. Like the original leaderboard it includes players who
+    haven't scored yet; the windowed views list only scorers.
+    """
+    if key != 'all':
+        return []
+    return [leaderboard_entry(u, u.get('total_points', 0), key) for u in get_top_users(LEADERBOARD_TOP_K)]
+
+
+def _view_is_current(key, view):
+    """False for an all-time view document stored with other LEADERBOARD_RECORD_FIELDS (it is reseeded)"""
+    return key != 'all' or view.get('fields') == list(LEADERBOARD_RECORD_FIELDS)
+
+
+def update_leaderboard_views(user, subject=None, now=None, scored=True):
+    """Offer the user's current bucket scores to each precomputed top-k view
+
+    Returns {bucket_key: entries} for the views whose top-k changed. Without
+    ``scored`` only the all-time view is offered the user, whose record
+    fields there may still have changed. With the change feed running, the
+    feed processor maintains the Cosmos views and publishes their changes
+    instead, so this is a no-op.
+    """
+    global leaderboard_dropped_updates
+    cosmos_views = cosmos_enabled and cosmos_leaderboard_container
+    if cosmos_views and leaderboard_feed is not None:
+        return {}
+    now = now or datetime.utcnow()
+    counters = user.get('period_points') or {}
+    changed = {}
+    for key, expires_at in (period_bucket_keys(subject, now) if scored else []) + [('all', None)]:
+        entry = leaderboard_entry(user, user['total_points'] if key == 'all' else counters.get(key, 0), key)
+        if cosmos_views:
+            try:
+                entries = _offer_cosmos_view(cosmos_leaderboard_container, key, expires_at, [entry], now)
+            except RecordConflictError as exc:
+                with _leaderboard_lock:
+                    leaderboard_dropped_updates += 1
+                print(f"⚠ Leaderboard update dropped for {user['user_id']}: {exc}")
+                continue
+            if entries is not None:
+                changed[key] = entries
+            continue
+        with _leaderboard_lock:
+            _expire_leaderboard_views(time.time())
+            view = leaderboard_views.get(key)
+            created = view is None
+            if created:
+                view = leaderboard_views[key] = {
+                    "entries": _seed_view_entries(key),
+                    "expires_at": (expires_at - datetime(1970, 1, 1)).total_seconds() if expires_at else None
+                }
+            if _offer_entry(view['entries'], entry) or created:
+                changed[key] = [dict(e) for e in view['entries']]
+    return changed
+
+
+def _offer_cosmos_view(container, key, expires_at, offers, now):
+    """ETag-guarded read-modify-write of one leaderboard view document
+
+    Returns the new entries if the view changed, else None. Raises
+    RecordConflictError if the document kept changing underneath us.
+    """
+    for _ in range(RECORD_UPDATE_RETRIES):
+        try:
+            view = cosmos_call('read_leaderboard', container.read_item, item=key, partition_key=key)
+        except cosmos_exceptions.CosmosResourceNotFoundError:
+            view = {"id": key}
+        changed = not _view_is_current(key, view) or '_etag' not in view
+        if changed:
+            # A seeded view is stored even if the offers don't move it
+            view['entries'] = _seed_view_entries(key)
+            if key == 'all':
+                view['fields'] = list(LEADERBOARD_RECORD_FIELDS)
+        for entry in offers:
+            changed = _offer_entry(view['entries'], entry) or changed
+        if not changed:
+            return None
+        if expires_at:
+            view['ttl'] = max(60, int((expires_at - now).total_seconds()))
+        try:
+            if view.get('_etag'):
+                cosmos_call(
+                    'save_leaderboard', container.replace_item, item=key, body=view,
+                    etag=view['_etag'], match_condition=MatchConditions.IfNotModified
+                )
+            else:
+                cosmos_create('save_leaderboard', container, view, key)
+            return view['entries']
+        except (cosmos_exceptions.CosmosAccessConditionFailedError,
+                cosmos_exceptions.CosmosResourceExistsError):
+            continue
+    raise RecordConflictError(f'leaderboard view {key} kept changing')
+
+
+def get_leaderboard_view(window, subject=None, limit=10):
+    """Read a precomputed top-k view"""
+    key, _ = leaderboard_bucket(window, subject)
+    if cosmos_enabled and cosmos_leaderboard_container:
+        try:
+            view = cosmos_call('read_leaderboard', cosmos_leaderboard_container.read_item, item=key, partition_key=key)
+        except cosmos_exceptions.CosmosResourceNotFoundError:
+            view = None
+        if view is None or not _view_is_current(key, view):
+            if key != 'all':
+                return []  # only the all-time view has history to seed from
+            # Store the seed so the next request is a point read again
+            try:
+                entries = _offer_cosmos_view(cosmos_leaderboard_container, key, None, [], datetime.utcnow())
+            except RecordConflictError:
+                return _seed_view_entries(key)[:limit]
+            if entries is None:  # another worker stored it first
+                view = cosmos_call('read_leaderboard', cosmos_leaderboard_container.read_item,
+                                   item=key, partition_key=key)
+                entries = view['entries']
+            return entries[:limit]
+        return view['entries'][:limit]
+    with _leaderboard_lock:
+        _expire_leaderboard_views(time.time())
+        view = leaderboard_views.get(key)
+        if view is None and key == 'all':
+            view = leaderboard_views[key] = {"entries": _seed_view_entries(key), "expires_at": None}
+        return [dict(e) for e in view['entries'][:limit]] if view else []
 
 
 def get_top_users(limit=10):
-    """Get top users by points"""
+    """Get top users by points, projected to LEADERBOARD_RECORD_FIELDS
+
+    Only seeds the all-time view (_seed_view_entries), which then serves
+    /api/leaderboard. One ``ORDER BY`` query (the total_points path is
+    indexed). With PROGRESS_EVENT_LOG and Cosmos, users are ranked by their
+    snapshot totals (which trail by fewer than PROGRESS_SNAPSHOT_EVERY
+    events) and the pending events are folded into the ones returned.
+    """
     if cosmos_enabled and cosmos_container:
-        query = "SELECT TOP @limit * FROM c ORDER BY c.total_points DESC"
-        items = cosmos_container.query_items(
-            query=query,
-            parameters=[{"name": "@limit", "value": limit}],
-            enable_cross_partition_query=True
-        )
-        return list(items)
-    sorted_users = sorted(users_data.values(), key=lambda x: x['total_points'], reverse=True)
-    return sorted_users[:limit]
+        projection = ', '.join(f'c.{field}' for field in LEADERBOARD_RECORD_FIELDS + ('event_seq',))
+        users = fold_pending_events(cosmos_query(
+            'get_top_users', cosmos_container,
+            query=f"SELECT TOP @limit {projection} FROM c ORDER BY c.total_points DESC",
+            parameters=[{"name": "@limit", "value": limit}]
+        ))
+        return sorted(users, key=lambda u: u.get('total_points', 0), reverse=True)
+    if PROGRESS_EVENT_LOG:
+        return heapq.nlargest(limit, iter_folded((u.to_dict() for u in list(users_data.values())), 500),
+                              key=lambda u: u.get('total_points', 0))
+    # Plain field reads, no per-user locks: the caller may hold one already
+    return [u.to_dict() for u in heapq.nlargest(limit, list(users_data.values()),
+                                                key=lambda u: u.get('total_points', 0))]
 
 
 def check_for_badges(user, game_data=None):
@@ -405,36 +1946,22 @@ def check_for_badges(user, game_data=None):
 
 def update_streak(user):
     """Update user's daily streak"""
-    now = datetime.utcnow()
-    today = now.date().isoformat()
-    
+    day = current_challenge_day()
     last_played_date = user.get('last_played_date')
     
-    if last_played_date:
-        last_date = datetime.fromisoformat(last_played_date).date()
-        current_date = now.date()
-        days_diff = (current_date - last_date).days
-        
-        if days_diff == 0:
-            # Already played today, no streak change
-            return user['streak_days'], False
-        elif days_diff == 1:
-            # Consecutive day - increase streak
-            user['streak_days'] += 1
-            user['longest_streak'] = max(user.get('longest_streak', 0), user['streak_days'])
-            streak_bonus = user['streak_days'] * 10  # Bonus points for streak
-            return streak_bonus, True
-        else:
-            # Streak broken
-            user['streak_days'] = 1
-            return 0, True
+    if last_played_date == day['today']:
+        # Already played today, no streak change
+        return user['streak_days'], False
+    elif last_played_date == day['yesterday']:
+        # Consecutive day - increase streak
+        user['streak_days'] += 1
+        user['longest_streak'] = max(user.get('longest_streak', 0), user['streak_days'])
+        streak_bonus = user['streak_days'] * 10  # Bonus points for streak
+        return streak_bonus, True
     else:
-        # First time playing
+        # First time playing, or streak broken
         user['streak_days'] = 1
         return 0, True
-    
-    user['last_played_date'] = today
-    return 0, False
 
 
 def generate_daily_challenges():
@@ -474,24 +2001,80 @@ def generate_daily_challenges():
     return challenges
 
 
+def current_challenge_day():
+    """Today's shared challenge template and date strings, rebuilt once when the UTC date changes"""
+    global challenge_day
+    today = datetime.utcnow().date()
+    day = challenge_day
+    if day is None or day['date'] != today:
+        with _challenge_day_lock:
+            if challenge_day is None or challenge_day['date'] != today:
+                challenge_day = {
+                    "date": today,
+                    "today": today.isoformat(),
+                    "yesterday": (today - timedelta(days=1)).isoformat(),
+                    "active_since": (today - timedelta(days=DAILY_ROLLOVER_ACTIVE_DAYS)).isoformat(),
+                    "challenges": generate_daily_challenges()
+                }
+            day = challenge_day
+    return day
+
+
 def get_daily_challenges(user):
     """Get or create daily challenges for the user"""
-    today = datetime.utcnow().date().isoformat()
+    day = current_challenge_day()
     
     if 'daily_challenges' not in user:
         user['daily_challenges'] = {}
     
     # Check if challenges need to be refreshed
-    if user['daily_challenges'].get('date') != today:
+    if user['daily_challenges'].get('date') != day['today']:
         user['daily_challenges'] = {
-            'date': today,
-            'challenges': generate_daily_challenges(),
+            'date': day['today'],
+            'challenges': [dict(challenge) for challenge in day['challenges']],
             'subjects_today': []
         }
     
     return user['daily_challenges']
 
 
+def needs_rollover(summary, day):
+    """True if the daily pass has work for a user, judged from a few of its fields
+
+    ``summary`` holds user_id, last_played_date, streak_days and the
+    challenges' ``date``. A streak is broken once a whole day was missed.
+    Players active in the last DAILY_ROLLOVER_ACTIVE_DAYS get the new
+    challenges, unless their challenge state is empty or already expired
+    unplayed: those idle accounts get fresh ones lazily on their next request.
+    """
+    return _streak_broken(summary, day) or _challenges_due(summary, day)
+
+
+def _streak_broken(summary, day):
+    return bool(summary.get('streak_days')) and (summary.get('last_played_date') or '') < day['yesterday']
+
+
+def _challenges_due(summary, day):
+    last_played_date, challenges_date = summary.get('last_played_date'), summary.get('date')
+    if not last_played_date or not challenges_date or challenges_date == day['today']:
+        return False
+    return last_played_date >= day['active_since'] and last_played_date >= challenges_date
+
+
+def roll_over_user(user):
+    """Apply the daily bookkeeping to a user record in place; returns True if anything changed"""
+    day = current_challenge_day()
+    summary = {"last_played_date": user.get('last_played_date'), "streak_days": user.get('streak_days'),
+               "date": (user.get('daily_challenges') or {}).get('date')}
+    if not needs_rollover(summary, day):
+        return False
+    if _streak_broken(summary, day):
+        user['streak_days'] = 0
+    if _challenges_due(summary, day):
+        get_daily_challenges(user)
+    return True
+
+
 def update_daily_challenges(user, correct_count, total_questions, subjects_played):
     """Update daily challenge progress and award rewards"""
     challenges_data = get_daily_challenges(user)
@@ -552,24 +2135,921 @@ def generate_mystery_box():
     weighted_boxes = []
     for box in boxes:
         rarity = box.get('rarity', 0.3)
-        if random.random() < rarity:
+        if rng.random() < rarity:
             weighted_boxes.append(box)
     
     if not weighted_boxes:
         weighted_boxes = [b for b in boxes if b.get('type') != 'badge']
     
-    return random.choice(weighted_boxes) if weighted_boxes else boxes[0]
+    return rng.choice(weighted_boxes) if weighted_boxes else boxes[0]
 
 
 def load_questions():
     """Load questions from JSON file"""
-    global questions_data
-    questions_file = os.path.join(os.path.dirname(__file__), 'data', 'questions.json')
-    if os.path.exists(questions_file):
-        with open(questions_file, 'r') as f:
-            questions_data = json.load(f)
+    if os.path.exists(QUESTIONS_FILE):
+        with open(QUESTIONS_FILE, 'r') as f:
+            install_questions(json.load(f))
+    else:
+        install_questions({"math": [], "reading": []})
+
+
+def question_tokens(subject, question):
+    """Search tokens for a question: words of its text, passage, options and
+    category, plus exact-match filter tokens for subject, level and category"""
+    text = " ".join([question.get('question', ''), question.get('passage', ''),
+                     question.get('category', ''), *question.get('options', [])])
+    tokens = set(SEARCH_TOKEN_PATTERN.findall(text.lower()))
+    tokens.update((f"subject:{subject}", f"level:{question.get('level', 1)}",
+                   f"category:{question.get('category', '').lower()}"))
+    return tokens
+
+
+def _group_by_level(questions):
+    by_level = {}
+    for question in questions:
+        by_level.setdefault(question.get('level', 1), []).append(question)
+    return by_level
+
+
+def install_questions(data):
+    """Replace the whole bank (and rebuild its indexes) from ``{subject: [questions]}``"""
+    global question_bank
+    by_id = {}
+    index = {}
+    for subject, questions in data.items():
+        for question in questions:
+            by_id[question['id']] = (subject, question)
+            for token in question_tokens(subject, question):
+                index.setdefault(token, set()).add(question['id'])
+
+    bank = QuestionBank(data, {subject: _group_by_level(questions) for subject, questions in data.items()},
+                        by_id, {token: frozenset(ids) for token, ids in index.items()})
+    with _questions_lock:
+        question_bank = bank
+
+
+def _persist_questions(data):
+    """Write the bank atomically (temp file + rename) so a crash never leaves it half-written"""
+    tmp_path = f"{QUESTIONS_FILE}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, QUESTIONS_FILE)
+
+
+def write_question(subject, question, replaces=None):
+    """Add a question, replace question ``replaces`` (same id, possibly another
+    subject), or delete ``replaces`` when ``question`` is None.
+
+    Edits copies of the subject lists, the id map and the search index,
+    persists them, then rebinds question_bank; lock-free readers (search,
+    question sampling) see either the old bank or the new one, never a
+    structure changing under them. Returns False (changing nothing) if a new
+    question's id is taken or the question to replace no longer exists.
+    """
+    global question_bank
+    with _questions_lock:
+        bank = question_bank
+        if (replaces is None and question['id'] in bank.by_id) or \
+                (replaces is not None and replaces not in bank.by_id):
+            return False
+        old_subject, old_question = bank.by_id.get(replaces, (None, None))
+        data = dict(bank.data)
+        changed_subjects = {s for s in (old_subject, subject) if s}
+        for name in changed_subjects:
+            data[name] = [q for q in data.get(name, []) if q['id'] != replaces]
+        if question is not None:
+            data[subject].append(question)
+        _persist_questions(data)
+
+        index = dict(bank.index)
+        old_tokens = question_tokens(old_subject, old_question) if old_question else set()
+        new_tokens = question_tokens(subject, question) if question is not None else set()
+        for token in old_tokens - new_tokens:
+            remaining = index.get(token, frozenset()) - {replaces}
+            if remaining:
+                index[token] = remaining
+            else:
+                index.pop(token, None)
+        for token in new_tokens:
+            index[token] = index.get(token, frozenset()) | {question['id']}
+
+        by_id = dict(bank.by_id)
+        if replaces is not None:
+            by_id.pop(replaces, None)
+        if question is not None:
+            by_id[question['id']] = (subject, question)
+        by_level = dict(bank.by_level)
+        for name in changed_subjects:
+            by_level[name] = _group_by_level(data[name])
+
+        question_bank = QuestionBank(data, by_level, by_id, index)
+    return True
+
+
+def search_questions(query='', subject=None, level=None, category=None, limit=50, offset=0):
+    """Keyword search over the bank; every term must match. Returns (total, page)
+    with the page ordered by question id."""
+    tokens = set(SEARCH_TOKEN_PATTERN.findall(query.lower()))
+    if subject:
+        tokens.add(f"subject:{subject}")
+    if level is not None:
+        tokens.add(f"level:{level}")
+    if category:
+        tokens.add(f"category:{category.lower()}")
+
+    # Writers rebind question_bank rather than mutate it, so one read is a consistent snapshot
+    bank = question_bank
+    by_id, index = bank.by_id, bank.index
+    if not tokens:
+        ids = by_id.keys()
     else:
-        questions_data = {"math": [], "reading": []}
+        postings = sorted((index.get(token, frozenset()) for token in tokens), key=len)
+        ids = postings[0].intersection(*postings[1:]) if len(postings) > 1 else postings[0]
+
+    page_ids = heapq.nsmallest(offset + limit, ids)[offset:]
+    page = []
+    for question_id in page_ids:
+        entry = by_id.get(question_id)
+        if entry:
+            page.append({"subject": entry[0], **entry[1]})
+    return len(ids), page
+
+
+def validate_question(data, existing=None):
+    """Validate a question payload (merged over ``existing`` for updates).
+
+    Returns (subject, question, error); error is None when the payload is valid.
+    """
+    merged = {**(existing or {}), **data}
+    subject = str(merged.get('subject', '')).lower()
+    if subject not in QUESTION_SUBJECTS:
+        return None, None, f"subject must be one of: {', '.join(QUESTION_SUBJECTS)}"
+
+    text = merged.get('question')
+    if not isinstance(text, str) or not text.strip():
+        return None, None, 'question text is required'
+    options = merged.get('options')
+    if (not isinstance(options, list) or not 2 <= len(options) <= 6
+            or not all(isinstance(o, str) and o.strip() for o in options)):
+        return None, None, 'options must be a list of 2-6 non-empty strings'
+    correct_answer = merged.get('correct_answer')
+    if type(correct_answer) is not int or not 0 <= correct_answer < len(options):
+        return None, None, 'correct_answer must be the index of one of the options'
+    level = merged.get('level', 1)
+    if type(level) is not int or level not in QUESTION_LEVELS:
+        return None, None, f'level must be an integer from {QUESTION_LEVELS[0]} to {QUESTION_LEVELS[-1]}'
+    points = merged.get('points', 10)
+    if type(points) is not int or points <= 0:
+        return None, None, 'points must be a positive integer'
+    category = merged.get('category')
+    if not isinstance(category, str) or not category.strip():
+        return None, None, 'category is required'
+    for field in ('explanation', 'passage'):
+        if not isinstance(merged.get(field, ''), str):
+            return None, None, f'{field} must be a string'
+    question_id = merged.get('id') or f"{subject[0]}{level}_{new_id()[:8]}"
+    if not isinstance(question_id, str) or not QUESTION_ID_PATTERN.match(question_id):
+        return None, None, 'id may only contain letters, digits, underscores and dashes'
+
+    question = {
+        "id": question_id,
+        "level": level,
+        "question": text.strip(),
+        "options": [o.strip() for o in options],
+        "correct_answer": correct_answer,
+        "explanation": merged.get('explanation', ''),
+        "points": points,
+        "category": category.strip().lower()
+    }
+    if merged.get('passage'):
+        question["passage"] = merged['passage']
+    return subject, question, None
+
+
+class EventBus:
+    """Channel-based pub/sub delivering events to per-subscriber queues
+
+    Subscribers block on their own queue, so an idle SSE client costs one
+    parked connection and no polling. Slow subscribers drop events rather
+    than stall publishers.
+    """
+
+    def __init__(self):
+        self._subscribers = {}  # channel -> set of queues
+        self._lock = threading.Lock()
+        self._backplane = None
+        self._origin = uuid.uuid4().hex
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            return self._count_subscribers()
+
+    def _count_subscribers(self):
+        """Distinct subscribers (caller holds _lock)"""
+        return len({id(q) for queues in self._subscribers.values() for q in queues})
+
+    @property
+    def fans_out(self):
+        """True when events reach other workers through the Redis backplane"""
+        return self._backplane is not None
+
+    def channels(self, prefix=''):
+        """Channels that currently have local subscribers"""
+        with self._lock:
+            return [channel for channel in self._subscribers if channel.startswith(prefix)]
+
+    def subscribe(self, channels, limit=None):
+        """Return a new subscriber queue, or None if ``limit`` subscribers already exist"""
+        subscriber = queue.Queue(maxsize=SSE_QUEUE_SIZE)
+        with self._lock:
+            if limit is not None and self._count_subscribers() >= limit:
+                return None
+            for channel in channels:
+                self._subscribers.setdefault(channel, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            for channel in list(self._subscribers):
+                self._subscribers[channel].discard(subscriber)
+                if not self._subscribers[channel]:
+                    del self._subscribers[channel]
+
+    def publish(self, channel, event_type, data):
+        """Deliver to local subscribers and forward to other workers"""
+        self._deliver(channel, event_type, data)
+        if self._backplane:
+            message = json.dumps({"origin": self._origin, "channel": channel, "type": event_type, "data": data})
+            try:
+                self._backplane.publish(EVENT_BUS_REDIS_CHANNEL, message)
+            except Exception as exc:
+                print(f"⚠ Event bus backplane publish failed: {exc}")
+
+    def _deliver(self, channel, event_type, data):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        event = {"type": event_type, "channel": channel, "data": data}
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                pass
+
+    def connect_redis(self, url):
+        """Fan events out across workers via Redis pub/sub"""
+        try:
+            import redis
+        except ImportError:
+            print("⚠ EVENT_BUS_REDIS_URL is set but the redis package is not installed; events stay local")
+            return
+        client = redis.Redis.from_url(url)
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(EVENT_BUS_REDIS_CHANNEL)
+        self._backplane = client
+
+        def listen():
+            for message in pubsub.listen():
+                try:
+                    payload = json.loads(message['data'])
+                except (TypeError, ValueError):
+                    continue
+                if payload.get('origin') != self._origin:
+                    self._deliver(payload['channel'], payload['type'], payload['data'])
+
+        threading.Thread(target=listen, name='event-bus-redis', daemon=True).start()
+        print("✓ Event bus fan-out via Redis enabled")
+
+
+event_bus = EventBus()
+
+
+def leaderboard_channel(bucket_key):
+    """SSE channel for a leaderboard view, e.g. leaderboard:weekly:math (period stripped)"""
+    parts = bucket_key.split(':')
+    subject = parts[-1] if len(parts) > 1 and parts[-1] in LEADERBOARD_SUBJECTS else None
+    return f"leaderboard:{parts[0]}:{subject}" if subject else f"leaderboard:{parts[0]}"
+
+
+def publish_progress_events(user, outcome, changed_views):
+    """Push a user's level/badge events and any leaderboard top-k changes"""
+    channel = f"user:{user['user_id']}"
+    if outcome.get('level_up'):
+        event_bus.publish(channel, 'level_up', {"current_level": user['current_level'],
+                                                "total_points": user['total_points']})
+    for badge in outcome.get('new_badges', []):
+        event_bus.publish(channel, 'badge', badge)
+    for key, entries in changed_views.items():
+        event_bus.publish(leaderboard_channel(key), 'leaderboard', {"view": key, "entries": entries})
+
+
+class LeaderboardFeedProcessor:
+    """Materializes the leaderboard views from the users change feed
+
+    Each batch of changed user documents is folded into every view it
+    touches (the all-time view from total_points, windowed and per-subject
+    views from the period_points counters) with one write per view, so
+    answering a question never writes a view document.
+
+    Every worker runs one. A lease document in the leaderboards container,
+    renewed as the feed is processed and taken over once it expires, elects
+    the worker that reads the feed and records its continuation so a new
+    leader resumes where the last one stopped. Offering entries is
+    idempotent, so re-reading a batch after a crash is harmless.
+
+    With PROGRESS_EVENT_LOG most changes never touch the user documents, so
+    the processor follows the progress events container instead and offers
+    each touched user's current state (snapshot plus pending events).
+    """
+
+    def __init__(self, users_container, views_container, events_container=None):
+        self.users = users_container
+        self.views = views_container
+        self.events = events_container
+        self.source = (events_container or users_container).id  # the lease's continuation is per container
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.lease = None
+        self._followed = {}  # bucket key -> last _etag seen by follow_views
+        self._stop = threading.Event()
+
+    @property
+    def status(self):
+        return "leader" if self.lease and self.lease['expires_at'] > time.time() else "standby"
+
+    def start(self):
+        threading.Thread(target=self._run, name='leaderboard-feed', daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if self.acquire_lease():
+                    # Drain any backlog before sleeping
+                    while self.poll_once() and not self._stop.is_set():
+                        pass
+                elif not event_bus.fans_out:
+                    self.follow_views()
+            except Exception as exc:
+                print(f"⚠ Leaderboard feed: {exc}")
+            self._stop.wait(LEADERBOARD_FEED_POLL_SECONDS)
+
+    def acquire_lease(self):
+        """Take or renew the lease; False if another live worker holds it"""
+        try:
+            lease = cosmos_call('read_feed_lease', self.views.read_item,
+                                item=LEADERBOARD_FEED_LEASE_ID, partition_key=LEADERBOARD_FEED_LEASE_ID)
+        except cosmos_exceptions.CosmosResourceNotFoundError:
+            lease = {"id": LEADERBOARD_FEED_LEASE_ID, "continuation": None}
+        if lease.get('owner') not in (None, self.owner) and lease['expires_at'] > time.time():
+            self.lease = None
+            return False
+        continuation = lease.get('continuation') if lease.get('source', self.users.id) == self.source else None
+        return self._save_lease(lease, continuation)
+
+    def _save_lease(self, lease, continuation):
+        body = {"id": LEADERBOARD_FEED_LEASE_ID, "owner": self.owner, "continuation": continuation,
+                "source": self.source, "expires_at": time.time() + LEADERBOARD_FEED_LEASE_SECONDS}
+        try:
+            if lease.get('_etag'):
+                self.lease = cosmos_call(
+                    'save_feed_lease', self.views.replace_item, item=LEADERBOARD_FEED_LEASE_ID, body=body,
+                    etag=lease['_etag'], match_condition=MatchConditions.IfNotModified
+                )
+            else:
+                self.lease = cosmos_create('save_feed_lease', self.views, body, LEADERBOARD_FEED_LEASE_ID)
+            return True
+        except (cosmos_exceptions.CosmosAccessConditionFailedError,
+                cosmos_exceptions.CosmosResourceExistsError):
+            self.lease = None  # another worker took over
+            return False
+
+    def follow_views(self):
+        """Publish changes to the views this worker's SSE clients watch
+
+        The leader publishes on its own bus only, so without a Redis
+        backplane standby workers poll those view documents instead (one
+        point read per watched view per poll) and publish when the ETag moves.
+        """
+        followed = {}
+        for channel in event_bus.channels('leaderboard:'):
+            _, window, *subject = channel.split(':')
+            key, _ = leaderboard_bucket(window, subject[0] if subject else None)
+            try:
+                view = cosmos_call('read_leaderboard', self.views.read_item, item=key, partition_key=key)
+            except cosmos_exceptions.CosmosResourceNotFoundError:
+                continue
+            followed[key] = view['_etag']
+            if self._followed.get(key) != view['_etag']:
+                event_bus.publish(channel, 'leaderboard', {"view": key, "entries": view['entries']})
+        self._followed = followed
+
+    def poll_once(self):
+        """Apply one batch of changes; True if a full batch was read (more may be waiting)"""
+        continuation = self.lease.get('continuation')
+        response = {}
+        feed_kwargs = {'continuation': continuation} if continuation else {'start_time': 'Beginning'}
+
+        def fetch_batch(timeout):
+            pages = (self.events or self.users).query_items_change_feed(
+                max_item_count=LEADERBOARD_FEED_BATCH_SIZE, timeout=timeout,
+                response_hook=lambda headers, _: response.update(continuation=headers.get('etag')),
+                **feed_kwargs
+            ).by_page()
+            return list(next(pages, []))
+
+        changes = cosmos_call('read_users_feed', fetch_batch)
+        users = changes
+        if self.events is not None:
+            user_ids = dict.fromkeys(event['user_id'] for event in changes)
+            users = [user for user in (load_progress_state(user_id)[0] for user_id in user_ids) if user]
+        changed_views = self.apply(users) if users else {}
+
+        renew = self.lease['expires_at'] - time.time() < LEADERBOARD_FEED_LEASE_SECONDS / 2
+        if (changes or renew) and not self._save_lease(self.lease, response.get('continuation') or continuation):
+            return False
+        for key, entries in changed_views.items():
+            event_bus.publish(leaderboard_channel(key), 'leaderboard', {"view": key, "entries": entries})
+        return len(changes) >= LEADERBOARD_FEED_BATCH_SIZE
+
+    def apply(self, changes):
+        """Offer changed users to each view they count towards; returns {bucket_key: entries} that changed
+
+        A view that keeps changing raises RecordConflictError, leaving the
+        continuation where it is so the batch is retried.
+        """
+        now = datetime.utcnow()
+        offers = {}
+        for user in changes:
+            scores = dict(user.get('period_points') or {})
+            scores['all'] = user.get('total_points', 0)
+            for key, points in scores.items():
+                if points > 0 or key == 'all':
+                    offers.setdefault(key, []).append(leaderboard_entry(user, points, key))
+        changed = {}
+        for key, entries in offers.items():
+            expires_at = bucket_expires_at(key)
+            if expires_at and expires_at <= now:
+                continue
+            view = _offer_cosmos_view(self.views, key, expires_at, entries, now)
+            if view is not None:
+                changed[key] = view
+        return changed
+
+
+class DailyScheduler:
+    """Runs the daily rollover pass off the request path
+
+    Once the clock passes DAILY_ROLLOVER_HOUR on a new UTC day, the pass
+    walks the users in batches of DAILY_ROLLOVER_BATCH_SIZE, pausing between
+    batches, and rolls over only the records needs_rollover() picks, so
+    untouched users cost no write. With Cosmos the candidates come from one
+    query on the indexed last_played path, and a lease document in the
+    leaderboards container (renewed per batch, recording the last completed
+    day) keeps the pass to one worker. A pass cut short is simply rerun:
+    users already rolled over are skipped. With PROGRESS_EVENT_LOG candidates
+    are judged from snapshots, so users whose latest events aren't folded in
+    yet may be left to the lazy path on their next request. When progress
+    events expire (progress_event_ttl), the pass then snapshots users whose
+    pending events are about to (compact_expiring).
+    """
+
+    def __init__(self, users_container=None, lease_container=None, events_container=None):
+        self.users = users_container
+        self.leases = lease_container
+        self.events = events_container
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.lease = None
+        self.last_run = None
+        self._done_date = None
+        self._stop = threading.Event()
+
+    @property
+    def status(self):
+        return self.last_run or ("done " + self._done_date.isoformat() if self._done_date else "pending")
+
+    def start(self):
+        threading.Thread(target=self._run, name='daily-scheduler', daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                now = datetime.utcnow()
+                if now.hour >= DAILY_ROLLOVER_HOUR and self._done_date != now.date():
+                    self.run_pass()
+            except Exception as exc:
+                print(f"⚠ Daily rollover: {exc}")
+            self._stop.wait(DAILY_SCHEDULER_POLL_SECONDS)
+
+    def run_pass(self):
+        """Roll over today's candidates; returns (checked, updated), or None if the pass didn't finish here"""
+        day = current_challenge_day()
+        if self.leases is not None and not self.acquire_lease(day):
+            return None
+        started = time.monotonic()
+        checked = updated = 0
+        for batch in self._candidate_batches(day):
+            for summary in batch:
+                checked += 1
+                if not needs_rollover(summary, day):
+                    continue
+                try:
+                    _, changed = modify_user_record(summary['user_id'], roll_over_user, event_type='rollover')
+                except RecordConflictError:
+                    continue  # the user is playing; their own request rolls them over
+                updated += changed
+            if self.leases is not None and not self._save_lease(day):
+                return None  # lease lost; the new holder reruns the pass
+            if self._stop.wait(DAILY_ROLLOVER_BATCH_PAUSE_SECONDS):
+                return None
+        compacted = 0
+        if self.events is not None and PROGRESS_EVENT_TTL_DAYS > PROGRESS_COMPACT_MARGIN_DAYS:
+            compacted = self.compact_expiring(day)
+            if compacted is None:
+                return None
+        if self.leases is not None:
+            self._save_lease(day, done=True)
+        self._done_date = day['date']
+        self.last_run = {"date": day['today'], "checked": checked, "updated": updated, "compacted": compacted,
+                         "seconds": round(time.monotonic() - started, 1)}
+        print(f"✓ Daily rollover for {day['today']}: {updated} of {checked} users updated")
+        return checked, updated
+
+    def compact_expiring(self, day):
+        """Snapshot users with pending events that expire within PROGRESS_COMPACT_MARGIN_DAYS
+
+        One query on the indexed ts path finds the users with events that
+        old (most of them already folded); each is then compacted only if
+        its state is ahead of its snapshot. Returns the number of snapshots
+        written, or None if the lease was lost.
+        """
+        cutoff = datetime.utcnow() - timedelta(days=PROGRESS_EVENT_TTL_DAYS - PROGRESS_COMPACT_MARGIN_DAYS)
+        rows = iter_cosmos_query(
+            'expiring_progress_events', self.events, page_size=DAILY_ROLLOVER_BATCH_SIZE,
+            query="SELECT c.user_id FROM c WHERE c.ts < @cutoff",
+            parameters=[{"name": "@cutoff", "value": cutoff.isoformat()}]
+        )
+        compacted = 0
+        seen = set()
+        batch = []
+        for row in rows:
+            if row['user_id'] in seen:
+                continue
+            seen.add(row['user_id'])
+            batch.append(row['user_id'])
+            if len(batch) < DAILY_ROLLOVER_BATCH_SIZE:
+                continue
+            compacted += self._compact_users(batch)
+            batch = []
+            if self.leases is not None and not self._save_lease(day):
+                return None
+            if self._stop.wait(DAILY_ROLLOVER_BATCH_PAUSE_SECONDS):
+                return None
+        return compacted + self._compact_users(batch)
+
+    def _compact_users(self, user_ids):
+        compacted = 0
+        for user_id in user_ids:
+            state, snapshot_seq = load_progress_state(user_id)
+            if state and state.get('event_seq', 0) > snapshot_seq:
+                compact_progress(state)
+                compacted += 1
+        return compacted
+
+    def _candidate_batches(self, day):
+        if self.users is not None:
+            rows = iter_cosmos_query(
+                'rollover_candidates', self.users, page_size=DAILY_ROLLOVER_BATCH_SIZE,
+                query="SELECT c.user_id, c.last_played_date, c.streak_days, c.daily_challenges.date FROM c "
+                      "WHERE c.last_played >= @since",
+                parameters=[{"name": "@since", "value": day['active_since']}]
+            )
+        else:
+            rows = ({"user_id": record.get('user_id'), "last_played_date": record.get('last_played_date'),
+                     "streak_days": record.get('streak_days'),
+                     "date": (record.get('daily_challenges') or {}).get('date')}
+                    for record in list(users_data.values()))
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= DAILY_ROLLOVER_BATCH_SIZE:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def acquire_lease(self, day):
+        """Take the lease for today's pass; False if it's done or another live worker holds it"""
+        try:
+            lease = cosmos_call('read_rollover_lease', self.leases.read_item,
+                                item=DAILY_ROLLOVER_LEASE_ID, partition_key=DAILY_ROLLOVER_LEASE_ID)
+        except cosmos_exceptions.CosmosResourceNotFoundError:
+            lease = {"id": DAILY_ROLLOVER_LEASE_ID}
+        if lease.get('done_date') == day['today']:
+            self._done_date = day['date']
+            return False
+        if lease.get('owner') not in (None, self.owner) and lease['expires_at'] > time.time():
+            return False
+        self.lease = lease
+        return self._save_lease(day)
+
+    def _save_lease(self, day, done=False):
+        body = {"id": DAILY_ROLLOVER_LEASE_ID, "owner": self.owner,
+                "expires_at": time.time() + DAILY_ROLLOVER_LEASE_SECONDS,
+                "done_date": day['today'] if done else self.lease.get('done_date')}
+        try:
+            if self.lease.get('_etag'):
+                self.lease = cosmos_call(
+                    'save_rollover_lease', self.leases.replace_item, item=DAILY_ROLLOVER_LEASE_ID, body=body,
+                    etag=self.lease['_etag'], match_condition=MatchConditions.IfNotModified
+                )
+            else:
+                self.lease = cosmos_create('save_rollover_lease', self.leases, body, DAILY_ROLLOVER_LEASE_ID)
+            return True
+        except (cosmos_exceptions.CosmosAccessConditionFailedError,
+                cosmos_exceptions.CosmosResourceExistsError):
+            self.lease = None  # another worker took over
+            return False
+
+
+def load_static_assets():
+    """Index the frontend build and cache its files (with compressed variants) in memory"""
+    static_assets.clear()
+    static_files.clear()
+    if not STATIC_CACHE_ENABLED or not app.static_folder or not os.path.isdir(app.static_folder):
+        return
+
+    for root, _, files in os.walk(app.static_folder):
+        for name in files:
+            full_path = os.path.join(root, name)
+            rel_path = os.path.relpath(full_path, app.static_folder).replace(os.sep, '/')
+            static_files.add(rel_path)
+            if os.path.getsize(full_path) > STATIC_CACHE_MAX_FILE_BYTES:
+                continue
+            with open(full_path, 'rb') as f:
+                body = f.read()
+
+            mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+            asset = {
+                "body": body,
+                "mimetype": mimetype,
+                "etag": hashlib.sha1(body).hexdigest()[:20],
+                "encodings": {}
+            }
+            if HASHED_ASSET_PATTERN.search(name):
+                asset["cache_control"] = "public, max-age=31536000, immutable"
+            elif name == 'index.html':
+                asset["cache_control"] = "no-cache"
+            else:
+                asset["cache_control"] = "public, max-age=3600"
+
+            if len(body) >= STATIC_COMPRESS_MIN_BYTES and mimetype.startswith(STATIC_COMPRESSIBLE_TYPES):
+                for encoding, compressed in (('br', brotli.compress(body, quality=11)),
+                                             ('gzip', gzip.compress(body, compresslevel=9, mtime=0))):
+                    if len(compressed) < len(body):
+                        asset["encodings"][encoding] = compressed
+            static_assets[rel_path] = asset
+
+    cached_bytes = sum(len(a['body']) + sum(map(len, a['encodings'].values())) for a in static_assets.values())
+    print(f"✓ Cached {len(static_assets)} static assets ({cached_bytes // 1024} KB)")
+
+
+def static_asset_response(asset):
+    """Build a response for a cached asset, negotiating encoding and honouring If-None-Match
+
+    Each encoding is a different representation, so it gets its own strong
+    ETag (the identity ETag plus a -br/-gz suffix); a cache can then never
+    revalidate a gzip body against a brotli ETag or vice versa.
+    """
+    encoding = next((e for e in ('br', 'gzip') if e in asset['encodings'] and request.accept_encodings[e]), None)
+    etag = asset['etag'] + STATIC_ETAG_SUFFIXES[encoding] if encoding else asset['etag']
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = Response(asset['encodings'][encoding] if encoding else asset['body'], mimetype=asset['mimetype'])
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = asset['cache_control']
+    if asset['encodings']:
+        response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+
+def serve_index():
+    """Serve index.html for client-side routes, from memory when cached"""
+    asset = static_assets.get('index.html')
+    if asset:
+        return static_asset_response(asset)
+    return send_from_directory(app.static_folder, 'index.html')
+
+
+def serve_static_file(filename):
+    """Replacement for Flask's static view that serves from the in-memory cache"""
+    asset = static_assets.get(filename)
+    if asset:
+        return static_asset_response(asset)
+    if filename.startswith('api/'):
+        abort(404)
+    if filename in static_files or not static_assets:
+        # Too large to cache, or the cache is disabled: fall back to disk
+        return send_from_directory(app.static_folder, filename)
+    # Unknown path: a client-side route
+    return serve_index()
+
+
+app.view_functions['static'] = serve_static_file
+
+
+@app.before_request
+def capture_start_timer():
+    if _capture_file is not None:
+        g.capture_started = time.perf_counter()
+
+
+def redact_password(password):
+    """Replace a password with a marker that keeps its length and identity but not its value"""
+    if not isinstance(password, str) or not password:
+        return password
+    digest = hmac.new(_capture_key, password.encode('utf-8'), hashlib.sha256).hexdigest()[:16]
+    return f"redacted:{len(password)}:{digest}"
+
+
+def redact_passwords(body):
+    """Copy of a JSON request body with its password fields redacted"""
+    if not isinstance(body, dict):
+        return body
+    return {key: redact_password(value) if key in CAPTURE_REDACTED_FIELDS else value for key, value in body.items()}
+
+
+def redact_roster(text, fmt):
+    """A bulk import roster with its password column redacted"""
+    if fmt == 'csv':
+        reader = csv.DictReader(io.StringIO(text))
+        out = io.StringIO()
+        writer = csv.DictWriter(out, fieldnames=reader.fieldnames or [], lineterminator='\n', extrasaction='ignore')
+        if reader.fieldnames:
+            writer.writeheader()
+        for row in reader:
+            writer.writerow({k: redact_password(v) if (k or '').strip().lower() == 'password' else v
+                             for k, v in row.items()})
+        return out.getvalue()
+
+    lines = []
+    for line in io.StringIO(text):
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        lines.append(json.dumps(redact_passwords(row)) + '\n' if isinstance(row, dict) else line)
+    return ''.join(lines)
+
+
+@app.after_request
+def capture_request(response):
+    """Append the request to the traffic capture log (when enabled)"""
+    global _capture_seq
+    if _capture_file is None or not request.path.startswith('/api/') or request.path in CAPTURE_EXCLUDED_PATHS:
+        return response
+
+    auth_header = request.headers.get('Authorization', '')
+    record = {
+        "method": request.method,
+        "path": request.path,
+        "query": TOKEN_QUERY_PATTERN.sub(r'\1REDACTED', request.query_string.decode('utf-8')),
+        "user_id": verify_token(auth_header.split(" ")[1]) if " " in auth_header else None,
+        "content_type": request.mimetype,
+        "body": redact_passwords(request.get_json(silent=True)),
+        "status": response.status_code,
+        "duration_ms": round((time.perf_counter() - g.get('capture_started', time.perf_counter())) * 1000, 3)
+    }
+    if request.path == '/api/admin/users/import':
+        upload = request.files.get('file')
+        if upload:
+            upload.stream.seek(0)
+            text, record["content_type"] = upload.read().decode('utf-8-sig'), upload.mimetype
+        else:
+            text = request.get_data(as_text=True)
+        fmt = request.args.get('format') or ('csv' if 'csv' in (record["content_type"] or '') else 'ndjson')
+        record["raw_body"] = redact_roster(text, fmt)
+    elif record["body"] is None and request.content_length:
+        record["raw_body"] = request.get_data(as_text=True)
+    if request.path in ('/api/register', '/api/login') and not response.is_streamed:
+        # Lets replay map the ids minted during capture onto the ones it mints
+        record["response_user_id"] = (response.get_json(silent=True) or {}).get('user_id')
+    if request.path.startswith('/api/admin/') and record["user_id"]:
+        # Admins are usually made outside the API (SETUP_ADMIN_USERS.md), so replay restores the flag
+        auth_user = get_auth_user_by_id(record["user_id"])
+        record["is_admin"] = bool(auth_user and auth_user.get('is_admin', False))
+
+    with _capture_lock:
+        _capture_seq += 1
+        record = {"type": "request", "session": _capture_session, "seq": _capture_seq,
+                  "ts": datetime.utcnow().isoformat(), **record}
+        _capture_file.write(json.dumps(record) + "\n")
+    return response
+
+
+def _profile_trigger():
+    """Return why this request should be profiled ('header' / 'sample'), or None"""
+    if not request.path.startswith('/api/') or request.path in PROFILE_EXCLUDED_PATHS:
+        return None
+    if request.headers.get(PROFILE_HEADER, '').lower() in ('1', 'true', 'yes'):
+        # Only admins may force a profile; anyone else is served normally.
+        # The token's admin claim screens out everyone else before the
+        # (cross-partition) auth lookup that confirms the admin still is one.
+        auth_header = request.headers.get('Authorization', '')
+        payload = decode_token(auth_header.split(" ")[1]) if " " in auth_header else None
+        if payload and payload.get('admin'):
+            auth_user = get_auth_user_by_id(payload.get('user_id'))
+            if auth_user and auth_user.get('is_admin', False):
+                return 'header'
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:  # not the game rng
+        return 'sample'
+    return None
+
+
+@app.before_request
+def profile_start():
+    trigger = _profile_trigger()
+    # cProfile cannot profile two requests at once, so a busy profiler skips
+    if trigger is None or not _profiler_lock.acquire(blocking=False):
+        return
+    g.profile = {
+        "id": str(uuid.uuid4()),  # not new_id(): profiling must not perturb replayed ids
+        "trigger": trigger,
+        "started_at": datetime.utcnow().isoformat(),
+        "started": time.perf_counter(),
+        "profiler": cProfile.Profile()
+    }
+    _profile_state.timings = {category: {"ms": 0.0, "calls": 0} for category in PROFILE_CATEGORIES}
+    g.profile["profiler"].enable()
+
+
+def _finish_profile(status):
+    """Stop the active profiler, store the profile and return its id"""
+    state = g.pop('profile', None)
+    if state is None:
+        return None
+    try:
+        profiler = state["profiler"]
+        profiler.disable()
+        total_ms = (time.perf_counter() - state["started"]) * 1000
+        timings = _profile_state.timings
+        attributed_ms = sum(timing["ms"] for timing in timings.values())
+
+        stats = pstats.Stats(profiler)
+        top = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:PROFILE_TOP_FUNCTIONS]
+        profiles.append({
+            "id": state["id"],
+            "trigger": state["trigger"],
+            "method": request.method,
+            "path": request.path,
+            "status": status,
+            "started_at": state["started_at"],
+            "total_ms": round(total_ms, 3),
+            "categories": {
+                **{name: {"ms": round(timing["ms"], 3), "calls": timing["calls"]} for name, timing in timings.items()},
+                "other": {"ms": round(max(0.0, total_ms - attributed_ms), 3)}
+            },
+            "top_functions": [
+                {
+                    "function": f"{filename}:{line}({name})",
+                    "calls": calls,
+                    "tottime_ms": round(tottime * 1000, 3),
+                    "cumtime_ms": round(cumtime * 1000, 3)
+                }
+                for (filename, line, name), (_, calls, tottime, cumtime, _) in top
+            ],
+            "pstats": marshal.dumps(stats.stats)
+        })
+        return state["id"]
+    finally:
+        _profile_state.timings = None
+        _profiler_lock.release()
+
+
+@app.after_request
+def profile_finish(response):
+    profile_id = _finish_profile(response.status_code)
+    if profile_id:
+        # Streamed bodies are generated after this point and are not included
+        response.headers['X-Profile-Id'] = profile_id
+    return response
+
+
+@app.teardown_request
+def profile_teardown(exc):
+    # Unhandled exceptions skip after_request; never leave the profiler running
+    _finish_profile(500)
+
+
+def profile_summary(profile):
+    return {key: value for key, value in profile.items() if key not in ("top_functions", "pstats")}
 
 
 # ============ API ROUTES ============
@@ -577,7 +3057,7 @@ def load_questions():
 @app.route('/')
 def serve():
     """Serve the React frontend"""
-    return send_from_directory(app.static_folder, 'index.html')
+    return serve_index()
 
 
 @app.route('/api/health', methods=['GET'])
@@ -586,7 +3066,11 @@ def health_check():
     return jsonify({
         "status": "healthy",
         "timestamp": datetime.utcnow().isoformat(),
-        "cosmosEnabled": cosmos_enabled
+        "cosmosEnabled": cosmos_enabled,
+        "cosmosCircuit": cosmos_breaker.state,
+        "leaderboardFeed": leaderboard_feed.status if leaderboard_feed else "off",
+        "leaderboardDroppedUpdates": leaderboard_dropped_updates,
+        "dailyRollover": daily_scheduler.status if daily_scheduler else "off"
     })
 
 
@@ -598,14 +3082,9 @@ def register():
     password = data.get('password', '')
     
     # Validation
-    if not username or not password:
-        return jsonify({'error': 'Username and password are required'}), 400
-    
-    if len(username) < 3:
-        return jsonify({'error': 'Username must be at least 3 characters'}), 400
-    
-    if len(password) < 4:
-        return jsonify({'error': 'Password must be at least 4 characters'}), 400
+    error = validate_credentials(username, password)
+    if error:
+        return jsonify({'error': error}), 400
     
     # Check if user already exists
     existing = get_auth_user(username)
@@ -613,13 +3092,18 @@ def register():
         return jsonify({'error': 'Username already exists'}), 409
     
     # Create new user
-    user_id = str(uuid.uuid4())
+    user_id = new_id()
     password_hash = hash_password(password)
     
-    # Save auth record and user progress record
-    save_auth_user(username, password_hash, user_id)
+    # Save auth record and user progress record (create fails if a concurrent
+    # registration claimed the username first)
+    try:
+        save_auth_user(username, password_hash, user_id)
+    except cosmos_exceptions.CosmosResourceExistsError:
+        return jsonify({'error': 'Username already exists'}), 409
     user_progress = default_user(user_id, username)
     save_user_record(user_progress)
+    update_leaderboard_views(user_progress, scored=False)
     
     # Generate token
     token = generate_token(user_id)
@@ -647,8 +3131,11 @@ def login():
     if not auth_user or not verify_password(password, auth_user['password_hash']):
         return jsonify({'error': 'Invalid username or password'}), 401
     
+    if password_needs_rehash(auth_user):
+        rehash_password(username, password, auth_user['password_hash'])
+    
     user_id = auth_user['user_id']
-    token = generate_token(user_id)
+    token = generate_token(user_id, is_admin=auth_user.get('is_admin', False))
     
     return jsonify({
         'message': 'Login successful',
@@ -666,16 +3153,16 @@ def get_user_progress(authenticated_user_id, user_id):
     if authenticated_user_id != user_id:
         return jsonify({'error': 'Unauthorized'}), 403
     
-    user = get_user_record(user_id)
-    if not user:
-        user = default_user(user_id)
-        save_user_record(user)
-    
-    # Ensure daily challenges are current
-    get_daily_challenges(user)
-    save_user_record(user)
-    
-    return jsonify(user)
+    with user_lock(user_id):
+        user = get_user_record(user_id)
+        if user and (user.get('daily_challenges') or {}).get('date') == current_challenge_day()['today']:
+            return jsonify(user)  # already rolled over (usually by the daily pass): nothing to write
+        try:
+            # Ensure daily challenges are current
+            user, _ = modify_user_record(user_id, get_daily_challenges, event_type='daily_challenges')
+        except RecordConflictError:
+            return jsonify({'error': 'Progress update conflicted, please retry'}), 409
+        return jsonify(user)
 
 
 @app.route('/api/user/<user_id>/progress', methods=['POST'])
@@ -687,11 +3174,25 @@ def update_user_progress(authenticated_user_id, user_id):
         return jsonify({'error': 'Unauthorized'}), 403
     
     data = request.json
+    points_gained = 0
 
-    user = get_user_record(user_id)
-    if not user:
-        user = default_user(user_id)
-    
+    def apply(user):
+        nonlocal points_gained
+        outcome, points_gained = apply_progress(user, data)
+        return outcome
+
+    with user_lock(user_id):
+        try:
+            user, outcome = modify_user_record(user_id, apply, event_type='answer', event_data=data)
+        except RecordConflictError:
+            return jsonify({'error': 'Progress update conflicted, please retry'}), 409
+        changed_views = update_leaderboard_views(user, data.get('subject'), scored=points_gained > 0)
+        publish_progress_events(user, outcome, changed_views)
+        return jsonify({"user": user, **outcome})
+
+
+def apply_progress(user, data):
+    """Apply one answer/game result to a user record in place; returns (outcome, points gained)"""
     # Initialize new fields if not present
     if 'current_combo' not in user:
         user['current_combo'] = 0
@@ -700,6 +3201,8 @@ def update_user_progress(authenticated_user_id, user_id):
     if 'daily_challenges' not in user:
         user['daily_challenges'] = {}
     
+    points_before = user['total_points']
+    
     # Update streak
     streak_bonus, streak_updated = update_streak(user)
     
@@ -760,7 +3263,7 @@ def update_user_progress(authenticated_user_id, user_id):
             user['total_points'] += challenge_rewards
         
         # Mystery box chance on game completion (70% chance)
-        if random.random() < 0.7:
+        if rng.random() < 0.7:
             mystery_box = generate_mystery_box()
             
             if mystery_box['type'] == 'points':
@@ -805,12 +3308,14 @@ def update_user_progress(authenticated_user_id, user_id):
         user['badges'].extend(achievement_badges)
         new_badges.extend(achievement_badges)
     
+    # Credit windowed/per-subject leaderboard buckets
+    points_gained = user['total_points'] - points_before
+    if points_gained > 0:
+        add_period_points(user, points_gained, subject)
+    
     user['last_played'] = datetime.utcnow().isoformat()
     user['last_played_date'] = datetime.utcnow().date().isoformat()
-    save_user_record(user)
-    
-    return jsonify({
-        "user": user,
+    return {
         "level_up": level_up,
         "new_badges": new_badges,
         "streak_bonus": streak_bonus,
@@ -821,7 +3326,7 @@ def update_user_progress(authenticated_user_id, user_id):
         "mystery_box": mystery_box,
         "challenge_rewards": challenge_rewards,
         "completed_challenges": completed_challenges
-    })
+    }, points_gained
 
 
 @app.route('/api/questions/<subject>', methods=['GET'])
@@ -830,29 +3335,121 @@ def get_questions(subject):
     level = int(request.args.get('level', 1))
     count = int(request.args.get('count', 5))
     
-    if questions_data is None:
+    if question_bank.data is None:
         load_questions()
     
-    subject_questions = questions_data.get(subject.lower(), [])
+    by_level = question_bank.by_level.get(subject.lower(), {})
     
     # Filter by level/difficulty
-    filtered_questions = [q for q in subject_questions if q.get('level', 1) == level]
+    filtered_questions = by_level.get(level, [])
     
     # If not enough questions at this level, include nearby levels
     if len(filtered_questions) < count:
-        filtered_questions = [q for q in subject_questions 
-                             if abs(q.get('level', 1) - level) <= 1]
+        filtered_questions = [q for nearby in (level - 1, level, level + 1) for q in by_level.get(nearby, [])]
     
     # Randomly select questions
-    selected = random.sample(filtered_questions, min(count, len(filtered_questions)))
+    selected = rng.sample(filtered_questions, min(count, len(filtered_questions)))
     
     return jsonify(selected)
 
 
 @app.route('/api/leaderboard', methods=['GET'])
 def get_leaderboard():
-    """Get top users by points"""
-    return jsonify(get_top_users(10))
+    """Get top users by points
+
+    Every response is read from a precomputed view (a single point read
+    with Cosmos). Without ``window`` or ``subject`` it keeps its original
+    shape: the top users' progress records (LEADERBOARD_RECORD_FIELDS) from
+    the all-time view. With ``window`` (all|weekly|daily) and/or ``subject``
+    (math|reading) it returns the compact entries of that view.
+    """
+    window = request.args.get('window')
+    subject = request.args.get('subject')
+    try:
+        limit = min(max(int(request.args.get('limit', 10)), 1), LEADERBOARD_TOP_K)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    if window is None and subject is None:
+        return jsonify([{field: entry.get(field) for field in LEADERBOARD_RECORD_FIELDS}
+                        for entry in get_leaderboard_view('all', None, limit)])
+    window = window or 'all'
+
+    if window not in LEADERBOARD_WINDOWS:
+        return jsonify({'error': f"window must be one of: {', '.join(LEADERBOARD_WINDOWS)}"}), 400
+    if subject and subject not in LEADERBOARD_SUBJECTS:
+        return jsonify({'error': f"subject must be one of: {', '.join(LEADERBOARD_SUBJECTS)}"}), 400
+
+    return jsonify(get_leaderboard_view(window, subject, limit))
+
+
+@app.route('/api/events/token', methods=['POST'])
+@token_required
+def create_events_token(user_id):
+    """Short-lived token that only opens /api/events, safe to put in its URL"""
+    token = generate_token(user_id, scope='events', expires_in=timedelta(seconds=SSE_TOKEN_SECONDS))
+    return jsonify({'token': token, 'expires_in': SSE_TOKEN_SECONDS})
+
+
+@app.route('/api/events', methods=['GET'])
+def stream_events():
+    """Server-sent event stream of leaderboard changes and the user's own events
+
+    EventSource cannot set headers, so browsers pass an events-scoped token
+    from POST /api/events/token as ``?token=``; other clients can send their
+    JWT in the Authorization header. ``leaderboards`` selects views as
+    window[:subject] (default ``all``).
+    """
+    auth_header = request.headers.get('Authorization', '')
+    if request.args.get('token'):
+        user_id = verify_token(request.args['token'], scope='events')
+    else:
+        user_id = verify_token(auth_header.split(" ")[1]) if " " in auth_header else None
+    if not user_id:
+        return jsonify({'error': 'Invalid or expired token'}), 401
+
+    views = []
+    for spec in request.args.get('leaderboards', 'all').split(','):
+        window, _, subject = spec.strip().partition(':')
+        if window not in LEADERBOARD_WINDOWS or (subject and subject not in LEADERBOARD_SUBJECTS):
+            return jsonify({'error': f'Invalid leaderboard view: {spec}'}), 400
+        views.append((window, subject or None))
+
+    channels = [f"user:{user_id}"] + [f"leaderboard:{w}:{s}" if s else f"leaderboard:{w}" for w, s in views]
+    subscriber = event_bus.subscribe(channels, limit=SSE_MAX_CLIENTS)
+    if subscriber is None:
+        response = jsonify({'error': 'Too many event stream clients'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(SSE_HEARTBEAT_SECONDS)
+        return response
+    try:
+        initial = [(w, s, get_leaderboard_view(w, s, LEADERBOARD_TOP_K)) for w, s in views]
+    except BaseException:
+        # The generator that unsubscribes never runs, so release the slot here
+        event_bus.unsubscribe(subscriber)
+        raise
+
+    def format_event(event_type, data):
+        return f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+    def generate():
+        try:
+            yield f"retry: {SSE_HEARTBEAT_SECONDS * 1000}\n\n"
+            for window, subject, entries in initial:
+                yield format_event('leaderboard', {"view": leaderboard_bucket(window, subject)[0], "entries": entries})
+            while True:
+                try:
+                    event = subscriber.get(timeout=SSE_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_event(event['type'], event['data'])
+        finally:
+            event_bus.unsubscribe(subscriber)
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 
 # ============ ADMIN ROUTES ============
@@ -865,25 +3462,50 @@ def admin_list_users(admin_user_id):
     
     if cosmos_enabled and cosmos_container:
         try:
-            query = "SELECT TOP @limit c.user_id, c.username, c.current_level, c.total_points, c.created_at FROM c ORDER BY c.created_at DESC"
-            items = list(cosmos_container.query_items(
+            query = ("SELECT TOP @limit c.user_id, c.username, c.current_level, c.total_points, c.created_at, "
+                     "c.event_seq FROM c ORDER BY c.created_at DESC")
+            items = fold_pending_events(cosmos_query(
+                'admin_list_users', cosmos_container,
                 query=query,
-                parameters=[{"name": "@limit", "value": limit}],
-                enable_cross_partition_query=True
+                parameters=[{"name": "@limit", "value": limit}]
             ))
-            return jsonify(items)
-        except Exception as e:
+            return jsonify([{k: item.get(k) for k in ADMIN_LIST_FIELDS} for item in items])
+        except cosmos_exceptions.CosmosHttpResponseError as e:
             return jsonify({'error': str(e)}), 500
     
     # Fallback to in-memory storage
     users_list = sorted(
-        [{'user_id': u['user_id'], 'username': u['username'], 'current_level': u['current_level'], 
-          'total_points': u['total_points'], 'created_at': u['created_at']} 
-         for u in users_data.values()],
+        [{'user_id': u.get('user_id'), 'username': u.get('username'), 'current_level': u.get('current_level'),
+          'total_points': u.get('total_points'), 'created_at': u.get('created_at'), 'event_seq': u.get('event_seq')}
+         for u in list(users_data.values())],
         key=lambda x: x['created_at'],
         reverse=True
     )
-    return jsonify(users_list[:limit])
+    return jsonify([{k: user.get(k) for k in ADMIN_LIST_FIELDS} for user in fold_pending_events(users_list[:limit])])
+
+
+@app.route('/api/admin/users/search', methods=['GET'])
+@admin_required
+def admin_search_users(admin_user_id):
+    """Search users by username (admin only)
+
+    Query params: q, mode (prefix, the default, or contains), limit (max 200)
+    and after (the next_after value of the previous page). Results are
+    ordered by username.
+    """
+    query = request.args.get('q', '').strip().lower()
+    mode = request.args.get('mode', 'prefix')
+    if mode not in ('prefix', 'contains'):
+        return jsonify({'error': 'mode must be prefix or contains'}), 400
+    if mode == 'contains' and not query:
+        return jsonify({'error': 'q is required for contains searches'}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), USER_SEARCH_MAX_LIMIT)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+
+    users, more = search_usernames(query, mode, request.args.get('after') or None, limit)
+    return jsonify({'users': users, 'next_after': users[-1]['username'] if more else None})
 
 
 @app.route('/api/admin/user/<username>', methods=['GET'])
@@ -925,22 +3547,22 @@ def admin_reset_password(admin_user_id):
     if admin_user and admin_user.get('username') == target_username:
         return jsonify({'error': 'Use the change password endpoint for your own password'}), 400
     
-    # Get target user
-    auth_user = get_auth_user(target_username)
-    if not auth_user:
-        return jsonify({'error': 'User not found'}), 404
-    
-    # Update password
     new_password_hash = hash_password(new_password)
-    auth_user['password_hash'] = new_password_hash
-    auth_user['last_password_reset'] = datetime.utcnow().isoformat()
-    auth_user['reset_by_admin'] = admin_user_id
     
-    # Save updated auth record
-    if cosmos_enabled and cosmos_users_container:
-        cosmos_users_container.upsert_item(auth_user)
-    else:
-        auth_users_data[target_username] = auth_user
+    with user_lock(target_username):
+        # Get target user
+        auth_user = get_auth_user(target_username)
+        if not auth_user:
+            return jsonify({'error': 'User not found'}), 404
+        
+        # Update password
+        auth_user['password_hash'] = new_password_hash
+        auth_user['bcrypt_cost'] = bcrypt_hash_cost(new_password_hash)
+        auth_user['last_password_reset'] = datetime.utcnow().isoformat()
+        auth_user['reset_by_admin'] = admin_user_id
+        
+        # Save updated auth record
+        update_auth_user(auth_user)
     
     # Log the action
     log_admin_action(admin_user_id, 'password_reset', target_username, 
@@ -963,22 +3585,20 @@ def admin_grant_privileges(admin_user_id):
     if not target_username:
         return jsonify({'error': 'Username is required'}), 400
     
-    auth_user = get_auth_user(target_username)
-    if not auth_user:
-        return jsonify({'error': 'User not found'}), 404
-    
-    if auth_user.get('is_admin', False):
-        return jsonify({'message': 'User is already an admin'}), 200
-    
-    # Grant admin privileges
-    auth_user['is_admin'] = True
-    auth_user['made_admin_at'] = datetime.utcnow().isoformat()
-    auth_user['made_admin_by'] = admin_user_id
-    
-    if cosmos_enabled and cosmos_users_container:
-        cosmos_users_container.upsert_item(auth_user)
-    else:
-        auth_users_data[target_username] = auth_user
+    with user_lock(target_username):
+        auth_user = get_auth_user(target_username)
+        if not auth_user:
+            return jsonify({'error': 'User not found'}), 404
+        
+        if auth_user.get('is_admin', False):
+            return jsonify({'message': 'User is already an admin'}), 200
+        
+        # Grant admin privileges
+        auth_user['is_admin'] = True
+        auth_user['made_admin_at'] = datetime.utcnow().isoformat()
+        auth_user['made_admin_by'] = admin_user_id
+        
+        update_auth_user(auth_user)
     
     # Log the action
     admin_user = get_auth_user_by_id(admin_user_id)
@@ -992,6 +3612,97 @@ def admin_grant_privileges(admin_user_id):
     }), 200
 
 
+@app.route('/api/admin/users/import', methods=['POST'])
+@admin_required
+def admin_import_users(admin_user_id):
+    """Bulk import a CSV or NDJSON roster of students (admin only)
+
+    Each row needs ``username`` and ``password``. Results are streamed back as
+    NDJSON, one line per row, followed by a summary line. Passwords are hashed
+    at bulk_import_bcrypt_cost() and raised to the full cost on first login.
+    """
+    upload = request.files.get('file')
+    if upload:
+        text = upload.read().decode('utf-8-sig')
+        content_type = upload.mimetype or ''
+    else:
+        text = request.get_data(as_text=True)
+        content_type = request.mimetype or ''
+
+    fmt = request.args.get('format') or ('csv' if 'csv' in content_type else 'ndjson')
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'error': 'Format must be csv or ndjson'}), 400
+    if not text.strip():
+        return jsonify({'error': 'Roster is empty'}), 400
+
+    import_cost = bulk_import_bcrypt_cost()
+
+    def process_batch(executor, batch, counts):
+        """Write a batch and return its result lines, counted as soon as they are written"""
+        passwords = [password for _, _, password in batch]
+        hashes = list(executor.map(hash_password, passwords, [import_cost] * len(passwords)))
+        written = create_users_batch([(username, h) for (_, username, _), h in zip(batch, hashes)])
+        results = []
+        for (line_no, username, _), (user_id, message) in zip(batch, written):
+            if user_id is None:
+                result = {'row': line_no, 'username': username, 'status': 'error', 'error': message}
+            else:
+                result = {'row': line_no, 'username': username, 'status': 'created', 'user_id': user_id}
+                if message:
+                    result['warning'] = message
+            counts[result['status']] += 1
+            results.append(result)
+        return results
+
+    def generate():
+        started = time.perf_counter()
+        counts = {'created': 0, 'error': 0}
+        seen = set()
+        batch = []
+        completed = False
+        try:
+            with ThreadPoolExecutor(max_workers=BULK_IMPORT_WORKERS) as executor:
+                for line_no, row in iter_roster_rows(text, fmt):
+                    if row is None:
+                        result = {'row': line_no, 'status': 'error', 'error': 'Malformed row'}
+                    else:
+                        username = str(row.get('username') or '').strip().lower()
+                        password = str(row.get('password') or '')
+                        error = validate_credentials(username, password)
+                        if not error and username in seen:
+                            error = 'Duplicate username in roster'
+                        if not error:
+                            seen.add(username)
+                            batch.append((line_no, username, password))
+                            if len(batch) >= BULK_IMPORT_BATCH_SIZE:
+                                for result in process_batch(executor, batch, counts):
+                                    yield json.dumps(result) + '\n'
+                                batch = []
+                            continue
+                        result = {'row': line_no, 'username': username, 'status': 'error', 'error': error}
+                    counts['error'] += 1
+                    yield json.dumps(result) + '\n'
+
+                if batch:
+                    for result in process_batch(executor, batch, counts):
+                        yield json.dumps(result) + '\n'
+            completed = True
+        finally:
+            # Audit what was written even if the client disconnects mid-stream
+            summary = {
+                'created': counts['created'],
+                'failed': counts['error'],
+                'total': counts['created'] + counts['error'],
+                'completed': completed,
+                'bcrypt_cost': import_cost,
+                'elapsed_ms': int((time.perf_counter() - started) * 1000)
+            }
+            log_admin_action(admin_user_id, 'bulk_import', None, summary)
+        yield json.dumps({'summary': summary}) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
 @app.route('/api/admin/audit-logs', methods=['GET'])
 @admin_required
 def admin_get_audit_logs(admin_user_id):
@@ -1001,13 +3712,13 @@ def admin_get_audit_logs(admin_user_id):
     if cosmos_enabled and cosmos_audit_container:
         try:
             query = "SELECT TOP @limit * FROM c ORDER BY c.timestamp DESC"
-            items = list(cosmos_audit_container.query_items(
+            items = cosmos_query(
+                'admin_get_audit_logs', cosmos_audit_container,
                 query=query,
-                parameters=[{"name": "@limit", "value": limit}],
-                enable_cross_partition_query=True
-            ))
+                parameters=[{"name": "@limit", "value": limit}]
+            )
             return jsonify(items)
-        except Exception as e:
+        except cosmos_exceptions.CosmosHttpResponseError as e:
             return jsonify({'error': str(e)}), 500
     
     # Fallback to in-memory storage
@@ -1015,6 +3726,143 @@ def admin_get_audit_logs(admin_user_id):
     return jsonify(sorted_logs[:limit])
 
 
+@app.route('/api/admin/export/<dataset>', methods=['GET'])
+@admin_required
+def admin_export(admin_user_id, dataset):
+    """Stream an export of users, progress or audit logs as NDJSON or CSV (admin only)
+
+    Query params: ``format`` (ndjson|csv), ``fields`` (comma-separated
+    projection) and ``since`` (ISO timestamp lower bound).
+    """
+    if dataset not in EXPORT_DATASETS:
+        return jsonify({'error': f"Dataset must be one of: {', '.join(EXPORT_DATASETS)}"}), 400
+
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in ('ndjson', 'csv'):
+        return jsonify({'error': 'Format must be ndjson or csv'}), 400
+
+    fields = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()]
+    for field in fields:
+        if not FIELD_NAME_PATTERN.match(field) or field in EXPORT_EXCLUDED_FIELDS:
+            return jsonify({'error': f'Invalid field: {field}'}), 400
+    if fmt == 'csv' and not fields:
+        fields = EXPORT_DATASETS[dataset]['csv_fields']
+
+    since = request.args.get('since')
+    if since:
+        try:
+            since = datetime.fromisoformat(since).isoformat()
+        except ValueError:
+            return jsonify({'error': 'since must be an ISO timestamp'}), 400
+
+    log_admin_action(admin_user_id, 'export', None, {'dataset': dataset, 'format': fmt, 'since': since})
+
+    records = iter_export_records(dataset, fields or None, since)
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    response = Response(stream_with_context(iter_export_chunks(records, fmt, fields)), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={dataset}.{fmt}'
+    return response
+
+
+@app.route('/api/admin/questions', methods=['GET'])
+@admin_required
+def admin_search_questions(admin_user_id):
+    """Search the question bank (admin only)
+
+    Query params: q (keywords, all must match), subject, level, category,
+    limit (max 200) and offset. Results are ordered by question id.
+    """
+    try:
+        level = int(request.args['level']) if request.args.get('level') else None
+        limit = min(max(int(request.args.get('limit', 50)), 1), QUESTION_SEARCH_MAX_LIMIT)
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except ValueError:
+        return jsonify({'error': 'level, limit and offset must be integers'}), 400
+
+    total, page = search_questions(request.args.get('q', ''), request.args.get('subject', '').lower() or None,
+                                   level, request.args.get('category'), limit, offset)
+    return jsonify({'total': total, 'offset': offset, 'questions': page})
+
+
+@app.route('/api/admin/questions/<question_id>', methods=['GET'])
+@admin_required
+def admin_get_question(admin_user_id, question_id):
+    """Get a single question (admin only)"""
+    entry = question_bank.by_id.get(question_id)
+    if not entry:
+        return jsonify({'error': 'Question not found'}), 404
+    return jsonify({"subject": entry[0], **entry[1]})
+
+
+@app.route('/api/admin/questions', methods=['POST'])
+@admin_required
+def admin_create_question(admin_user_id):
+    """Add a question to the bank (admin only)"""
+    subject, question, error = validate_question(request.get_json(silent=True) or {})
+    if error:
+        return jsonify({'error': error}), 400
+    if not write_question(subject, question):
+        return jsonify({'error': 'A question with this id already exists'}), 409
+
+    log_admin_action(admin_user_id, 'question_created', question['id'], {'subject': subject})
+    return jsonify({"subject": subject, **question}), 201
+
+
+@app.route('/api/admin/questions/<question_id>', methods=['PUT'])
+@admin_required
+def admin_update_question(admin_user_id, question_id):
+    """Update a question; fields not sent keep their current values (admin only)"""
+    entry = question_bank.by_id.get(question_id)
+    if not entry:
+        return jsonify({'error': 'Question not found'}), 404
+
+    data = {**(request.get_json(silent=True) or {}), "id": question_id}
+    subject, question, error = validate_question(data, existing={"subject": entry[0], **entry[1]})
+    if error:
+        return jsonify({'error': error}), 400
+
+    if not write_question(subject, question, replaces=question_id):
+        return jsonify({'error': 'Question not found'}), 404
+    log_admin_action(admin_user_id, 'question_updated', question_id, {'subject': subject})
+    return jsonify({"subject": subject, **question})
+
+
+@app.route('/api/admin/questions/<question_id>', methods=['DELETE'])
+@admin_required
+def admin_delete_question(admin_user_id, question_id):
+    """Remove a question from the bank (admin only)"""
+    entry = question_bank.by_id.get(question_id)
+    if not entry:
+        return jsonify({'error': 'Question not found'}), 404
+
+    if not write_question(entry[0], None, replaces=question_id):
+        return jsonify({'error': 'Question not found'}), 404
+    log_admin_action(admin_user_id, 'question_deleted', question_id, {'subject': entry[0]})
+    return jsonify({'message': f'Question {question_id} deleted'})
+
+
+@app.route('/api/admin/profiles', methods=['GET'])
+@admin_required
+def admin_list_profiles(admin_user_id):
+    """List recent request profiles, newest first (admin only)"""
+    return jsonify([profile_summary(profile) for profile in reversed(profiles)])
+
+
+@app.route('/api/admin/profiles/<profile_id>', methods=['GET'])
+@admin_required
+def admin_get_profile(admin_user_id, profile_id):
+    """Get one profile as JSON, or ?format=pstats for `python -m pstats` / snakeviz (admin only)"""
+    profile = next((p for p in list(profiles) if p["id"] == profile_id), None)
+    if profile is None:
+        return jsonify({'error': 'Profile not found'}), 404
+
+    if request.args.get('format') == 'pstats':
+        return Response(profile["pstats"], mimetype='application/octet-stream', headers={
+            'Content-Disposition': f'attachment; filename=profile-{profile_id}.pstats'
+        })
+    return jsonify({**profile_summary(profile), "top_functions": profile["top_functions"]})
+
+
 @app.route('/api/admin/check', methods=['GET'])
 @token_required
 def check_admin_status(user_id):
@@ -1034,14 +3882,20 @@ def check_admin_status(user_id):
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def catch_all(path):
-    # Serve static files if they exist
-    if path and '.' in path:
-        file_path = os.path.join(app.static_folder, path)
-        if os.path.exists(file_path):
-            return send_from_directory(app.static_folder, path)
-    
-    # For all other paths (including /admin), serve index.html for client-side routing
-    return send_from_directory(app.static_folder, 'index.html')
+    # Serve static files (from the in-memory cache when possible); all other
+    # paths (including /admin) get index.html for client-side routing
+    if path:
+        return serve_static_file(path)
+    return serve_index()
+
+
+@app.errorhandler(CosmosUnavailableError)
+def cosmos_unavailable(e):
+    """Shed load with a 503 while Cosmos DB is throttling or failing"""
+    response = jsonify(error='Service is busy, please retry shortly')
+    response.status_code = 503
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
 
 
 # Handle 404 errors by serving React app (fallback for client-side routing)
@@ -1051,12 +3905,31 @@ def not_found(e):
     if request.path.startswith('/api/'):
         return jsonify(error='Not found'), 404
     # Otherwise, serve the React app
-    return send_from_directory(app.static_folder, 'index.html')
+    return serve_index()
 
 
 # Initialize app
+if CAPTURE_TRAFFIC_PATH:
+    start_capture(CAPTURE_TRAFFIC_PATH)
+elif RNG_SEED:
+    seed_rng(int(RNG_SEED))
+init_bcrypt()
 load_questions()
+load_static_assets()
 init_cosmos()
+if PROGRESS_EVENT_LOG and PROGRESS_EVENT_DIR and not cosmos_enabled:
+    progress_segments = ProgressEventSegments(PROGRESS_EVENT_DIR)
+if cosmos_enabled and LEADERBOARD_CHANGE_FEED:
+    leaderboard_feed = LeaderboardFeedProcessor(cosmos_container, cosmos_leaderboard_container,
+                                                cosmos_events_container if PROGRESS_EVENT_LOG else None)
+    leaderboard_feed.start()
+if DAILY_SCHEDULER:
+    daily_scheduler = DailyScheduler(cosmos_container if cosmos_enabled else None,
+                                     cosmos_leaderboard_container if cosmos_enabled else None,
+                                     cosmos_events_container if cosmos_enabled else None)
+    daily_scheduler.start()
+if EVENT_BUS_REDIS_URL:
+    event_bus.connect_redis(EVENT_BUS_REDIS_URL)
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 8000))
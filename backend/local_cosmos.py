@@ -0,0 +1,471 @@
+"""
+Local stand-in for Azure Cosmos DB
+Implements the subset of the azure-cosmos container API used by app.py on top of
+in-process dictionaries, with optional fault injection (429 throttling, 503s,
+added latency) so the retry/backoff/circuit-breaker layer can be exercised offline.
+
+Enable with COSMOS_ENDPOINT=local. Fault injection is configured with
+COSMOS_FAULT_RATE (0-1), COSMOS_FAULT_STATUS (e.g. "429,503"),
+COSMOS_FAULT_RETRY_AFTER_MS, COSMOS_FAULT_LATENCY_MS and COSMOS_FAULT_SEED.
+
+Operations honour the SDK's ``timeout`` keyword (seconds): injected latency
+beyond it raises CosmosClientTimeoutError once the timeout has elapsed.
+
+Every write is stamped with a per-container sequence number (_lsn) so the
+change feed can be replayed in latest-version mode, like the real service.
+"""
+import copy
+import os
+import random
+import re
+import threading
+import time
+import uuid
+
+from azure.core import MatchConditions
+from azure.cosmos import exceptions as cosmos_exceptions
+
+DEFAULT_PAGE_SIZE = 100
+
+_QUERY_RE = re.compile(
+    r'^\s*SELECT\s+(?:TOP\s+(?P<top>@\w+|\d+)\s+)?(?P<projection>.+?)\s+FROM\s+c'
+    r'(?:\s+WHERE\s+(?P<where>.+?))?(?:\s+ORDER\s+BY\s+(?P<order>.+?))?\s*$',
+    re.IGNORECASE | re.DOTALL
+)
+_FUNCTION_RE = re.compile(
+    r'^(?P<negate>NOT\s+)?(?P<func>STARTSWITH|CONTAINS)\(\s*c\.(?P<path>[\w.]+)\s*,\s*(?P<value>@\w+|\'[^\']*\')'
+    r'(?:\s*,\s*(?P<ignore_case>true|false))?\s*\)$',
+    re.IGNORECASE
+)
+_COMPARISON_RE = re.compile(
+    r'^c\.(?P<path>[\w.]+)\s*(?P<op>=|!=|<>|>=|<=|>|<)\s*(?P<value>@\w+|\'[^\']*\'|-?\d+(?:\.\d+)?|true|false|null)$',
+    re.IGNORECASE
+)
+_COMPARISONS = {
+    '=': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+    '<>': lambda a, b: a != b,
+    '>=': lambda a, b: a is not None and a >= b,
+    '<=': lambda a, b: a is not None and a <= b,
+    '>': lambda a, b: a is not None and a > b,
+    '<': lambda a, b: a is not None and a < b,
+}
+_MISSING = object()
+
+
+def _get_path(item, path):
+    """Resolve a dotted property path, returning _MISSING if any segment is absent"""
+    value = item
+    for segment in path.split('.'):
+        if not isinstance(value, dict) or segment not in value:
+            return _MISSING
+        value = value[segment]
+    return value
+
+
+def _literal(token, parameters):
+    """Resolve a query literal or @parameter"""
+    if token.startswith('@'):
+        if token not in parameters:
+            raise ValueError(f'Missing query parameter {token}')
+        return parameters[token]
+    if token.startswith("'"):
+        return token[1:-1]
+    lowered = token.lower()
+    if lowered in ('true', 'false'):
+        return lowered == 'true'
+    if lowered == 'null':
+        return None
+    return float(token) if '.' in token else int(token)
+
+
+def _compile_where(where, parameters):
+    """Compile a WHERE clause into a predicate: AND-joined comparisons, or
+    parenthesized AND groups joined by OR"""
+    groups = re.split(r'\)\s+OR\s+\(', where.strip(), flags=re.IGNORECASE)
+    if len(groups) > 1:
+        groups[0], groups[-1] = groups[0].strip(), groups[-1].strip()
+        if not (groups[0].startswith('(') and groups[-1].endswith(')')):
+            raise ValueError(f'Unsupported WHERE clause for local Cosmos: {where}')
+        groups[0], groups[-1] = groups[0][1:], groups[-1][:-1]
+        alternatives = [_compile_where(group, parameters) for group in groups]
+        return lambda item: any(p(item) for p in alternatives)
+    if where.strip().startswith('(') and where.strip().endswith(')'):
+        return _compile_where(where.strip()[1:-1], parameters)  # a single parenthesized group
+    predicates = []
+    for clause in re.split(r'\s+AND\s+', where.strip(), flags=re.IGNORECASE):
+        clause = clause.strip()
+        match = _FUNCTION_RE.match(clause)
+        if match:
+            path = match.group('path')
+            needle = str(_literal(match.group('value'), parameters))
+            ignore_case = (match.group('ignore_case') or '').lower() == 'true'
+            func = match.group('func').upper()
+            negate = bool(match.group('negate'))
+
+            def predicate(item, path=path, needle=needle, ignore_case=ignore_case, func=func, negate=negate):
+                value = _get_path(item, path)
+                if not isinstance(value, str):
+                    return False
+                haystack, target = (value.lower(), needle.lower()) if ignore_case else (value, needle)
+                result = haystack.startswith(target) if func == 'STARTSWITH' else target in haystack
+                return result != negate
+
+            predicates.append(predicate)
+            continue
+
+        match = _COMPARISON_RE.match(clause)
+        if not match:
+            raise ValueError(f'Unsupported WHERE clause for local Cosmos: {clause}')
+        path = match.group('path')
+        compare = _COMPARISONS[match.group('op')]
+        expected = _literal(match.group('value'), parameters)
+
+        def predicate(item, path=path, compare=compare, expected=expected):
+            value = _get_path(item, path)
+            if value is _MISSING:
+                return False
+            try:
+                return compare(value, expected)
+            except TypeError:
+                return False
+
+        predicates.append(predicate)
+    return lambda item: all(p(item) for p in predicates)
+
+
+def _order_key(path):
+    def key(item):
+        value = _get_path(item, path)
+        if value is _MISSING or value is None:
+            return (0, '')
+        return (1, value)
+    return key
+
+
+class LocalPageIterator:
+    """Mimics azure.core.paging.PageIterator with string offset continuation tokens"""
+
+    def __init__(self, items, page_size, continuation_token=None):
+        self._items = items
+        self._page_size = page_size
+        self._offset = int(continuation_token or 0)
+        self._started = False
+        self.continuation_token = continuation_token
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._started and self.continuation_token is None:
+            raise StopIteration
+        self._started = True
+        page = self._items[self._offset:self._offset + self._page_size]
+        self._offset += len(page)
+        self.continuation_token = str(self._offset) if self._offset < len(self._items) else None
+        return iter(page)
+
+
+class LocalItemPaged:
+    """Mimics azure.core.paging.ItemPaged over a precomputed result list"""
+
+    def __init__(self, items, page_size=None):
+        self._items = items
+        self._page_size = page_size or DEFAULT_PAGE_SIZE
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def by_page(self, continuation_token=None):
+        return LocalPageIterator(self._items, self._page_size, continuation_token)
+
+
+class LocalChangeFeedPaged(LocalItemPaged):
+    """Change feed pager; reports the continuation (last _lsn) through
+    ``response_hook`` in the response's etag header, as the SDK does"""
+
+    def __init__(self, items, page_size=None, start_lsn=0, response_hook=None):
+        super().__init__(items, page_size)
+        self._start_lsn = start_lsn
+        self._response_hook = response_hook
+
+    def __iter__(self):
+        for page in self.by_page():
+            yield from page
+
+    def by_page(self, continuation_token=None):
+        offset = 0
+        while True:
+            page = self._items[offset:offset + self._page_size]
+            offset += len(page)
+            lsn = page[-1]['_lsn'] if page else (self._items[-1]['_lsn'] if self._items else self._start_lsn)
+            if self._response_hook:
+                self._response_hook({'etag': str(lsn)}, page)
+            if not page:
+                return
+            yield iter(page)
+
+
+class FaultInjector:
+    """Randomly fails or delays operations to simulate a throttled or degraded account"""
+
+    def __init__(self, rate=0.0, status_codes=(429,), retry_after_ms=100, latency_ms=0, seed=None):
+        self.rate = rate
+        self.status_codes = tuple(status_codes)
+        self.retry_after_ms = retry_after_ms
+        self.latency_ms = latency_ms
+        self.outage = False
+        self.injected = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        statuses = [int(s) for s in os.getenv("COSMOS_FAULT_STATUS", "429").split(',') if s.strip()]
+        seed = os.getenv("COSMOS_FAULT_SEED")
+        return cls(
+            rate=float(os.getenv("COSMOS_FAULT_RATE", 0)),
+            status_codes=statuses or (429,),
+            retry_after_ms=int(os.getenv("COSMOS_FAULT_RETRY_AFTER_MS", 100)),
+            latency_ms=int(os.getenv("COSMOS_FAULT_LATENCY_MS", 0)),
+            seed=int(seed) if seed else None
+        )
+
+    def before(self, operation, timeout=None):
+        """Called before every container operation; may sleep and/or raise"""
+        if self.latency_ms:
+            latency = self.latency_ms / 1000.0
+            if timeout is not None and latency > timeout:
+                time.sleep(max(0.0, timeout))
+                raise cosmos_exceptions.CosmosClientTimeoutError()
+            time.sleep(latency)
+        with self._lock:
+            if self.outage:
+                status = 503
+            elif self.rate and self._random.random() < self.rate:
+                status = self._random.choice(self.status_codes)
+            else:
+                return
+            self.injected += 1
+        exc = cosmos_exceptions.CosmosHttpResponseError(
+            status_code=status, message=f'Injected fault on {operation}'
+        )
+        if status == 429:
+            exc.headers = {'x-ms-retry-after-ms': str(self.retry_after_ms)}
+        raise exc
+
+
+class LocalContainer:
+    """In-memory container supporting point operations, simple SQL queries and TTL"""
+
+    def __init__(self, container_id, partition_key_path, faults=None, default_ttl=None, indexing_policy=None):
+        self.id = container_id
+        self.partition_key_path = partition_key_path
+        self.default_ttl = default_ttl
+        self.indexing_policy = indexing_policy
+        self.faults = faults
+        self._items = {}
+        self._lsn = 0
+        self._lock = threading.RLock()
+
+    # ---- helpers ----
+
+    def _partition_value(self, body):
+        value = _get_path(body, self.partition_key_path.lstrip('/').replace('/', '.'))
+        return None if value is _MISSING else value
+
+    def _check(self, operation, kwargs):
+        if self.faults:
+            self.faults.before(f'{self.id}.{operation}', kwargs.get('timeout'))
+
+    def _expired(self, item, now=None):
+        ttl = item.get('ttl', self.default_ttl)
+        if ttl is None or ttl == -1:
+            return False
+        return (now or time.time()) >= item['_ts'] + ttl
+
+    def _live_items(self):
+        now = time.time()
+        with self._lock:
+            expired = [key for key, item in self._items.items() if self._expired(item, now)]
+            for key in expired:
+                del self._items[key]
+            return list(self._items.values())
+
+    def _store(self, body):
+        item = copy.deepcopy(body)
+        item['_etag'] = f'"{uuid.uuid4()}"'
+        item['_ts'] = int(time.time())
+        self._lsn += 1
+        item['_lsn'] = self._lsn
+        self._items[(self._partition_value(item), item['id'])] = item
+        return copy.deepcopy(item)
+
+    def _not_found(self, item_id):
+        return cosmos_exceptions.CosmosResourceNotFoundError(
+            status_code=404, message=f'Entity with the specified id {item_id} does not exist'
+        )
+
+    # ---- container API ----
+
+    def read(self, **kwargs):
+        return {
+            'id': self.id,
+            'partitionKey': {'paths': [self.partition_key_path], 'kind': 'Hash'},
+            'indexingPolicy': copy.deepcopy(self.indexing_policy) or {'indexingMode': 'consistent', 'automatic': True},
+            'defaultTtl': self.default_ttl
+        }
+
+    def read_item(self, item, partition_key, **kwargs):
+        self._check('read_item', kwargs)
+        item_id = item['id'] if isinstance(item, dict) else item
+        with self._lock:
+            stored = self._items.get((partition_key, item_id))
+            if stored is None or self._expired(stored):
+                raise self._not_found(item_id)
+            return copy.deepcopy(stored)
+
+    def create_item(self, body, **kwargs):
+        self._check('create_item', kwargs)
+        with self._lock:
+            key = (self._partition_value(body), body['id'])
+            existing = self._items.get(key)
+            if existing is not None and not self._expired(existing):
+                raise cosmos_exceptions.CosmosResourceExistsError(
+                    status_code=409, message='Entity with the specified id already exists in the system.'
+                )
+            return self._store(body)
+
+    def upsert_item(self, body, etag=None, match_condition=None, **kwargs):
+        self._check('upsert_item', kwargs)
+        with self._lock:
+            existing = self._items.get((self._partition_value(body), body['id']))
+            self._check_etag(existing, etag, match_condition)
+            return self._store(body)
+
+    def replace_item(self, item, body, etag=None, match_condition=None, **kwargs):
+        self._check('replace_item', kwargs)
+        item_id = item['id'] if isinstance(item, dict) else item
+        with self._lock:
+            existing = self._items.get((self._partition_value(body), item_id))
+            if existing is None or self._expired(existing):
+                raise self._not_found(item_id)
+            self._check_etag(existing, etag, match_condition)
+            return self._store(body)
+
+    def delete_item(self, item, partition_key, etag=None, match_condition=None, **kwargs):
+        self._check('delete_item', kwargs)
+        item_id = item['id'] if isinstance(item, dict) else item
+        with self._lock:
+            existing = self._items.get((partition_key, item_id))
+            if existing is None:
+                raise self._not_found(item_id)
+            self._check_etag(existing, etag, match_condition)
+            del self._items[(partition_key, item_id)]
+
+    def _check_etag(self, existing, etag, match_condition):
+        if match_condition == MatchConditions.IfNotModified and etag is not None:
+            if existing is None or existing.get('_etag') != etag:
+                raise cosmos_exceptions.CosmosAccessConditionFailedError(
+                    status_code=412,
+                    message='Operation cannot be performed because one of the specified precondition is not met'
+                )
+
+    def query_items(self, query, parameters=None, partition_key=None, max_item_count=None, **kwargs):
+        self._check('query_items', kwargs)
+        params = {p['name']: p['value'] for p in (parameters or [])}
+        match = _QUERY_RE.match(query)
+        if not match:
+            raise ValueError(f'Unsupported query for local Cosmos: {query}')
+
+        items = self._live_items()
+        if partition_key is not None:
+            items = [i for i in items if self._partition_value(i) == partition_key]
+        if match.group('where'):
+            predicate = _compile_where(match.group('where'), params)
+            items = [i for i in items if predicate(i)]
+        if match.group('order'):
+            for term in reversed([t.strip() for t in match.group('order').split(',')]):
+                parts = term.split()
+                path = parts[0][2:] if parts[0].startswith('c.') else parts[0]
+                descending = len(parts) > 1 and parts[1].upper() == 'DESC'
+                items.sort(key=_order_key(path), reverse=descending)
+        if match.group('top'):
+            items = items[:int(_literal(match.group('top'), params))]
+
+        projection = match.group('projection').strip()
+        if projection == '*':
+            results = [copy.deepcopy(i) for i in items]
+        else:
+            paths = [p.strip()[2:] for p in projection.split(',')]
+            results = []
+            for item in items:
+                row = {}
+                for path in paths:
+                    value = _get_path(item, path)
+                    if value is not _MISSING:
+                        row[path.split('.')[-1]] = copy.deepcopy(value)
+                results.append(row)
+        return LocalItemPaged(results, max_item_count)
+
+    def query_items_change_feed(self, start_time=None, continuation=None, max_item_count=None,
+                                response_hook=None, is_start_from_beginning=False, **kwargs):
+        """Latest version of every item changed after the continuation, in change order"""
+        self._check('query_items_change_feed', kwargs)
+        if continuation is not None:
+            start_lsn = int(continuation)
+        elif is_start_from_beginning or start_time == 'Beginning':
+            start_lsn = 0
+        else:
+            with self._lock:
+                start_lsn = self._lsn
+        changed = sorted((i for i in self._live_items() if i['_lsn'] > start_lsn), key=lambda i: i['_lsn'])
+        return LocalChangeFeedPaged([copy.deepcopy(i) for i in changed], max_item_count, start_lsn, response_hook)
+
+
+class LocalDatabase:
+    """In-memory database holding LocalContainers"""
+
+    def __init__(self, database_id, faults=None):
+        self.id = database_id
+        self.faults = faults
+        self._containers = {}
+        self._lock = threading.Lock()
+
+    def create_container_if_not_exists(self, id, partition_key, indexing_policy=None, default_ttl=None, **kwargs):
+        with self._lock:
+            if id not in self._containers:
+                self._containers[id] = LocalContainer(
+                    id, partition_key.path, faults=self.faults,
+                    default_ttl=default_ttl, indexing_policy=indexing_policy
+                )
+            return self._containers[id]
+
+    def get_container_client(self, container):
+        container_id = container if isinstance(container, str) else container.id
+        return self._containers[container_id]
+
+    def replace_container(self, container, partition_key, indexing_policy=None, default_ttl=None, **kwargs):
+        existing = self.get_container_client(container)
+        if indexing_policy is not None:
+            existing.indexing_policy = copy.deepcopy(indexing_policy)
+        existing.default_ttl = default_ttl  # a replace without defaultTtl turns expiry off, as in the service
+        return existing
+
+
+class LocalCosmosClient:
+    """Drop-in for CosmosClient when COSMOS_ENDPOINT=local"""
+
+    def __init__(self, faults=None):
+        self.faults = faults
+        self._databases = {}
+        self._lock = threading.Lock()
+
+    def create_database_if_not_exists(self, id, **kwargs):
+        with self._lock:
+            if id not in self._databases:
+                self._databases[id] = LocalDatabase(id, self.faults)
+            return self._databases[id]
+
+    def get_database_client(self, database):
+        return self._databases[database]
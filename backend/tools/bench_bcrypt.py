@@ -0,0 +1,89 @@
+"""
+Login throughput benchmark for each bcrypt cost.
+
+For every cost the script reports the time of one hash and one verify on a
+single core, the logins per second per core that implies, and the measured
+throughput of POST /api/login through the Flask test client with one thread
+per core (bcrypt releases the GIL, so hashing scales across threads). It ends
+with the cost calibrate_bcrypt_cost() picks on this host for the configured
+BCRYPT_TARGET_MS.
+
+Usage:
+    python tools/bench_bcrypt.py --costs 10,11,12,13,14 --logins 64
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ.pop('COSMOS_ENDPOINT', None)
+os.environ.setdefault('BCRYPT_COST', '10')  # skip startup calibration; it is reported below
+os.environ['DAILY_SCHEDULER'] = 'false'  # no background rollover writes during the run
+
+import app as staar_app  # noqa: E402
+
+PASSWORD = 'correct horse battery'
+
+
+def single_core_ms(cost, runs):
+    """Best-of-``runs`` milliseconds for one hash and one verify at ``cost``"""
+    hash_times, verify_times = [], []
+    hashed = None
+    for _ in range(runs):
+        started = time.perf_counter()
+        hashed = bcrypt.hashpw(PASSWORD.encode('utf-8'), bcrypt.gensalt(rounds=cost))
+        hash_times.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        bcrypt.checkpw(PASSWORD.encode('utf-8'), hashed)
+        verify_times.append(time.perf_counter() - started)
+    return min(hash_times) * 1000, min(verify_times) * 1000
+
+
+def login_throughput(cost, logins, threads):
+    """Logins per second through /api/login with passwords stored (and kept) at ``cost``"""
+    staar_app.reset_memory_stores()
+    staar_app.bcrypt_cost = cost
+    client = staar_app.app.test_client()
+    usernames = [f"bench{cost}_{n}" for n in range(threads)]
+    for username in usernames:
+        response = client.post('/api/register', json={'username': username, 'password': PASSWORD})
+        assert response.status_code == 201, response.get_json()
+
+    def login(n):
+        response = client.post('/api/login', json={'username': usernames[n % threads], 'password': PASSWORD})
+        assert response.status_code == 200, response.get_json()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(login, range(logins)))
+    return logins / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--costs', default='10,11,12,13,14', help='Comma-separated bcrypt costs')
+    parser.add_argument('--runs', type=int, default=3, help='Single-core samples per cost (best is kept)')
+    parser.add_argument('--logins', type=int, default=64, help='Logins per cost for the throughput run')
+    parser.add_argument('--threads', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    print(f"{args.threads} threads / {os.cpu_count()} cores\n")
+    print(f"{'cost':>4} {'hash ms':>8} {'verify ms':>10} {'logins/s/core':>14} "
+          f"{'/api/login/s':>13} {'per core':>9}")
+    for cost in [int(c) for c in args.costs.split(',')]:
+        hash_ms, verify_ms = single_core_ms(cost, args.runs)
+        measured = login_throughput(cost, args.logins, args.threads)
+        print(f"{cost:>4} {hash_ms:>8.1f} {verify_ms:>10.1f} {1000 / verify_ms:>14.1f} "
+              f"{measured:>13.1f} {measured / args.threads:>9.1f}")
+
+    cost, base_ms = staar_app.calibrate_bcrypt_cost()
+    print(f"\ncalibrated cost for BCRYPT_TARGET_MS={staar_app.BCRYPT_TARGET_MS:.0f}: {cost} "
+          f"(~{base_ms * 2 ** (cost - staar_app.BCRYPT_MIN_COST):.0f}ms per hash)")
+
+
+if __name__ == '__main__':
+    main()
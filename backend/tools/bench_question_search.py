@@ -0,0 +1,118 @@
+"""
+Benchmark question-bank search and writes at scale.
+
+Builds a synthetic bank (default 100k questions) in memory, then times
+keyword searches of varying selectivity and admin writes. Writes persist to a
+temporary file, never to data/questions.json.
+
+Usage:
+    python tools/bench_question_search.py --questions 100000 --queries 500
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ.pop('COSMOS_ENDPOINT', None)
+os.environ['QUESTIONS_FILE'] = os.path.join(tempfile.mkdtemp(), 'questions.json')
+os.environ['DAILY_SCHEDULER'] = 'false'  # no background rollover writes during the run
+
+import app as staar_app  # noqa: E402
+
+CATEGORIES = ["addition", "subtraction", "multiplication", "division", "fractions", "geometry",
+              "measurement", "details", "vocabulary", "inference", "main idea", "sequence"]
+
+
+def build_bank(count, vocabulary_size, seed):
+    """Synthetic questions with a Zipf-like word distribution"""
+    rnd = random.Random(seed)
+    vocabulary = [f"word{i}" for i in range(vocabulary_size)]
+    weights = [1.0 / (rank + 1) for rank in range(vocabulary_size)]
+    bank = {"math": [], "reading": []}
+    for i in range(count):
+        subject = "math" if i % 2 == 0 else "reading"
+        level = rnd.randint(1, 5)
+        question = {
+            "id": f"{subject[0]}{level}_{i}",
+            "level": level,
+            "question": " ".join(rnd.choices(vocabulary, weights, k=10)),
+            "options": [" ".join(rnd.choices(vocabulary, weights, k=2)) for _ in range(4)],
+            "correct_answer": rnd.randrange(4),
+            "explanation": "",
+            "points": 10,
+            "category": rnd.choice(CATEGORIES)
+        }
+        if subject == "reading":
+            question["passage"] = " ".join(rnd.choices(vocabulary, weights, k=30))
+        bank[subject].append(question)
+    return bank, vocabulary
+
+
+def timed(fn, runs):
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "mean": statistics.fmean(samples),
+        "p50": samples[len(samples) // 2],
+        "p95": samples[int(len(samples) * 0.95)],
+        "max": samples[-1]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--questions', type=int, default=100000)
+    parser.add_argument('--vocabulary', type=int, default=20000)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--writes', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    bank, vocabulary = build_bank(args.questions, args.vocabulary, args.seed)
+    started = time.perf_counter()
+    staar_app.install_questions(bank)
+    print(f"Indexed {args.questions} questions, {len(staar_app.question_bank.index)} tokens "
+          f"in {time.perf_counter() - started:.2f}s")
+
+    rnd = random.Random(args.seed + 1)
+    rare = vocabulary[len(vocabulary) // 2:]
+    mid = vocabulary[50:500]
+    scenarios = {
+        "rare keyword": lambda: staar_app.search_questions(rnd.choice(rare)),
+        "mid keyword": lambda: staar_app.search_questions(rnd.choice(mid)),
+        "two keywords": lambda: staar_app.search_questions(f"{rnd.choice(mid)} {rnd.choice(mid)}"),
+        "keyword + filters": lambda: staar_app.search_questions(
+            rnd.choice(mid), subject="math", level=rnd.randint(1, 5), category=rnd.choice(CATEGORIES)),
+        "common keyword": lambda: staar_app.search_questions(vocabulary[0]),
+        "filters only": lambda: staar_app.search_questions(subject="reading", level=3),
+        "no filter (browse)": lambda: staar_app.search_questions(),
+    }
+
+    print(f"\n{'search':<22} {'mean ms':>9} {'p50':>9} {'p95':>9} {'max':>9}")
+    for name, fn in scenarios.items():
+        result = timed(fn, args.queries)
+        print(f"{name:<22} {result['mean']:>9.3f} {result['p50']:>9.3f} {result['p95']:>9.3f} {result['max']:>9.3f}")
+
+    def add_question():
+        _, question, error = staar_app.validate_question({
+            "subject": "math", "question": " ".join(rnd.choices(mid, k=8)), "options": ["1", "2", "3", "4"],
+            "correct_answer": 0, "level": 2, "category": "addition"
+        })
+        assert error is None, error
+        staar_app.write_question("math", question)
+
+    result = timed(add_question, args.writes)
+    print(f"\n{'write (incl. persist)':<22} {result['mean']:>9.3f} {result['p50']:>9.3f} "
+          f"{result['p95']:>9.3f} {result['max']:>9.3f}")
+
+
+if __name__ == '__main__':
+    main()
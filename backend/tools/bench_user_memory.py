@@ -0,0 +1,118 @@
+"""
+Memory benchmark for the in-memory user store: plain dicts vs UserRecord.
+
+Each (store, user count) pair is measured in a fresh subprocess as the growth
+in resident memory while the store is built. Users look like active players:
+a handful of badges, today's daily challenges, leaderboard bucket counters
+and timestamps. Also reports the per-request cost of converting a record to
+a dict and back.
+
+Usage:
+    python tools/bench_user_memory.py --users 100000,1000000
+
+The dict store at 1M users needs several GB of RAM; pass --modes compact to
+skip it on small machines.
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ.pop('COSMOS_ENDPOINT', None)
+os.environ['DAILY_SCHEDULER'] = 'false'  # no background rollover writes during the run
+
+import app as staar_app  # noqa: E402
+from user_record import UserRecord  # noqa: E402
+
+BADGES = [
+    ("first_win", "First Victory", "Answer your first question correctly!", "🎯"),
+    ("novice", "Novice Explorer", "Complete 10 questions", "📚"),
+    ("apprentice", "Apprentice Scholar", "Complete 50 questions", "📖"),
+    ("streak_3", "3-Day Streak", "Play 3 days in a row", "🔥"),
+    ("math_starter", "Math Starter", "Complete 10 math games", "🔢"),
+    ("sharpshooter", "Sharp Shooter", "Maintain 90%+ accuracy over 10+ questions", "🎯"),
+]
+
+
+def make_user(i, rnd, now):
+    """A realistic active-player progress dict"""
+    user = staar_app.default_user(f"{i:08x}-0000-4000-8000-{i:012x}", f"student{i}")
+    user.update(total_points=rnd.randint(0, 5000), current_level=rnd.randint(1, 15),
+                streak_days=rnd.randint(0, 20), questions_answered=rnd.randint(0, 800),
+                correct_answers=rnd.randint(0, 600), current_combo=rnd.randint(0, 6), max_combo=rnd.randint(0, 12))
+    user['subjects_completed'] = {"math": rnd.randint(0, 40), "reading": rnd.randint(0, 40)}
+    earned = now - timedelta(days=rnd.randint(0, 60), microseconds=rnd.randint(0, 10 ** 9))
+    user['badges'] = [
+        {"id": badge_id, "name": name, "description": desc, "icon": icon,
+         "earned_at": (earned + timedelta(minutes=n)).isoformat()}
+        for n, (badge_id, name, desc, icon) in enumerate(rnd.sample(BADGES, rnd.randint(0, len(BADGES))))
+    ]
+    challenges = staar_app.generate_daily_challenges()
+    challenges[0]['progress'] = rnd.randint(0, 5)
+    if challenges[0]['progress'] == 5:
+        challenges[0].update(completed=True, completed_at=now.isoformat())
+    user['daily_challenges'] = {"date": now.date().isoformat(), "challenges": challenges,
+                                "subjects_today": rnd.sample(["math", "reading"], rnd.randint(0, 2))}
+    staar_app.add_period_points(user, rnd.randint(1, 300), rnd.choice(["math", "reading"]), now)
+    user['last_played'] = now.isoformat()
+    user['last_played_date'] = now.date().isoformat()
+    return user
+
+
+def rss_bytes():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def measure(mode, count):
+    """Build a store of ``count`` users and return resident memory growth in bytes"""
+    rnd = random.Random(count)
+    now = datetime(2026, 10, 19, 15, 30)
+    store = {}
+    before = rss_bytes()
+    for i in range(count):
+        user = make_user(i, rnd, now)
+        store[user['user_id']] = UserRecord.from_dict(user) if mode == 'compact' else user
+    return rss_bytes() - before
+
+
+def conversion_cost(runs=20000):
+    rnd = random.Random(0)
+    record = UserRecord.from_dict(make_user(1, rnd, datetime.utcnow()))
+    started = time.perf_counter()
+    for _ in range(runs):
+        record = UserRecord.from_dict(record.to_dict())
+    return (time.perf_counter() - started) / runs * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', default='100000,1000000', help='Comma-separated user counts')
+    parser.add_argument('--modes', default='dict,compact')
+    parser.add_argument('--worker', nargs=2, metavar=('MODE', 'COUNT'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(measure(args.worker[0], int(args.worker[1])))
+        return
+
+    print(f"{'users':>9} {'store':>8} {'total MB':>10} {'bytes/user':>11}")
+    for count in [int(n) for n in args.users.split(',')]:
+        for mode in args.modes.split(','):
+            result = subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', mode, str(count)],
+                                    capture_output=True, text=True)
+            if result.returncode != 0:
+                print(f"{count:>9} {mode:>8} {'failed (out of memory?)':>22}")
+                continue
+            grown = int(result.stdout.strip().splitlines()[-1])
+            print(f"{count:>9} {mode:>8} {grown / 2 ** 20:>10.1f} {grown / count:>11.0f}")
+
+    print(f"\nto_dict + from_dict round trip: {conversion_cost():.1f} µs per request")
+
+
+if __name__ == '__main__':
+    main()
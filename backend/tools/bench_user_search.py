@@ -0,0 +1,107 @@
+"""
+Benchmark admin username search at scale.
+
+Fills the in-memory auth store with synthetic accounts (default 300k), then
+times prefix and substring searches of varying selectivity, deep pages, and
+registrations into the index, next to a linear scan over every username (what
+a search without the index would cost).
+
+Usage:
+    python tools/bench_user_search.py --users 300000 --queries 500
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ.pop('COSMOS_ENDPOINT', None)
+os.environ.setdefault('BCRYPT_COST', '10')
+os.environ['DAILY_SCHEDULER'] = 'false'  # no background rollover writes during the run
+
+import app as staar_app  # noqa: E402
+
+FIRST = ["ava", "ben", "carlos", "diana", "eli", "fatima", "gabe", "hana", "isaac", "jade", "kai", "luis",
+         "maya", "noah", "olivia", "pablo", "quinn", "rosa", "sam", "tara", "uma", "victor", "wen", "ximena",
+         "yusuf", "zoe"]
+LAST = ["garcia", "smith", "nguyen", "johnson", "martinez", "brown", "lopez", "davis", "hernandez", "wilson",
+        "patel", "kim", "lee", "clark", "young", "walker", "hall", "allen", "wright", "scott"]
+
+
+def build_users(count, seed):
+    """Usernames like "maya.garcia417", registered directly (no password hashing)"""
+    rnd = random.Random(seed)
+    names = set()
+    while len(names) < count:
+        names.add(f"{rnd.choice(FIRST)}.{rnd.choice(LAST)}{rnd.randint(1, 9999)}")
+    for i, name in enumerate(sorted(names)):  # sorted, so building the index is a series of appends
+        staar_app.auth_users_data[name] = staar_app.build_auth_record(name, "$2b$10$bench", f"user-{i}")
+        staar_app.username_index.add(name)
+    return sorted(names), rnd
+
+
+def linear_scan(names, fragment, limit=50):
+    return [name for name in names if fragment in name][:limit]
+
+
+def timed(fn, runs):
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "mean": statistics.fmean(samples),
+        "p50": samples[len(samples) // 2],
+        "p95": samples[int(len(samples) * 0.95)],
+        "max": samples[-1]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=300000)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--inserts', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    names, rnd = build_users(args.users, args.seed)
+    print(f"Indexed {args.users} usernames in {time.perf_counter() - started:.2f}s")
+    search = staar_app.search_usernames
+    deep_after = names[len(names) // 2]
+
+    scenarios = {
+        "prefix, 1 char": lambda: search(rnd.choice(FIRST)[0]),
+        "prefix, first name": lambda: search(rnd.choice(FIRST) + "."),
+        "prefix, exact-ish": lambda: search(rnd.choice(names)[:-1]),
+        "prefix, deep page": lambda: search("", after=deep_after),
+        "contains, common": lambda: search(rnd.choice(LAST), mode="contains"),
+        "contains, rare": lambda: search(f"{rnd.choice(LAST)}{rnd.randint(1000, 9999)}", mode="contains"),
+        "contains, no match": lambda: search("qqq", mode="contains"),
+        "contains, deep page": lambda: search(rnd.choice(LAST), mode="contains", after=deep_after),
+        "linear scan (baseline)": lambda: linear_scan(names, rnd.choice(LAST)),
+    }
+
+    staar_app.search_usernames("warm", mode="contains")  # build the substring snapshot once
+    print(f"\n{'search':<24} {'mean ms':>9} {'p50':>9} {'p95':>9} {'max':>9}")
+    for name, fn in scenarios.items():
+        result = timed(fn, args.queries)
+        print(f"{name:<24} {result['mean']:>9.3f} {result['p50']:>9.3f} {result['p95']:>9.3f} {result['max']:>9.3f}")
+
+    fresh = [f"new.{rnd.choice(LAST)}{i}" for i in range(args.inserts)]
+    result = timed(lambda: staar_app.username_index.add(fresh.pop()), args.inserts)
+    print(f"{'insert (registration)':<24} {result['mean']:>9.3f} {result['p50']:>9.3f} "
+          f"{result['p95']:>9.3f} {result['max']:>9.3f}")
+    result = timed(lambda: (staar_app.username_index.add(f"x{rnd.random()}"),
+                            search("garcia", mode="contains")), 20)
+    print(f"{'insert + contains':<24} {result['mean']:>9.3f} {result['p50']:>9.3f} "
+          f"{result['p95']:>9.3f} {result['max']:>9.3f}  (snapshot rebuild)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Check that cosmos_call enforces its deadline on a single slow Cosmos call.
+
+Runs against the local Cosmos stand-in (COSMOS_ENDPOINT=local) and uses its
+fault injector's latency mode: with latency above the deadline a point read
+must fail with CosmosUnavailableError once the deadline has passed, not after
+the injected latency; with latency below it the read must succeed.
+
+Usage:
+    python tools/check_cosmos_deadline.py --deadline-ms 200 --latency-ms 1500
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ['COSMOS_ENDPOINT'] = 'local'
+os.environ['COSMOS_FAULT_RATE'] = '0'
+os.environ['COSMOS_FAULT_LATENCY_MS'] = '0'  # set per phase below
+os.environ.setdefault('BCRYPT_COST', '10')
+os.environ['DAILY_SCHEDULER'] = 'false'  # no background rollover writes during the run
+os.environ['LEADERBOARD_CHANGE_FEED'] = 'false'  # no feed polls through the injected latency
+
+import app as staar_app  # noqa: E402
+
+
+def timed_read(user_id, deadline_ms):
+    """(elapsed ms, exception or None) for one point read through cosmos_call"""
+    started = time.perf_counter()
+    try:
+        staar_app.cosmos_call('check_deadline', staar_app.cosmos_container.read_item,
+                              item=user_id, partition_key=user_id, deadline_ms=deadline_ms)
+        error = None
+    except staar_app.CosmosUnavailableError as exc:
+        error = exc
+    return (time.perf_counter() - started) * 1000, error
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--deadline-ms', type=int, default=200)
+    parser.add_argument('--latency-ms', type=int, default=1500, help='Injected latency of the slow phase')
+    parser.add_argument('--slack-ms', type=int, default=100, help='Allowed overrun of the deadline')
+    args = parser.parse_args()
+
+    if not staar_app.cosmos_enabled:
+        sys.exit('FAIL: local Cosmos stand-in did not start')
+    faults = staar_app.cosmos_container.faults
+    staar_app.save_user_record(staar_app.default_user('deadline-check', 'deadline_check'))
+    failures = []
+
+    faults.latency_ms = args.latency_ms
+    elapsed, error = timed_read('deadline-check', args.deadline_ms)
+    print(f'latency {args.latency_ms}ms, deadline {args.deadline_ms}ms: '
+          f'{"503 " + str(error) if error else "succeeded"} after {elapsed:.0f}ms')
+    if error is None:
+        failures.append('slow read succeeded past its deadline')
+    elif elapsed > args.deadline_ms + args.slack_ms:
+        failures.append(f'slow read gave up after {elapsed:.0f}ms, deadline was {args.deadline_ms}ms')
+    staar_app.cosmos_breaker.record_success()
+
+    faults.latency_ms = args.deadline_ms // 4
+    elapsed, error = timed_read('deadline-check', args.deadline_ms)
+    print(f'latency {faults.latency_ms}ms, deadline {args.deadline_ms}ms: '
+          f'{"503 " + str(error) if error else "succeeded"} after {elapsed:.0f}ms')
+    if error is not None:
+        failures.append('read within its deadline failed')
+    faults.latency_ms = 0
+
+    if failures:
+        sys.exit('FAIL: ' + '; '.join(failures))
+    print('OK: deadline enforced')
+
+
+if __name__ == '__main__':
+    main()
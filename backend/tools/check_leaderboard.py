@@ -0,0 +1,134 @@
+"""
+Check that GET /api/leaderboard (no window or subject) keeps its original response.
+
+The endpoint is served from the all-time view. Registers players (some never
+score, some tie), plays answers for a few of them, then compares the
+endpoint's response with what the original get_top_users() query returns for
+the same store: the top ``limit`` progress records by total_points (their
+LEADERBOARD_RECORD_FIELDS), zero-point players included, ties in store order.
+A wrong answer and a late registration then check the view stays current.
+
+Usage:
+    python tools/check_leaderboard.py --players 30 --scorers 8
+    COSMOS_ENDPOINT=local python tools/check_leaderboard.py   # against the local Cosmos stand-in
+    COSMOS_ENDPOINT=local LEADERBOARD_CHANGE_FEED=true python tools/check_leaderboard.py   # view kept by the feed
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ.setdefault('BCRYPT_COST', '4')  # registration speed only; login cost is irrelevant here
+os.environ['DAILY_SCHEDULER'] = 'false'  # no background rollover writes during the run
+os.environ.setdefault('LEADERBOARD_CHANGE_FEED', 'false')
+os.environ.setdefault('LEADERBOARD_FEED_POLL_SECONDS', '0.1')
+if os.environ.get('COSMOS_ENDPOINT') != 'local':
+    os.environ.pop('COSMOS_ENDPOINT', None)
+
+import app as staar_app  # noqa: E402
+
+LIMIT = 10
+
+
+def baseline_top_users(limit):
+    """Projected rows of the original get_top_users(): one ORDER BY query, or a sort of the in-memory store
+
+    With PROGRESS_EVENT_LOG the stored records are snapshots, so every user's
+    current state (snapshot plus pending events) is ranked instead.
+    """
+    if staar_app.PROGRESS_EVENT_LOG:
+        if staar_app.cosmos_enabled:
+            user_ids = [row['user_id'] for row in staar_app.cosmos_container.query_items(
+                query="SELECT c.user_id FROM c", enable_cross_partition_query=True)]
+        else:
+            user_ids = list(staar_app.users_data)
+        users = [staar_app.get_user_record(user_id) for user_id in user_ids]
+    elif staar_app.cosmos_enabled:
+        users = list(staar_app.cosmos_container.query_items(
+            query="SELECT TOP @limit * FROM c ORDER BY c.total_points DESC",
+            parameters=[{"name": "@limit", "value": limit}],
+            enable_cross_partition_query=True
+        ))
+    else:
+        users = [record.to_dict() for record in staar_app.users_data.values()]
+    users = sorted(users, key=lambda x: x['total_points'], reverse=True)[:limit]
+    return [{field: user.get(field) for field in staar_app.LEADERBOARD_RECORD_FIELDS} for user in users]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--players', type=int, default=30)
+    parser.add_argument('--scorers', type=int, default=8, help='Players who answer questions (the rest stay at 0)')
+    args = parser.parse_args()
+
+    client = staar_app.app.test_client()
+    players = []
+    for i in range(args.players):
+        response = client.post('/api/register', json={'username': f'board_check{i:03d}', 'password': 'check-pass'})
+        if response.status_code != 201:
+            sys.exit(f'Registration failed ({response.status_code}): {response.get_json()}')
+        body = response.get_json()
+        players.append((body['user_id'], body['token']))
+
+    failures = []
+
+    def compare(label):
+        # The feed processor updates the view asynchronously: give it a few polls to catch up
+        deadline = time.monotonic() + (5 if staar_app.leaderboard_feed else 0)
+        while True:
+            response = client.get('/api/leaderboard')
+            got, expected = response.get_json(), baseline_top_users(LIMIT)
+            if got == expected or time.monotonic() >= deadline:
+                break
+            time.sleep(0.1)
+        zero_points = sum(1 for u in expected if u['total_points'] == 0)
+        print(f'{label}: {len(got or [])} players listed, {zero_points} of them with 0 points')
+        if response.status_code != 200 or got != expected:
+            failures.append(f'{label}: got {[u.get("username") for u in got or []]}, '
+                            f'expected {[u["username"] for u in expected]}')
+
+    if staar_app.cosmos_enabled:
+        try:  # registration stored it already; the first read must store it again
+            staar_app.cosmos_leaderboard_container.delete_item(item='all', partition_key='all')
+        except staar_app.cosmos_exceptions.CosmosResourceNotFoundError:
+            pass
+    compare('new deployment, nobody has scored')
+    if staar_app.cosmos_enabled:
+        try:
+            staar_app.cosmos_leaderboard_container.read_item(item='all', partition_key='all')
+        except staar_app.cosmos_exceptions.CosmosResourceNotFoundError:
+            failures.append('the seeded all-time view was not stored')
+
+    for limit, status, count in (('abc', 400, None), ('-5', 200, 1), ('0', 200, 1), ('1000', 200, args.players)):
+        response = client.get(f'/api/leaderboard?limit={limit}')
+        got = response.get_json()
+        if response.status_code != status or (count is not None and len(got) != count):
+            failures.append(f'limit={limit}: {response.status_code} {got}')
+
+    # Scorers 0 and 1 tie; the rest get distinct totals
+    for n, (user_id, token) in enumerate(players[:args.scorers]):
+        for _ in range(max(1, n)):
+            client.post(f'/api/user/{user_id}/progress', json={'correct': True, 'points': 10, 'subject': 'math'},
+                        headers={'Authorization': f'Bearer {token}'})
+    compare(f'after {args.scorers} players scored')
+
+    user_id, token = players[args.scorers - 1]
+    client.post(f'/api/user/{user_id}/progress', json={'correct': False, 'points': 0, 'subject': 'math'},
+                headers={'Authorization': f'Bearer {token}'})
+    compare('after a wrong answer')
+
+    response = client.post('/api/register', json={'username': 'board_check_late', 'password': 'check-pass'})
+    if response.status_code != 201:
+        sys.exit(f'Registration failed ({response.status_code}): {response.get_json()}')
+    compare('after a late registration')
+
+    if failures:
+        sys.exit('FAIL: ' + '; '.join(failures))
+    print(f'OK: /api/leaderboard matches the original response '
+          f'({"local Cosmos" if staar_app.cosmos_enabled else "in-memory"}'
+          f'{", change feed" if staar_app.leaderboard_feed else ""})')
+
+
+if __name__ == '__main__':
+    main()
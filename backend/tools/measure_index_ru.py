@@ -0,0 +1,163 @@
+"""
+Write cost of the progress container's indexing policy vs index-everything.
+
+Live mode (needs a real Cosmos DB account; the local stand-in doesn't charge
+RUs) creates two scratch containers in COSMOS_DATABASE, one with the default
+policy and one with COSMOS_INDEXING_POLICIES["progress"], replays the same
+progress updates into both and reports the mean request charge per upsert,
+plus the charge of the hot queries. The scratch containers are deleted
+afterwards.
+
+Offline mode (--offline) counts the index terms each document produces
+under both policies. Cosmos write charges scale with that count, so the
+ratio approximates the saving without an account.
+
+Usage:
+    COSMOS_ENDPOINT=https://... COSMOS_KEY=... python tools/measure_index_ru.py --users 50 --updates 20
+    python tools/measure_index_ru.py --offline
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+endpoint = os.environ.pop('COSMOS_ENDPOINT', None)  # keep app.py itself in memory mode
+os.environ.setdefault('BCRYPT_COST', '10')
+os.environ['DAILY_SCHEDULER'] = 'false'  # no background rollover writes during the run
+
+import app as staar_app  # noqa: E402
+from bench_user_memory import make_user  # noqa: E402
+
+DEFAULT_POLICY = {"indexingMode": "consistent", "includedPaths": [{"path": "/*"}], "excludedPaths": []}
+HOT_QUERIES = {
+    "leaderboard seed": "SELECT TOP 50 " + ', '.join(f'c.{f}' for f in staar_app.LEADERBOARD_RECORD_FIELDS)
+                        + ", c.event_seq FROM c ORDER BY c.total_points DESC",
+    "admin list": "SELECT TOP 100 c.user_id, c.username, c.current_level, c.total_points, c.created_at FROM c "
+                  "ORDER BY c.created_at DESC",
+}
+
+
+def play_update(user, rnd, now):
+    """One answered question, the way POST /api/user/<user_id>/progress changes a progress record"""
+    subject = rnd.choice(["math", "reading"])
+    points = rnd.randint(5, 30)
+    user['total_points'] += points
+    user['questions_answered'] += 1
+    user['correct_answers'] += 1
+    user['current_combo'] += 1
+    user['max_combo'] = max(user['max_combo'], user['current_combo'])
+    user['subjects_completed'][subject] += 1
+    user['last_played'] = now.isoformat()
+    staar_app.add_period_points(user, points, subject, now)
+    challenge = user['daily_challenges']['challenges'][0]
+    challenge['progress'] = min(challenge['progress'] + 1, challenge['goal'])
+
+
+def index_terms(value, policy, path=''):
+    """Number of (path, value) index terms ``value`` produces under ``policy``"""
+    if isinstance(value, dict):
+        return sum(index_terms(v, policy, f"{path}/{k}") for k, v in value.items())
+    if isinstance(value, list):
+        return sum(index_terms(v, policy, f"{path}/[]") for v in value)
+    return 1 if _is_indexed(path, policy) else 0
+
+
+def _is_indexed(path, policy):
+    """Most specific matching included/excluded path wins, as in Cosmos"""
+    best, indexed = -1, False
+    for key, outcome in (("includedPaths", True), ("excludedPaths", False)):
+        for entry in policy.get(key, []):
+            pattern = entry['path']
+            if pattern.endswith('/?'):
+                matches = path == pattern[:-2]
+            elif pattern.endswith('/*'):
+                prefix = pattern[:-2]
+                matches = path == prefix or path.startswith(prefix + '/')
+            else:
+                matches = path == pattern
+            if matches and len(pattern) > best:
+                best, indexed = len(pattern), outcome
+    return indexed
+
+
+def offline(args):
+    rnd = random.Random(args.seed)
+    now = datetime(2026, 10, 19, 15, 30)
+    tuned = staar_app.COSMOS_INDEXING_POLICIES["progress"]
+    default_terms, tuned_terms = [], []
+    for i in range(args.users):
+        user = make_user(i, rnd, now - timedelta(days=1))
+        for _ in range(args.updates):
+            play_update(user, rnd, now)
+            default_terms.append(index_terms(user, DEFAULT_POLICY))
+            tuned_terms.append(index_terms(user, tuned))
+    mean_default, mean_tuned = statistics.fmean(default_terms), statistics.fmean(tuned_terms)
+    print(f"index terms per progress document: default {mean_default:.1f}, tuned {mean_tuned:.1f} "
+          f"({100 * (1 - mean_tuned / mean_default):.0f}% fewer)")
+
+
+def live(args):
+    from azure.cosmos import CosmosClient, PartitionKey
+    if not endpoint or endpoint == 'local':
+        sys.exit("Live mode needs COSMOS_ENDPOINT/COSMOS_KEY for a real account (or use --offline)")
+    client = CosmosClient(endpoint, os.environ['COSMOS_KEY'])
+    database = client.create_database_if_not_exists(os.getenv("COSMOS_DATABASE", "staar"))
+    suffix = uuid.uuid4().hex[:8]
+    policies = {"default": DEFAULT_POLICY, "tuned": staar_app.COSMOS_INDEXING_POLICIES["progress"]}
+    containers = {
+        name: database.create_container(id=f"ru-bench-{name}-{suffix}", partition_key=PartitionKey(path="/user_id"),
+                                        indexing_policy=policy)
+        for name, policy in policies.items()
+    }
+    try:
+        charges = {name: {"create": [], "update": []} for name in containers}
+        for name, container in containers.items():
+            rnd = random.Random(args.seed)  # same documents and updates for both containers
+            now = datetime.utcnow()
+            for i in range(args.users):
+                user = make_user(i, rnd, now - timedelta(days=1))
+                container.upsert_item(user)
+                charges[name]["create"].append(_last_charge(container))
+                for _ in range(args.updates):
+                    play_update(user, rnd, now)
+                    container.upsert_item(user)
+                    charges[name]["update"].append(_last_charge(container))
+
+        print(f"{'':<10} {'create RU':>10} {'update RU':>10}")
+        for name, result in charges.items():
+            print(f"{name:<10} {statistics.fmean(result['create']):>10.2f} {statistics.fmean(result['update']):>10.2f}")
+        saving = 1 - statistics.fmean(charges["tuned"]["update"]) / statistics.fmean(charges["default"]["update"])
+        print(f"write RU saved per progress update: {100 * saving:.0f}%\n")
+
+        for query_name, query in HOT_QUERIES.items():
+            for name, container in containers.items():
+                list(container.query_items(query, enable_cross_partition_query=True))
+                print(f"{query_name:<18} {name:<8} {_last_charge(container):>8.2f} RU")
+    finally:
+        for container in containers.values():
+            database.delete_container(container)
+
+
+def _last_charge(container):
+    return float(container.client_connection.last_response_headers['x-ms-request-charge'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--updates', type=int, default=20, help='Progress updates per user')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--offline', action='store_true', help='Count index terms instead of measuring RUs')
+    args = parser.parse_args()
+    if args.offline:
+        offline(args)
+    else:
+        live(args)
+
+
+if __name__ == '__main__':
+    main()
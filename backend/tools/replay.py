@@ -0,0 +1,319 @@
+"""
+Deterministic replay of captured API traffic.
+
+Capture traffic by starting the backend with CAPTURE_TRAFFIC_PATH=/path/to/capture.ndjson
+(optionally RNG_SEED=<n>). The log records every API request plus the RNG seed, with
+passwords replaced by redacted:<length>:<hmac> markers.
+
+Replay drives the requests back in capture order with the same seed, re-minting
+tokens for the replayed users, restoring the admin flag of users who made admin
+requests, and standing in a synthetic password of the same length for each marker
+(equal markers get equal passwords, so failed logins still fail). It then prints a
+state digest and a timing report. Replaying twice must give the same digest; a
+differing digest means some outcome depends on something other than the request
+stream and the seed.
+
+Every server process writes its own capture session (its own seed and seq
+numbers), so a log written by several gunicorn workers is replayed one session
+at a time with --session. In-process replays edit a temporary copy of the
+question bank, never QUESTIONS_FILE itself.
+
+Usage:
+    # In-process through the Flask test client, on fresh in-memory stores
+    python tools/replay.py capture.ndjson --runs 2
+
+    # One worker's session from a log written by several
+    python tools/replay.py capture.ndjson --session 4242-1a2b3c4d
+
+    # Against a live server (start it with RNG_SEED=<seed> and empty storage
+    # for comparable results; only timings and status codes are checked). Tokens
+    # are minted locally, so the server must share this JWT_SECRET_KEY
+    python tools/replay.py capture.ndjson --url http://localhost:8000
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# Replays always run against in-memory storage and must not capture themselves
+os.environ.pop('COSMOS_ENDPOINT', None)
+os.environ.pop('CAPTURE_TRAFFIC_PATH', None)
+os.environ.pop('RNG_SEED', None)
+os.environ['DAILY_SCHEDULER'] = 'false'  # no background writes between replayed requests
+# Replayed admin question edits go to a copy of the bank, restored before each run
+QUESTIONS_SOURCE = os.environ.get('QUESTIONS_FILE') or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'questions.json')
+os.environ['QUESTIONS_FILE'] = os.path.join(tempfile.mkdtemp(prefix='replay-'), 'questions.json')
+if os.path.exists(QUESTIONS_SOURCE):
+    shutil.copyfile(QUESTIONS_SOURCE, os.environ['QUESTIONS_FILE'])
+
+import app as staar_app  # noqa: E402
+
+UUID_PATTERN = re.compile(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}')
+# Wall-clock values (and the host-calibrated bcrypt cost) differ between runs by design
+# and are left out of the digest
+VOLATILE_KEYS = {'created_at', 'last_played', 'earned_at', 'completed_at', 'timestamp', 'last_password_reset',
+                 'made_admin_at', 'password_hash', 'bcrypt_cost', 'elapsed_ms', '_etag', '_ts', 'expires_at'}
+COMBO_BADGE_PATTERN = re.compile(r'^(combo_\d+)_[\d.]+$')
+REDACTED_PASSWORD_PATTERN = re.compile(r'redacted:(\d+):([0-9a-f]{16})')
+REPLAY_ID_SEED = 0  # replayed ids are reproducible, but never derived from the capture's seed
+
+
+def load_capture(path, session=None):
+    """Return (seed, request records) of one capture session from a capture log
+
+    Seeds and seq numbers are per session, so a log holding several sessions
+    (several workers, or restarts) needs ``session`` to pick one.
+    """
+    seeds = {}
+    records = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if entry.get('type') == 'capture_start':
+                seeds.setdefault(entry.get('session'), []).append(entry['seed'])
+            elif entry.get('type') == 'request':
+                records.append(entry)
+
+    if session is None:
+        if sum(len(starts) for starts in seeds.values()) > 1:
+            tagged = ', '.join(name for name in seeds if name) or 'untagged: this log predates session tags'
+            sys.exit(f"{path} holds several capture sessions ({tagged}); replay one at a time with --session")
+        session = next(iter(seeds), None)
+    elif len(seeds.get(session, ())) != 1:
+        sys.exit(f"{path} holds no single capture session {session}")
+
+    records = [r for r in records if r.get('session') == session]
+    records.sort(key=lambda r: r['seq'])
+    return (seeds[session][0] if session in seeds else None), records
+
+
+def synthetic_password(match):
+    """A stand-in password for a redacted:<length>:<hmac> marker, of the same length"""
+    length, digest = int(match.group(1)), match.group(2)
+    return (digest * (length // len(digest) + 1))[:length]
+
+
+def restore_passwords(value):
+    """Replace every redaction marker in a captured body with its synthetic password"""
+    if isinstance(value, str):
+        return REDACTED_PASSWORD_PATTERN.sub(synthetic_password, value)
+    if isinstance(value, dict):
+        return {key: restore_passwords(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [restore_passwords(item) for item in value]
+    return value
+
+
+def normalize(value):
+    """Strip volatile fields so runs can be compared"""
+    if isinstance(value, dict):
+        result = {}
+        for key, item in value.items():
+            if key in VOLATILE_KEYS:
+                continue
+            if key == 'id' and isinstance(item, str):
+                item = COMBO_BADGE_PATTERN.sub(r'\1', item)
+            result[key] = normalize(item)
+        return result
+    if isinstance(value, list):
+        return [normalize(item) for item in value]
+    return value
+
+
+def state_digest():
+    """Hash of the app's normalized in-memory state"""
+    state = {
+        'users': {user_id: record.to_dict() for user_id, record in staar_app.users_data.items()},
+        'auth_users': staar_app.auth_users_data,
+        'audit_logs': [{k: v for k, v in log.items() if k != 'id'} for log in staar_app.audit_logs],
+        'leaderboards': {k: v['entries'] for k, v in staar_app.leaderboard_views.items()}
+    }
+    encoded = json.dumps(normalize(state), sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def endpoint_name(method, path):
+    """Group requests by Flask endpoint rather than concrete path"""
+    try:
+        endpoint, _ = staar_app.app.url_map.bind('localhost').match(path, method=method)
+        return f"{method} {endpoint}"
+    except Exception:
+        return f"{method} {UUID_PATTERN.sub('<id>', path)}"
+
+
+class InProcessTarget:
+    """Replays through the Flask test client on fresh in-memory stores"""
+
+    stateful = True
+
+    def __init__(self):
+        self.client = staar_app.app.test_client()
+
+    def reset(self, seed):
+        staar_app.reset_memory_stores()
+        if os.path.exists(QUESTIONS_SOURCE):
+            shutil.copyfile(QUESTIONS_SOURCE, staar_app.QUESTIONS_FILE)
+        elif os.path.exists(staar_app.QUESTIONS_FILE):
+            os.remove(staar_app.QUESTIONS_FILE)  # written by the last run's question edits
+        staar_app.load_questions()
+        staar_app.seed_rng(seed)
+        staar_app.seed_ids(REPLAY_ID_SEED)
+
+    def make_admin(self, user_id):
+        """Give a replayed user the admin flag they had during capture"""
+        auth_user = staar_app.get_auth_user_by_id(user_id)
+        if auth_user and not auth_user.get('is_admin', False):
+            auth_user['is_admin'] = True
+            staar_app.update_auth_user(auth_user)
+
+    def send(self, method, url, headers, body, raw_body):
+        kwargs = {'json': body} if body is not None else {'data': raw_body}
+        response = self.client.open(url, method=method, headers=headers, **kwargs)
+        return response.status_code, response.get_json(silent=True)
+
+
+class HttpTarget:
+    """Replays against a running server
+
+    Requests are authenticated with tokens minted here from this process's
+    JWT_SECRET_KEY, so the server must be configured with the same key or
+    every authenticated request fails with 401.
+    """
+
+    stateful = False
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def reset(self, seed):
+        pass
+
+    def make_admin(self, user_id):
+        pass  # the live server's users are its own; make them admins there
+
+    def send(self, method, url, headers, body, raw_body):
+        if body is not None:
+            data = json.dumps(body).encode('utf-8')
+        else:
+            data = raw_body.encode('utf-8') if raw_body else None
+        req = urllib.request.Request(self.base_url + url, data=data, method=method, headers=headers)
+        try:
+            with urllib.request.urlopen(req) as response:
+                status, payload = response.status, response.read()
+        except urllib.error.HTTPError as exc:
+            status, payload = exc.code, exc.read()
+        try:
+            return status, json.loads(payload)
+        except ValueError:
+            return status, None
+
+
+def replay_once(target, seed, records):
+    """Replay every record once; return (timings by endpoint, status mismatches)"""
+    target.reset(seed)
+    id_map = {}
+    timings = {}
+    mismatches = []
+
+    for record in records:
+        path = UUID_PATTERN.sub(lambda m: id_map.get(m.group(0), m.group(0)), record['path'])
+        url = path + (f"?{record['query']}" if record.get('query') else '')
+        headers = {'Content-Type': record.get('content_type') or 'application/json'}
+        if record.get('user_id'):
+            user_id = id_map.get(record['user_id'], record['user_id'])
+            is_admin = bool(record.get('is_admin'))
+            if is_admin:
+                target.make_admin(user_id)
+            headers['Authorization'] = f"Bearer {staar_app.generate_token(user_id, is_admin=is_admin)}"
+
+        started = time.perf_counter()
+        status, payload = target.send(record['method'], url, headers, restore_passwords(record.get('body')),
+                                      restore_passwords(record.get('raw_body')))
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        if record.get('response_user_id') and isinstance(payload, dict) and payload.get('user_id'):
+            id_map[record['response_user_id']] = payload['user_id']
+        if status != record['status']:
+            mismatches.append((record['seq'], record['method'], record['path'], record['status'], status))
+        timings.setdefault(endpoint_name(record['method'], path), []).append(elapsed_ms)
+
+    return timings, mismatches
+
+
+def timing_report(timings):
+    """Per-endpoint latency summary rows"""
+    rows = []
+    for endpoint, samples in sorted(timings.items()):
+        ordered = sorted(samples)
+        rows.append({
+            'endpoint': endpoint,
+            'count': len(ordered),
+            'mean_ms': round(statistics.fmean(ordered), 3),
+            'p50_ms': round(ordered[len(ordered) // 2], 3),
+            'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+            'max_ms': round(ordered[-1], 3),
+            'total_ms': round(sum(ordered), 3)
+        })
+    return rows
+
+
+def print_report(run, digest, rows, mismatches):
+    print(f"\nRun {run}: state digest {digest or 'n/a (live server)'}")
+    print(f"  {'endpoint':<40} {'count':>6} {'mean':>9} {'p50':>9} {'p95':>9} {'max':>9}")
+    for row in rows:
+        print(f"  {row['endpoint']:<40} {row['count']:>6} {row['mean_ms']:>9.2f} {row['p50_ms']:>9.2f} "
+              f"{row['p95_ms']:>9.2f} {row['max_ms']:>9.2f}")
+    if mismatches:
+        print(f"  {len(mismatches)} status mismatches vs capture, first: {mismatches[0]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('capture', help='NDJSON capture log')
+    parser.add_argument('--url', help='Replay against a running server instead of in-process')
+    parser.add_argument('--session', help='Capture session to replay (required when the log holds several)')
+    parser.add_argument('--seed', type=int, help='Override the seed recorded in the capture')
+    parser.add_argument('--runs', type=int, default=2, help='Number of replays (digests must match)')
+    parser.add_argument('--json-report', help='Write the per-run timing report to this file')
+    args = parser.parse_args()
+
+    seed, records = load_capture(args.capture, args.session)
+    seed = args.seed if args.seed is not None else (seed or 0)
+    target = HttpTarget(args.url) if args.url else InProcessTarget()
+    print(f"Replaying {len(records)} requests with seed {seed}")
+
+    digests = []
+    report = []
+    for run in range(1, args.runs + 1):
+        timings, mismatches = replay_once(target, seed, records)
+        digest = state_digest() if target.stateful else None
+        rows = timing_report(timings)
+        print_report(run, digest, rows, mismatches)
+        digests.append(digest)
+        report.append({'run': run, 'state_digest': digest, 'status_mismatches': len(mismatches), 'endpoints': rows})
+
+    if args.json_report:
+        with open(args.json_report, 'w', encoding='utf-8') as f:
+            json.dump({'seed': seed, 'requests': len(records), 'runs': report}, f, indent=2)
+
+    if target.stateful and len(set(digests)) > 1:
+        sys.exit('\nFAIL: replays produced different state')
+    if target.stateful:
+        print('\nOK: all replays produced identical state')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Concurrency stress test for progress updates.
+
+Fires concurrent answers for a single user and checks that no update was lost
+(questions_answered and correct_answers must equal the number of requests).
+
+Usage:
+    # In-process, through the Flask test client
+    python tools/stress_progress.py --threads 16 --answers 50
+
+    # Against a running server with threaded workers (start it with
+    # DAILY_SCHEDULER=false so no rollover pass writes during the run), e.g.
+    #   DAILY_SCHEDULER=false gunicorn --worker-class gthread --threads 8 app:app
+    python tools/stress_progress.py --url http://localhost:8000 --threads 16 --answers 50
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import urllib.request
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ['DAILY_SCHEDULER'] = 'false'  # no background rollover writes during the run
+
+
+class LocalClient:
+    """Drive the app in-process via the Flask test client"""
+
+    def __init__(self):
+        import app as staar_app
+        self.app = staar_app.app
+
+    def request(self, method, path, body=None, token=None):
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        with self.app.test_client() as client:
+            response = client.open(path, method=method, json=body, headers=headers)
+            return response.status_code, response.get_json()
+
+
+class HttpClient:
+    """Drive a live server over HTTP"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def request(self, method, path, body=None, token=None):
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method)
+        req.add_header('Content-Type', 'application/json')
+        if token:
+            req.add_header('Authorization', f'Bearer {token}')
+        try:
+            with urllib.request.urlopen(req) as response:
+                return response.status, json.loads(response.read() or b'null')
+        except urllib.error.HTTPError as exc:
+            return exc.code, json.loads(exc.read() or b'null')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='Base URL of a running server (default: in-process test client)')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--answers', type=int, default=50, help='Answers submitted per thread')
+    args = parser.parse_args()
+
+    client = HttpClient(args.url) if args.url else LocalClient()
+
+    username = f'stress_{uuid.uuid4().hex[:10]}'
+    status, body = client.request('POST', '/api/register', {'username': username, 'password': 'stress-pass'})
+    if status != 201:
+        sys.exit(f'Registration failed ({status}): {body}')
+    token, user_id = body['token'], body['user_id']
+
+    errors = []
+
+    def worker(index):
+        for i in range(args.answers):
+            correct = (index + i) % 2 == 0
+            status, body = client.request('POST', f'/api/user/{user_id}/progress',
+                                          {'correct': correct, 'points': 10, 'subject': 'math'}, token)
+            if status != 200:
+                errors.append((status, body))
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(args.threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    _, user = client.request('GET', f'/api/user/{user_id}', token=token)
+    total = args.threads * args.answers
+    expected_correct = sum(1 for n in range(args.threads) for i in range(args.answers) if (n + i) % 2 == 0)
+    accepted = total - len(errors)
+
+    print(f'{total} requests in {elapsed:.2f}s ({total / elapsed:.0f} req/s), {len(errors)} rejected')
+    print(f'questions_answered: {user["questions_answered"]} (expected {accepted})')
+    print(f'correct_answers:    {user["correct_answers"]}')
+
+    lost = accepted - user['questions_answered']
+    if errors:
+        print(f'First rejection: {errors[0]}')
+    if lost or (not errors and user['correct_answers'] != expected_correct):
+        sys.exit(f'FAIL: {lost} lost updates')
+    print('OK: no lost updates')
+
+
+if __name__ == '__main__':
+    main()
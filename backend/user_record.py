@@ -0,0 +1,235 @@
+"""
+Compact user progress records for the in-memory backend
+Each user is kept as a UserRecord instead of the nested dict built by
+default_user(): scalars live in __slots__, ISO timestamps and dates are stored
+as integers, badge and challenge dicts become tuples in a fixed key order, and
+repeated strings (badge names, challenge text, bucket keys) are interned so all
+users share one copy. to_dict() rebuilds exactly the dict that was stored;
+values that don't fit the compact layout are kept unchanged in ``_extra``.
+"""
+import copy
+import sys
+from datetime import date, datetime, timedelta
+
+_EPOCH = datetime(1970, 1, 1)
+_ABSENT = object()  # slot value for keys the record doesn't have
+
+BADGE_KEYS = ("id", "name", "description", "icon", "earned_at")
+CHALLENGE_KEYS = ("id", "title", "description", "goal", "progress", "reward", "icon", "type",
+                  "completed", "completed_at")
+DAILY_CHALLENGE_KEYS = ["date", "challenges", "subjects_today"]
+TIMESTAMP_KEYS = {"earned_at", "completed_at"}
+
+# Record keys in default_user() order, with how each one is stored
+FIELDS = (
+    ("id", "plain"),
+    ("user_id", "plain"),
+    ("username", "plain"),
+    ("total_points", "plain"),
+    ("current_level", "plain"),
+    ("streak_days", "plain"),
+    ("longest_streak", "plain"),
+    ("questions_answered", "plain"),
+    ("correct_answers", "plain"),
+    ("badges", "badges"),
+    ("last_played", "timestamp"),
+    ("last_played_date", "date"),
+    ("perfect_games", "plain"),
+    ("subjects_completed", "counts"),
+    ("current_combo", "plain"),
+    ("max_combo", "plain"),
+    ("daily_challenges", "challenges"),
+    ("mystery_boxes_opened", "plain"),
+    ("created_at", "timestamp"),
+    ("period_points", "counts"),
+    ("event_seq", "plain"),
+)
+_FIELD_KINDS = dict(FIELDS)
+
+
+class _Incompatible(Exception):
+    """A value doesn't fit the compact layout and is stored as-is"""
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+def _encode_timestamp(value):
+    """Naive ISO datetime string -> microseconds since the epoch (None stays None)"""
+    if value is None:
+        return None
+    if type(value) is str:
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            parsed = None
+        if parsed is not None and parsed.tzinfo is None and parsed.isoformat() == value:
+            delta = parsed - _EPOCH
+            return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+    raise _Incompatible
+
+
+def _decode_timestamp(value):
+    return None if value is None else (_EPOCH + timedelta(microseconds=value)).isoformat()
+
+
+def _encode_date(value):
+    """ISO date string -> proleptic ordinal (None stays None)"""
+    if value is None:
+        return None
+    if type(value) is str:
+        try:
+            parsed = date.fromisoformat(value)
+        except ValueError:
+            parsed = None
+        if parsed is not None and parsed.isoformat() == value:
+            return parsed.toordinal()
+    raise _Incompatible
+
+
+def _decode_date(value):
+    return None if value is None else date.fromordinal(value).isoformat()
+
+
+def _encode_counts(value):
+    """{str: value} -> flat (key, value, key, value, ...) tuple with interned keys"""
+    if type(value) is not dict or not all(type(k) is str for k in value):
+        raise _Incompatible
+    return tuple(item for key, count in value.items() for item in (sys.intern(key), count))
+
+
+def _decode_counts(value):
+    return dict(zip(value[::2], value[1::2]))
+
+
+def _encode_layout(value, keys):
+    """Dict whose keys follow ``keys`` in order -> tuple (trailing absent keys dropped);
+    any other dict is kept as-is"""
+    if type(value) is not dict or list(value) != [k for k in keys if k in value]:
+        return copy.deepcopy(value)
+    try:
+        encoded = [
+            (_encode_timestamp(value[k]) if k in TIMESTAMP_KEYS else _intern(value[k])) if k in value else _ABSENT
+            for k in keys
+        ]
+    except _Incompatible:
+        return copy.deepcopy(value)
+    while encoded and encoded[-1] is _ABSENT:
+        encoded.pop()
+    return tuple(encoded)
+
+
+def _decode_layout(value, keys):
+    if type(value) is not tuple:
+        return copy.deepcopy(value)
+    return {
+        k: _decode_timestamp(v) if k in TIMESTAMP_KEYS else v
+        for k, v in zip(keys, value) if v is not _ABSENT
+    }
+
+
+def _encode_badges(value):
+    if type(value) is not list:
+        raise _Incompatible
+    return tuple(_encode_layout(badge, BADGE_KEYS) for badge in value)
+
+
+def _decode_badges(value):
+    return [_decode_layout(badge, BADGE_KEYS) for badge in value]
+
+
+def _encode_challenges(value):
+    """daily_challenges -> () when empty, else (date ordinal, challenges, subjects_today)"""
+    if value == {}:
+        return ()
+    if (type(value) is not dict or list(value) != DAILY_CHALLENGE_KEYS
+            or type(value['challenges']) is not list or type(value['subjects_today']) is not list):
+        raise _Incompatible
+    return (
+        _encode_date(value['date']),
+        tuple(_encode_layout(challenge, CHALLENGE_KEYS) for challenge in value['challenges']),
+        tuple(_intern(subject) for subject in value['subjects_today'])
+    )
+
+
+def _decode_challenges(value):
+    if not value:
+        return {}
+    return {
+        "date": _decode_date(value[0]),
+        "challenges": [_decode_layout(challenge, CHALLENGE_KEYS) for challenge in value[1]],
+        "subjects_today": list(value[2])
+    }
+
+
+_ENCODERS = {
+    "plain": lambda value: value,
+    "timestamp": _encode_timestamp,
+    "date": _encode_date,
+    "counts": _encode_counts,
+    "badges": _encode_badges,
+    "challenges": _encode_challenges,
+}
+_DECODERS = {
+    "plain": lambda value: value,
+    "timestamp": _decode_timestamp,
+    "date": _decode_date,
+    "counts": _decode_counts,
+    "badges": _decode_badges,
+    "challenges": _decode_challenges,
+}
+
+
+class UserRecord:
+    """Slotted, compact form of a user progress dict"""
+
+    __slots__ = tuple(key for key, _ in FIELDS) + ("_extra",)
+
+    @classmethod
+    def from_dict(cls, user):
+        record = cls.__new__(cls)
+        extra = None
+        for key, kind in FIELDS:
+            value = user.get(key, _ABSENT)
+            if value is not _ABSENT and kind != "plain":
+                try:
+                    value = _ENCODERS[kind](value)
+                except _Incompatible:
+                    extra = extra or {}
+                    extra[key] = copy.deepcopy(value)
+                    value = _ABSENT
+            elif kind == "plain":
+                value = copy.deepcopy(value) if type(value) in (dict, list) else value
+            setattr(record, key, value)
+        if record.id == record.user_id:
+            record.id = record.user_id  # share the string
+        for key, value in user.items():
+            if key not in _FIELD_KINDS:
+                extra = extra or {}
+                extra[key] = copy.deepcopy(value)
+        record._extra = extra
+        return record
+
+    def to_dict(self):
+        """A fresh, independent dict equal to the one the record was built from"""
+        user = {}
+        for key, kind in FIELDS:
+            value = getattr(self, key)
+            if value is not _ABSENT:
+                value = _DECODERS[kind](value)
+                user[key] = copy.deepcopy(value) if kind == "plain" and type(value) in (dict, list) else value
+        if self._extra:
+            user.update(copy.deepcopy(self._extra))
+        return user
+
+    def get(self, key, default=None):
+        """Read one key, decoding just that field instead of rebuilding the whole dict"""
+        kind = _FIELD_KINDS.get(key)
+        if kind is not None:
+            value = getattr(self, key)
+            if value is not _ABSENT:
+                return _DECODERS[kind](value)
+            if not self._extra or key not in self._extra:
+                return default
+        return self.to_dict().get(key, default)